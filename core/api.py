@@ -12,6 +12,7 @@ from datetime import datetime
 from pydantic import BaseModel, Field
 import google.generativeai as genai
 import asyncio
+import queue
 
 # Configure logging
 from core.logging_config import setup_logging
@@ -432,6 +433,50 @@ app.add_api_route("/chat/completions/stream", chat_completions_stream, methods=[
 # Add the WebSocket endpoint
 app.add_websocket_route("/ws/chat", handle_websocket_chat)
 
+# --- Shared HTTP clients ---
+from core.file_content import close_http_session
+from core.model_clients import close_model_clients
+
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    """Close the pooled HTTP session used to fetch repository files and the shared provider clients."""
+    await close_http_session()
+    await close_model_clients()
+
+
+# --- Background index builds ---
+from core.index_jobs import get_index_job_queue
+
+
+class IndexRequest(BaseModel):
+    """
+    Model for queueing a repository index build.
+    """
+    repo_url: str = Field(..., description="URL or local path of the repository to index")
+    type: str = Field("github", description="Type of repository (e.g., 'github', 'gitlab', 'bitbucket', 'local')")
+    token: Optional[str] = Field(None, description="Personal access token for private repositories")
+    refresh: bool = Field(False, description="Fetch the latest commit and re-index the files that changed")
+
+
+@app.post("/api/index", status_code=202)
+async def create_index_job(request: IndexRequest):
+    """Queue an index build; returns the job, or the repository's job already queued or running."""
+    try:
+        job = get_index_job_queue().submit(request.repo_url, request.type, request.token, request.refresh)
+    except queue.Full:
+        raise HTTPException(status_code=503, detail="Too many index builds are queued, please retry later")
+    return job.to_dict()
+
+
+@app.get("/api/index/{job_id}")
+async def get_index_job(job_id: str):
+    """Return the status and stage-level progress of an index job."""
+    job = get_index_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Index job not found")
+    return job.to_dict()
+
 # Add Living Docs System intelligence router
 from core.lds_router import router as lds_router
 app.include_router(lds_router)
@@ -0,0 +1,149 @@
+"""Search-time filtering of the chunks of a canonical repository index.
+
+Each repository has one index, built with the default file filters of the configuration.
+The directory and file filters of a request, and optional file attributes (extension,
+``is_code``, ``is_implementation``), select a subset of its chunks. The subset is
+evaluated once per file, cached as a bitmap next to the prepared index, and passed to
+FAISS as an ID selector, so switching filters never rebuilds or re-embeds anything.
+"""
+
+import logging
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from core.data_pipeline import CODE_EXTENSIONS, is_implementation_file, resolve_file_filters, should_process_file
+
+logger = logging.getLogger(__name__)
+
+
+def _freeze(values: Optional[List[str]]) -> Optional[Tuple[str, ...]]:
+    return tuple(sorted(set(values))) if values else None
+
+
+@dataclass(frozen=True)
+class ChunkFilter:
+    """
+    The chunks a request searches, by file path and file attributes.
+
+    The directory and file rules have the semantics of ``read_all_documents``: any
+    included directory or file switches to inclusion mode, otherwise the exclusions are
+    added to the configured defaults.
+    """
+
+    excluded_dirs: Optional[Tuple[str, ...]] = None
+    excluded_files: Optional[Tuple[str, ...]] = None
+    included_dirs: Optional[Tuple[str, ...]] = None
+    included_files: Optional[Tuple[str, ...]] = None
+    extensions: Optional[Tuple[str, ...]] = None
+    is_code: Optional[bool] = None
+    is_implementation: Optional[bool] = None
+
+    @classmethod
+    def from_lists(cls, excluded_dirs: List[str] = None, excluded_files: List[str] = None,
+                   included_dirs: List[str] = None, included_files: List[str] = None,
+                   extensions: List[str] = None, is_code: bool = None,
+                   is_implementation: bool = None) -> "ChunkFilter":
+        """Build a hashable filter from the list arguments used throughout the API."""
+        return cls(
+            excluded_dirs=_freeze(excluded_dirs),
+            excluded_files=_freeze(excluded_files),
+            included_dirs=_freeze(included_dirs),
+            included_files=_freeze(included_files),
+            extensions=_freeze(extensions),
+            is_code=is_code,
+            is_implementation=is_implementation,
+        )
+
+    def is_empty(self) -> bool:
+        """Tell whether the filter keeps every chunk of a canonical index."""
+        return self == ChunkFilter()
+
+    def file_mask(self, file_paths: List[str]) -> np.ndarray:
+        """Return, for each file path relative to the repository root, whether its chunks are kept."""
+        rules = resolve_file_filters(
+            *(list(values) if values else None for values in
+              (self.excluded_dirs, self.excluded_files, self.included_dirs, self.included_files))
+        )
+        mask = np.zeros(len(file_paths), dtype=bool)
+        for i, file_path in enumerate(file_paths):
+            ext = os.path.splitext(file_path)[1]
+            is_code = ext in CODE_EXTENSIONS
+            mask[i] = (
+                (self.extensions is None or ext in self.extensions)
+                and (self.is_code is None or is_code == self.is_code)
+                and (self.is_implementation is None
+                     or (is_code and is_implementation_file(file_path)) == self.is_implementation)
+                and should_process_file(file_path, *rules)
+            )
+        return mask
+
+    def chunk_mask(self, file_index: Dict[str, np.ndarray], num_chunks: int) -> np.ndarray:
+        """
+        Expand the file mask to the chunks of an index.
+
+        Args:
+            file_index: ``file_path`` -> positions of its chunks, as built by ``build_file_index``.
+            num_chunks: The number of chunks in the index.
+        """
+        file_paths = list(file_index)
+        mask = np.zeros(num_chunks, dtype=bool)
+        for file_path, keep in zip(file_paths, self.file_mask(file_paths)):
+            if keep:
+                mask[file_index[file_path]] = True
+        return mask
+
+
+def search_parameters(index, mask: np.ndarray):
+    """
+    Build FAISS search parameters that only return the ids set in ``mask``.
+
+    The parameters match the index type and carry its current ``nprobe`` / ``efSearch``,
+    since search parameters replace the values set on the index.
+    """
+    bitmap = np.packbits(mask, bitorder="little")
+    selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap))
+    ivf_index = faiss.try_extract_index_ivf(index)
+    if ivf_index is not None:
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=ivf_index.nprobe)
+    elif hasattr(index, "hnsw"):
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    # The selector reads the bitmap through a raw pointer
+    params.bitmap = bitmap
+    return params
+
+
+class FilteredIndex:
+    """
+    A view of a shared FAISS index that only returns the chunks selected by a bitmap.
+
+    The view is created per retriever; the underlying index is never modified. Searches
+    over IVF and HNSW indexes stay approximate, and a very selective filter can return
+    fewer than ``k`` results from an HNSW graph.
+    """
+
+    def __init__(self, index, mask: np.ndarray):
+        self.index = index
+        self.mask = mask
+        self.count = int(mask.sum())
+        self._params = search_parameters(getattr(index, "base_index", index), mask)
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    @property
+    def d(self) -> int:
+        return self.index.d
+
+    @property
+    def metric_type(self) -> int:
+        return self.index.metric_type
+
+    def search(self, xq: np.ndarray, k: int):
+        return self.index.search(np.asarray(xq, dtype=np.float32), k, params=self._params)
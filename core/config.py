@@ -342,16 +342,21 @@ lang_config = load_lang_config()
 if generator_config:
     configs["default_provider"] = generator_config.get("default_provider", "google")
     configs["providers"] = generator_config.get("providers", {})
+    configs["context_packing"] = generator_config.get("context_packing", {})
+    configs["model_clients"] = generator_config.get("model_clients", {})
+    configs["streaming"] = generator_config.get("streaming", {})
 
 # Update embedder configuration
 if embedder_config:
-    for key in ["embedder", "embedder_ollama", "embedder_google", "embedder_bedrock", "retriever", "text_splitter"]:
+    for key in ["embedder", "embedder_ollama", "embedder_google", "embedder_bedrock", "retriever", "text_splitter",
+                "embedding_cache", "embedding_scheduler", "retriever_cache", "ann_index",
+                "query_embedding_cache"]:
         if key in embedder_config:
             configs[key] = embedder_config[key]
 
 # Update repository configuration
 if repo_config:
-    for key in ["file_filters", "repository"]:
+    for key in ["file_filters", "repository", "ingestion", "index_jobs", "file_fetch"]:
         if key in repo_config:
             configs[key] = repo_config[key]
 
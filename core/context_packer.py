@@ -0,0 +1,112 @@
+"""Token-budgeted packing of retrieved chunks into the prompt context.
+
+The chat handlers used to paste every retrieved chunk into the prompt and, when the
+model rejected it as too long, send the whole request again without context. Instead,
+the context is filled in retrieval order up to the tokens the model has left once the
+rest of the prompt and the expected answer are accounted for. Chunk sizes come from the
+token counts stored with each chunk when it was split, so packing does not tokenize the
+retrieved text again.
+"""
+
+import logging
+from typing import List, Sequence, Tuple
+
+from adalflow.core.types import Document
+
+from core.config import configs
+from core.data_pipeline import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Tokens of the blank lines joining two chunks
+_CHUNK_SEPARATOR_TOKENS = 2
+
+
+def get_context_window(provider: str, model: str = None) -> int:
+    """
+    Return the context window, in tokens, of a generator model.
+
+    ``context_packing.model_context_windows`` in ``generator.json`` takes precedence,
+    then the ``num_ctx`` option of Ollama models, then the provider's window.
+    """
+    packing_config = configs.get("context_packing", {})
+    provider_config = configs.get("providers", {}).get(provider, {})
+    model = model or provider_config.get("default_model")
+
+    model_windows = packing_config.get("model_context_windows", {})
+    if model in model_windows:
+        return model_windows[model]
+    options = provider_config.get("models", {}).get(model, {}).get("options", {})
+    if "num_ctx" in options:
+        return options["num_ctx"]
+    return packing_config.get("provider_context_windows", {}).get(
+        provider, packing_config.get("default_context_window", 128000)
+    )
+
+
+def get_context_budget(provider: str, model: str, prompt_tokens: int) -> int:
+    """
+    Return how many tokens of retrieved context fit in a prompt.
+
+    Args:
+        prompt_tokens: Tokens of the prompt without the retrieved context.
+    """
+    packing_config = configs.get("context_packing", {})
+    available = (
+        get_context_window(provider, model)
+        - prompt_tokens
+        - packing_config.get("reserved_output_tokens", 4096)
+    )
+    return max(0, min(packing_config.get("max_context_tokens", 32000), available))
+
+
+def chunk_token_count(doc: Document, embedder_type: str = None) -> int:
+    """Return the stored token count of a chunk, counting it only if none was stored."""
+    if doc.estimated_num_tokens is not None:
+        return int(doc.estimated_num_tokens)
+    return count_tokens(doc.text, embedder_type)
+
+
+def pack_context(documents: Sequence[Document], budget_tokens: int,
+                 embedder_type: str = None) -> Tuple[str, List[Document]]:
+    """
+    Format retrieved chunks as prompt context within a token budget.
+
+    Chunks are taken in retrieval order; a chunk that does not fit is skipped and later,
+    smaller chunks may still be packed. Packed chunks are grouped under a header per file
+    in the order the files were first retrieved.
+
+    Returns:
+        tuple: (context text, packed documents). The text is empty if nothing fits.
+    """
+    docs_by_file = {}
+    used = 0
+    packed = []
+    for doc in documents:
+        file_path = (doc.meta_data or {}).get("file_path", "unknown")
+        cost = chunk_token_count(doc, embedder_type) + _CHUNK_SEPARATOR_TOKENS
+        if file_path not in docs_by_file:
+            cost += count_tokens(f"## File Path: {file_path}\n\n", embedder_type)
+        if used + cost > budget_tokens:
+            continue
+        used += cost
+        docs_by_file.setdefault(file_path, []).append(doc)
+        packed.append(doc)
+
+    if len(packed) < len(documents):
+        logger.info(
+            f"Packed {len(packed)} of {len(documents)} retrieved chunks "
+            f"({used} tokens, budget {budget_tokens})"
+        )
+    if not packed:
+        return "", []
+
+    # Format context text with file path grouping
+    context_parts = []
+    for file_path, docs in docs_by_file.items():
+        header = f"## File Path: {file_path}\n\n"
+        content = "\n\n".join([doc.text for doc in docs])
+        context_parts.append(f"{header}{content}")
+
+    # Join all parts with clear separation
+    return "\n\n" + "-" * 10 + "\n\n".join(context_parts), packed
@@ -1,17 +1,24 @@
 import adalflow as adal
 from adalflow.core.types import Document, List
-from adalflow.components.data_process import TextSplitter, ToEmbeddings
+from typing import Dict, Optional, Tuple
+from adalflow.components.data_process import TextSplitter
 import os
 import subprocess
 import json
 import tiktoken
 import logging
+import threading
 import base64
-import glob
+import hashlib
+from itertools import islice, repeat
 from adalflow.utils import get_adalflow_default_root_path
 from adalflow.core.db import LocalDB
 from core.config import configs, DEFAULT_EXCLUDED_DIRS, DEFAULT_EXCLUDED_FILES
 from core.ollama_patch import OllamaDocumentProcessor
+from core.embedding_cache import CachedEmbeddings, embedding_namespace, get_embedding_cache
+from core.embedding_scheduler import ConcurrentToEmbeddings
+from core.index_builds import ProgressCallback, get_build_coordinator, no_progress
+from core.index_store import IndexStore, index_store_exists, save_index_store
 from urllib.parse import urlparse, urlunparse, quote
 import requests
 from requests.exceptions import RequestException
@@ -24,6 +31,62 @@ logger = logging.getLogger(__name__)
 # Maximum token limit for OpenAI embedding models
 MAX_EMBEDDING_TOKENS = 8192
 
+# Bytes per token when tiktoken is unavailable: count_tokens falls back to 4 characters
+# per token, and a UTF-8 character takes at most 4 bytes
+_FALLBACK_BYTES_PER_TOKEN = 16
+
+# Tokenizer registry: one tiktoken encoding per embedder type per process
+_encodings = {}
+_encodings_lock = threading.Lock()
+# Encoding name -> length in bytes of its longest token
+_max_token_bytes = {}
+
+
+def _resolve_embedder_type(embedder_type: str = None, is_ollama_embedder: bool = None) -> str:
+    # Handle backward compatibility
+    if embedder_type is None and is_ollama_embedder is not None:
+        embedder_type = 'ollama' if is_ollama_embedder else None
+
+    # Determine embedder type if not specified
+    if embedder_type is None:
+        from core.config import get_embedder_type
+        embedder_type = get_embedder_type()
+    return embedder_type
+
+
+def get_tokenizer(embedder_type: str = None):
+    """
+    Return the tiktoken encoding used to count tokens for an embedder type.
+
+    Encodings are built once per process and reused; failures are not cached.
+
+    Args:
+        embedder_type (str, optional): The embedder type ('openai', 'google', 'ollama', 'bedrock').
+                                     If None, will be determined from configuration.
+
+    Returns:
+        tiktoken.Encoding: The encoding for the embedder type.
+    """
+    embedder_type = _resolve_embedder_type(embedder_type)
+    encoding = _encodings.get(embedder_type)
+    if encoding is not None:
+        return encoding
+
+    with _encodings_lock:
+        encoding = _encodings.get(embedder_type)
+        if encoding is None:
+            # Choose encoding based on embedder type
+            if embedder_type in ('ollama', 'google', 'bedrock'):
+                # Ollama typically uses cl100k_base; Google and Bedrock models use
+                # similar tokenization, cl100k_base is used for rough estimation
+                encoding = tiktoken.get_encoding("cl100k_base")
+            else:  # OpenAI or default
+                # Use OpenAI embedding model encoding
+                encoding = tiktoken.encoding_for_model("text-embedding-3-small")
+            _encodings[embedder_type] = encoding
+    return encoding
+
+
 def count_tokens(text: str, embedder_type: str = None, is_ollama_embedder: bool = None) -> int:
     """
     Count the number of tokens in a text string using tiktoken.
@@ -39,30 +102,8 @@ def count_tokens(text: str, embedder_type: str = None, is_ollama_embedder: bool
         int: The number of tokens in the text.
     """
     try:
-        # Handle backward compatibility
-        if embedder_type is None and is_ollama_embedder is not None:
-            embedder_type = 'ollama' if is_ollama_embedder else None
-        
-        # Determine embedder type if not specified
-        if embedder_type is None:
-            from core.config import get_embedder_type
-            embedder_type = get_embedder_type()
-
-        # Choose encoding based on embedder type
-        if embedder_type == 'ollama':
-            # Ollama typically uses cl100k_base encoding
-            encoding = tiktoken.get_encoding("cl100k_base")
-        elif embedder_type == 'google':
-            # Google uses similar tokenization to GPT models for rough estimation
-            encoding = tiktoken.get_encoding("cl100k_base")
-        elif embedder_type == 'bedrock':
-            # Bedrock embedding models vary; use a common GPT-like encoding for rough estimation
-            encoding = tiktoken.get_encoding("cl100k_base")
-        else:  # OpenAI or default
-            # Use OpenAI embedding model encoding
-            encoding = tiktoken.encoding_for_model("text-embedding-3-small")
-
-        return len(encoding.encode(text))
+        encoding = get_tokenizer(_resolve_embedder_type(embedder_type, is_ollama_embedder))
+        return len(encoding.encode(text, disallowed_special=()))
     except Exception as e:
         # Fallback to a simple approximation if tiktoken fails
         logger.warning(f"Error counting tokens with tiktoken: {e}")
@@ -70,13 +111,110 @@ def count_tokens(text: str, embedder_type: str = None, is_ollama_embedder: bool
         return len(text) // 4
 
 
-def _download_repo_via_zip(repo_url: str, local_path: str, repo_type: str = None, access_token: str = None) -> str:
+def count_tokens_batch(texts: List[str], embedder_type: str = None) -> List[int]:
+    """
+    Count the number of tokens in several texts at once.
+
+    Uses tiktoken's multi-threaded ``encode_batch`` with the cached encoding.
+
+    Args:
+        texts (List[str]): The texts to count tokens for.
+        embedder_type (str, optional): The embedder type ('openai', 'google', 'ollama', 'bedrock').
+                                     If None, will be determined from configuration.
+
+    Returns:
+        List[int]: The number of tokens of each text, in input order.
+    """
+    if not texts:
+        return []
+    try:
+        encoding = get_tokenizer(embedder_type)
+        return [len(tokens) for tokens in encoding.encode_batch(texts, disallowed_special=())]
+    except Exception as e:
+        logger.warning(f"Error counting tokens with tiktoken: {e}")
+        return [len(text) // 4 for text in texts]
+
+
+def max_token_bytes(embedder_type: str = None) -> int:
+    """
+    Return the length in bytes of the longest token of an embedder type's tokenizer.
+
+    No input longer than ``token_limit`` times this length can be encoded in
+    ``token_limit`` tokens.
+    """
+    try:
+        encoding = get_tokenizer(embedder_type)
+    except Exception as e:
+        logger.warning(f"Error loading tiktoken encoding: {e}")
+        return _FALLBACK_BYTES_PER_TOKEN
+    longest = _max_token_bytes.get(encoding.name)
+    if longest is None:
+        longest = _max_token_bytes[encoding.name] = max(len(token) for token in encoding.token_byte_values())
+    return longest
+
+
+def exceeds_token_limit_by_length(length: int, token_limit: int, embedder_type: str = None) -> bool:
+    """
+    Cheap pre-check that rejects inputs too long to fit in ``token_limit`` tokens.
+
+    Only inputs that even a count of one longest token per slot could not fit are
+    rejected, so anything this check lets through is left to the real token count.
+
+    Args:
+        length (int): The input length in bytes.
+        token_limit (int): The token limit to check against.
+        embedder_type (str, optional): The embedder type whose tokenizer counts the tokens.
+
+    Returns:
+        bool: True if the input is oversized without needing to be encoded.
+    """
+    return length > token_limit * max_token_bytes(embedder_type)
+
+
+# Chunk size used to stream downloads to disk and to copy archive members
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def _zip_member_wanted(member_path: str, file_size: int, filter_sets: List[tuple]) -> bool:
+    """
+    Decide whether an archive member is worth extracting.
+
+    Applies the rules ``read_all_documents`` would apply later: hidden paths, files
+    without an indexed extension and files too large to embed are skipped so they never
+    touch disk, as are files that none of ``filter_sets`` (as returned by
+    ``resolve_file_filters``) selects.
+    """
+    parts = member_path.split('/')
+    if any(part.startswith('.') for part in parts):
+        return False
+
+    ext = os.path.splitext(parts[-1])[1]
+    if ext in CODE_EXTENSIONS:
+        token_limit = MAX_EMBEDDING_TOKENS * 10
+    elif ext in DOC_EXTENSIONS:
+        token_limit = MAX_EMBEDDING_TOKENS
+    else:
+        return False
+
+    if exceeds_token_limit_by_length(file_size, token_limit):
+        return False
+    return any(should_process_file(os.path.join(*parts), *filters) for filters in filter_sets)
+
+
+def _download_repo_via_zip(repo_url: str, local_path: str, repo_type: str = None, access_token: str = None,
+                           file_filters: tuple = None) -> str:
     """
     Downloads a repository as a ZIP archive via the hosting API and extracts it.
     Used as fallback when git is not available on the system.
+
+    The archive is spooled to a temporary file in chunks and extracted member by member.
+    Members that neither the default file filters nor ``file_filters`` (the filters of the
+    request, as returned by ``resolve_file_filters``) would select are skipped. The
+    extracted repository is shared by later requests, so the default filters always apply.
     """
+    import shutil
+    import tempfile
     import zipfile
-    import io
 
     parsed = urlparse(repo_url)
     path_parts = parsed.path.strip('/').split('/')
@@ -109,42 +247,182 @@ def _download_repo_via_zip(repo_url: str, local_path: str, repo_type: str = None
         raise ValueError(f"Cannot determine ZIP download URL for repo_type={repo_type!r}, url={repo_url!r}")
 
     logger.info(f"Downloading repo as ZIP from {zip_url}")
-    response = requests.get(zip_url, headers=headers, timeout=120, stream=True)
-    if not response.ok:
-        raise ValueError(f"Failed to download ZIP archive: HTTP {response.status_code} from {zip_url}")
-
-    logger.info("Extracting ZIP archive...")
-    os.makedirs(local_path, exist_ok=True)
-
-    with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
-        # ZIP from GitHub has a top-level folder like "owner-repo-{sha}/..."
-        # We extract everything and then move the inner folder contents up
-        members = zf.namelist()
-        # Find common prefix (top-level dir inside the zip)
-        top_dir = members[0].split('/')[0] if members else None
-        for member in members:
-            # Strip the top-level directory from the path
-            member_path = member
-            if top_dir and member_path.startswith(top_dir + '/'):
-                member_path = member_path[len(top_dir) + 1:]
-            if not member_path:
-                continue
-            target = os.path.join(local_path, member_path)
-            if member.endswith('/'):
-                os.makedirs(target, exist_ok=True)
-            else:
+    filter_sets = [resolve_file_filters()]
+    if file_filters is not None:
+        filter_sets.append(file_filters)
+    local_root = os.path.realpath(local_path)
+
+    with tempfile.TemporaryFile() as archive:
+        with requests.get(zip_url, headers=headers, timeout=120, stream=True) as response:
+            if not response.ok:
+                raise ValueError(f"Failed to download ZIP archive: HTTP {response.status_code} from {zip_url}")
+            for chunk in response.iter_content(chunk_size=_COPY_CHUNK_SIZE):
+                archive.write(chunk)
+        archive.seek(0)
+
+        logger.info("Extracting ZIP archive...")
+        os.makedirs(local_path, exist_ok=True)
+
+        extracted = 0
+        skipped = 0
+        with zipfile.ZipFile(archive) as zf:
+            # ZIP from GitHub has a top-level folder like "owner-repo-{sha}/..."
+            # We strip it so the repository contents land directly in local_path
+            members = zf.infolist()
+            top_dir = members[0].filename.split('/')[0] if members else None
+            for info in members:
+                if info.is_dir():
+                    continue
+                # Strip the top-level directory from the path
+                member_path = info.filename
+                if top_dir and member_path.startswith(top_dir + '/'):
+                    member_path = member_path[len(top_dir) + 1:]
+                if not member_path:
+                    continue
+                if not _zip_member_wanted(member_path, info.file_size, filter_sets):
+                    skipped += 1
+                    continue
+
+                target = os.path.realpath(os.path.join(local_path, member_path))
+                if not target.startswith(local_root + os.sep):
+                    logger.warning(f"Skipping archive member outside the target directory: {info.filename}")
+                    skipped += 1
+                    continue
                 os.makedirs(os.path.dirname(target), exist_ok=True)
-                with zf.open(member) as source, open(target, 'wb') as dest:
-                    dest.write(source.read())
+                with zf.open(info) as source, open(target, 'wb') as dest:
+                    shutil.copyfileobj(source, dest, _COPY_CHUNK_SIZE)
+                extracted += 1
 
-    logger.info(f"Repository extracted to {local_path}")
+    logger.info(f"Repository extracted to {local_path} ({extracted} files extracted, {skipped} skipped)")
     return f"Repository downloaded and extracted to {local_path}"
 
 
-def download_repo(repo_url: str, local_path: str, repo_type: str = None, access_token: str = None) -> str:
+def _authenticated_clone_url(repo_url: str, repo_type: str = None, access_token: str = None) -> str:
+    """Embed an access token in a clone URL the way each hosting service expects it."""
+    if not access_token:
+        return repo_url
+    parsed = urlparse(repo_url)
+    encoded_token = quote(access_token, safe='')
+    logger.info("Using access token for authentication")
+    if repo_type == "github":
+        return urlunparse((parsed.scheme, f"{encoded_token}@{parsed.netloc}", parsed.path, '', '', ''))
+    elif repo_type == "gitlab":
+        return urlunparse((parsed.scheme, f"oauth2:{encoded_token}@{parsed.netloc}", parsed.path, '', '', ''))
+    elif repo_type == "bitbucket":
+        return urlunparse((parsed.scheme, f"x-token-auth:{encoded_token}@{parsed.netloc}", parsed.path, '', '', ''))
+    return repo_url
+
+
+def _redact_token(message: str, access_token: str = None) -> str:
+    if access_token:
+        message = message.replace(access_token, "***TOKEN***")
+        message = message.replace(quote(access_token, safe=''), "***TOKEN***")
+    return message
+
+
+def _run_git(local_path: str, *args: str) -> str:
+    result = subprocess.run(
+        ["git", "-C", local_path, *args],
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    return result.stdout.decode("utf-8")
+
+
+def get_repo_head(local_path: str):
+    """
+    Return the commit checked out in a local clone.
+
+    Returns:
+        str or None: The HEAD commit hash, or None if ``local_path`` is not a git checkout
+        (e.g. it was extracted from a ZIP archive).
+    """
+    if not os.path.isdir(os.path.join(local_path, ".git")):
+        return None
+    try:
+        return _run_git(local_path, "rev-parse", "HEAD").strip()
+    except Exception as e:
+        logger.warning(f"Could not read HEAD of {local_path}: {e}")
+        return None
+
+
+def get_changed_files(local_path: str, old_head: str, new_head: str) -> List[str]:
+    """
+    List the paths that differ between two commits of a local clone.
+
+    Parses ``git diff --name-status`` with rename detection disabled, so a renamed file
+    is reported as its deleted old path and its added new path.
+
+    Returns:
+        List[str]: Changed paths relative to the repository root, using ``/`` separators.
+    """
+    if old_head == new_head:
+        return []
+    output = _run_git(local_path, "diff", "--name-status", "--no-renames", old_head, new_head)
+    changed = []
+    for line in output.splitlines():
+        fields = line.split("\t")
+        if len(fields) < 2:
+            continue
+        for changed_path in fields[1:]:
+            if changed_path not in changed:
+                changed.append(changed_path)
+    return changed
+
+
+def refresh_repo(local_path: str, repo_url: str = None, repo_type: str = None, access_token: str = None):
+    """
+    Update an existing clone to the latest commit of its remote.
+
+    Runs a shallow ``git fetch`` followed by ``git reset --hard FETCH_HEAD`` and reports
+    which files changed between the old and the new HEAD.
+
+    Args:
+        local_path (str): The existing clone.
+        repo_url (str, optional): The repository URL to fetch from. Defaults to the ``origin`` remote.
+        repo_type (str, optional): Type of repository, used to embed the access token.
+        access_token (str, optional): Access token for private repositories.
+
+    Returns:
+        dict or None: ``{"old_head", "new_head", "changed_files"}``, or None if ``local_path``
+        is not a git checkout.
+
+    Raises:
+        ValueError: If fetching or resetting the clone fails.
+    """
+    old_head = get_repo_head(local_path)
+    if old_head is None:
+        logger.info(f"{local_path} is not a git checkout, cannot refresh it with git")
+        return None
+
+    source = _authenticated_clone_url(repo_url, repo_type, access_token) if repo_url else "origin"
+    try:
+        logger.info(f"Fetching latest changes into {local_path}")
+        _run_git(local_path, "fetch", "--depth=1", source, "HEAD")
+        _run_git(local_path, "reset", "--hard", "FETCH_HEAD")
+        new_head = get_repo_head(local_path)
+        changed_files = get_changed_files(local_path, old_head, new_head)
+    except subprocess.CalledProcessError as e:
+        error_msg = _redact_token(e.stderr.decode('utf-8'), access_token)
+        raise ValueError(f"Error during refresh: {error_msg}")
+
+    logger.info(f"Refreshed {local_path}: {old_head[:12]} -> {new_head[:12]}, {len(changed_files)} changed files")
+    return {
+        "old_head": old_head,
+        "new_head": new_head,
+        "changed_files": changed_files,
+    }
+
+
+def download_repo(repo_url: str, local_path: str, repo_type: str = None, access_token: str = None,
+                  file_filters: tuple = None) -> str:
     """
     Downloads a Git repository (GitHub, GitLab, or Bitbucket) to a specified local path.
     Tries git clone first; falls back to ZIP download via API if git is not available.
+
+    ``file_filters`` are the filters of the request, as returned by ``resolve_file_filters``;
+    the ZIP download also extracts the files they select.
     """
     # Check if repository already exists
     if os.path.exists(local_path) and os.listdir(local_path):
@@ -169,17 +447,7 @@ def download_repo(repo_url: str, local_path: str, repo_type: str = None, access_
     if git_available:
         try:
             os.makedirs(local_path, exist_ok=True)
-            clone_url = repo_url
-            if access_token:
-                parsed = urlparse(repo_url)
-                encoded_token = quote(access_token, safe='')
-                if repo_type == "github":
-                    clone_url = urlunparse((parsed.scheme, f"{encoded_token}@{parsed.netloc}", parsed.path, '', '', ''))
-                elif repo_type == "gitlab":
-                    clone_url = urlunparse((parsed.scheme, f"oauth2:{encoded_token}@{parsed.netloc}", parsed.path, '', '', ''))
-                elif repo_type == "bitbucket":
-                    clone_url = urlunparse((parsed.scheme, f"x-token-auth:{encoded_token}@{parsed.netloc}", parsed.path, '', '', ''))
-                logger.info("Using access token for authentication")
+            clone_url = _authenticated_clone_url(repo_url, repo_type, access_token)
 
             logger.info(f"Cloning repository from {repo_url} to {local_path}")
             result = subprocess.run(
@@ -191,17 +459,14 @@ def download_repo(repo_url: str, local_path: str, repo_type: str = None, access_
             logger.info("Repository cloned successfully")
             return result.stdout.decode("utf-8")
         except subprocess.CalledProcessError as e:
-            error_msg = e.stderr.decode('utf-8')
-            if access_token:
-                error_msg = error_msg.replace(access_token, "***TOKEN***")
-                error_msg = error_msg.replace(quote(access_token, safe=''), "***TOKEN***")
+            error_msg = _redact_token(e.stderr.decode('utf-8'), access_token)
             raise ValueError(f"Error during cloning: {error_msg}")
         except Exception as e:
             raise ValueError(f"An unexpected error occurred during git clone: {str(e)}")
 
     # Fallback: download via ZIP archive
     try:
-        return _download_repo_via_zip(repo_url, local_path, repo_type, access_token)
+        return _download_repo_via_zip(repo_url, local_path, repo_type, access_token, file_filters)
     except Exception as e:
         raise ValueError(f"An unexpected error occurred: {str(e)}")
 
@@ -210,39 +475,24 @@ def download_repo(repo_url: str, local_path: str, repo_type: str = None, access_
 download_github_repo = download_repo
 
 
-def read_all_documents(path: str, embedder_type: str = None, is_ollama_embedder: bool = None, 
-                      excluded_dirs: List[str] = None, excluded_files: List[str] = None,
-                      included_dirs: List[str] = None, included_files: List[str] = None):
+# File extensions to look for, prioritizing code files
+CODE_EXTENSIONS = [".py", ".js", ".ts", ".java", ".cpp", ".c", ".h", ".hpp", ".go", ".rs",
+                   ".jsx", ".tsx", ".html", ".css", ".php", ".swift", ".cs"]
+DOC_EXTENSIONS = [".md", ".txt", ".rst", ".json", ".yaml", ".yml"]
+
+
+def resolve_file_filters(excluded_dirs: List[str] = None, excluded_files: List[str] = None,
+                         included_dirs: List[str] = None, included_files: List[str] = None):
     """
-    Recursively reads all documents in a directory and its subdirectories.
+    Resolve the effective inclusion/exclusion rules for a repository walk.
 
-    Args:
-        path (str): The root directory path.
-        embedder_type (str, optional): The embedder type ('openai', 'google', 'ollama').
-                                     If None, will be determined from configuration.
-        is_ollama_embedder (bool, optional): DEPRECATED. Use embedder_type instead.
-                                           If None, will be determined from configuration.
-        excluded_dirs (List[str], optional): List of directories to exclude from processing.
-            Overrides the default configuration if provided.
-        excluded_files (List[str], optional): List of file patterns to exclude from processing.
-            Overrides the default configuration if provided.
-        included_dirs (List[str], optional): List of directories to include exclusively.
-            When provided, only files in these directories will be processed.
-        included_files (List[str], optional): List of file patterns to include exclusively.
-            When provided, only files matching these patterns will be processed.
+    Inclusion mode is used as soon as any included directory or file is given; otherwise
+    the default exclusions, the ``file_filters`` from the repo configuration and any
+    explicitly provided exclusions are merged.
 
     Returns:
-        list: A list of Document objects with metadata.
+        tuple: (use_inclusion_mode, included_dirs, included_files, excluded_dirs, excluded_files)
     """
-    # Handle backward compatibility
-    if embedder_type is None and is_ollama_embedder is not None:
-        embedder_type = 'ollama' if is_ollama_embedder else None
-    documents = []
-    # File extensions to look for, prioritizing code files
-    code_extensions = [".py", ".js", ".ts", ".java", ".cpp", ".c", ".h", ".hpp", ".go", ".rs",
-                       ".jsx", ".tsx", ".html", ".css", ".php", ".swift", ".cs"]
-    doc_extensions = [".md", ".txt", ".rst", ".json", ".yaml", ".yml"]
-
     # Determine filtering mode: inclusion or exclusion
     use_inclusion_mode = (included_dirs is not None and len(included_dirs) > 0) or (included_files is not None and len(included_files) > 0)
 
@@ -255,191 +505,380 @@ def read_all_documents(path: str, embedder_type: str = None, is_ollama_embedder:
         logger.info(f"Included directories: {list(final_included_dirs)}")
         logger.info(f"Included files: {list(final_included_files)}")
 
-        # Convert to lists for processing
-        included_dirs = list(final_included_dirs)
-        included_files = list(final_included_files)
-        excluded_dirs = []
-        excluded_files = []
-    else:
-        # Exclusion mode: use default exclusions plus any additional ones
-        final_excluded_dirs = set(DEFAULT_EXCLUDED_DIRS)
-        final_excluded_files = set(DEFAULT_EXCLUDED_FILES)
+        return True, list(final_included_dirs), list(final_included_files), [], []
 
-        # Add any additional excluded directories from config
-        if "file_filters" in configs and "excluded_dirs" in configs["file_filters"]:
-            final_excluded_dirs.update(configs["file_filters"]["excluded_dirs"])
+    # Exclusion mode: use default exclusions plus any additional ones
+    final_excluded_dirs = set(DEFAULT_EXCLUDED_DIRS)
+    final_excluded_files = set(DEFAULT_EXCLUDED_FILES)
 
-        # Add any additional excluded files from config
-        if "file_filters" in configs and "excluded_files" in configs["file_filters"]:
-            final_excluded_files.update(configs["file_filters"]["excluded_files"])
+    # Add any additional excluded directories from config
+    if "file_filters" in configs and "excluded_dirs" in configs["file_filters"]:
+        final_excluded_dirs.update(configs["file_filters"]["excluded_dirs"])
 
-        # Add any explicitly provided excluded directories and files
-        if excluded_dirs is not None:
-            final_excluded_dirs.update(excluded_dirs)
+    # Add any additional excluded files from config
+    if "file_filters" in configs and "excluded_files" in configs["file_filters"]:
+        final_excluded_files.update(configs["file_filters"]["excluded_files"])
 
-        if excluded_files is not None:
-            final_excluded_files.update(excluded_files)
+    # Add any explicitly provided excluded directories and files
+    if excluded_dirs is not None:
+        final_excluded_dirs.update(excluded_dirs)
 
-        # Convert back to lists for compatibility
-        excluded_dirs = list(final_excluded_dirs)
-        excluded_files = list(final_excluded_files)
-        included_dirs = []
-        included_files = []
+    if excluded_files is not None:
+        final_excluded_files.update(excluded_files)
 
-        logger.info(f"Using exclusion mode")
-        logger.info(f"Excluded directories: {excluded_dirs}")
-        logger.info(f"Excluded files: {excluded_files}")
+    logger.info(f"Using exclusion mode")
+    logger.info(f"Excluded directories: {list(final_excluded_dirs)}")
+    logger.info(f"Excluded files: {list(final_excluded_files)}")
 
-    logger.info(f"Reading documents from {path}")
+    return False, [], [], list(final_excluded_dirs), list(final_excluded_files)
 
-    def should_process_file(file_path: str, use_inclusion: bool, included_dirs: List[str], included_files: List[str],
-                           excluded_dirs: List[str], excluded_files: List[str]) -> bool:
-        """
-        Determine if a file should be processed based on inclusion/exclusion rules.
 
-        Args:
-            file_path (str): The file path to check
-            use_inclusion (bool): Whether to use inclusion mode
-            included_dirs (List[str]): List of directories to include
-            included_files (List[str]): List of files to include
-            excluded_dirs (List[str]): List of directories to exclude
-            excluded_files (List[str]): List of files to exclude
+def should_process_file(file_path: str, use_inclusion: bool, included_dirs: List[str], included_files: List[str],
+                        excluded_dirs: List[str], excluded_files: List[str]) -> bool:
+    """
+    Determine if a file should be processed based on inclusion/exclusion rules.
 
-        Returns:
-            bool: True if the file should be processed, False otherwise
-        """
-        file_path_parts = os.path.normpath(file_path).split(os.sep)
-        file_name = os.path.basename(file_path)
+    Args:
+        file_path (str): The file path to check, relative to the repository root
+        use_inclusion (bool): Whether to use inclusion mode
+        included_dirs (List[str]): List of directories to include
+        included_files (List[str]): List of files to include
+        excluded_dirs (List[str]): List of directories to exclude
+        excluded_files (List[str]): List of files to exclude
+
+    Returns:
+        bool: True if the file should be processed, False otherwise
+    """
+    file_path_parts = os.path.normpath(file_path).split(os.sep)
+    file_name = os.path.basename(file_path)
+
+    if use_inclusion:
+        # If no inclusion rules are specified, allow all files
+        if not included_dirs and not included_files:
+            return True
+
+        # Check if file is in an included directory
+        for included in included_dirs or []:
+            if included.strip("./").rstrip("/") in file_path_parts:
+                return True
 
+        # Check if file matches included file patterns
+        for included_file in included_files or []:
+            if file_name == included_file or file_name.endswith(included_file):
+                return True
+
+        return False
+
+    # Exclusion mode: file must not be in excluded directories or match excluded files
+    for excluded in excluded_dirs:
+        if excluded.strip("./").rstrip("/") in file_path_parts:
+            return False
+
+    return file_name not in excluded_files
+
+
+def iter_repo_files(path: str, use_inclusion: bool, included_dirs: List[str], included_files: List[str],
+                    excluded_dirs: List[str], excluded_files: List[str]):
+    """
+    Walk a repository once and yield the files that should be indexed.
+
+    The tree is traversed once with ``os.scandir``. In exclusion mode, excluded
+    directories are pruned before descending; in inclusion mode, everything below an
+    included directory is accepted without re-checking each file. Hidden entries are
+    skipped and symlinked directories are not followed. Matching is done on paths
+    relative to ``path``.
+
+    Candidates are bucketed by extension during the walk and then streamed code files
+    first, followed by documentation files, each in ``CODE_EXTENSIONS`` /
+    ``DOC_EXTENSIONS`` order.
+
+    Yields:
+        tuple: (absolute file path, extension, is_code)
+    """
+    clean_included_dirs = {d.strip("./").rstrip("/") for d in included_dirs or []}
+    clean_excluded_dirs = {d.strip("./").rstrip("/") for d in excluded_dirs or []}
+    excluded_file_names = set(excluded_files or [])
+    included_file_patterns = list(included_files or [])
+    include_everything = use_inclusion and not clean_included_dirs and not included_file_patterns
+
+    buckets = {ext: [] for ext in CODE_EXTENSIONS + DOC_EXTENSIONS}
+
+    def _accept_file(name: str, inside_included_dir: bool) -> bool:
         if use_inclusion:
-            # Inclusion mode: file must be in included directories or match included files
-            is_included = False
-
-            # Check if file is in an included directory
-            if included_dirs:
-                for included in included_dirs:
-                    clean_included = included.strip("./").rstrip("/")
-                    if clean_included in file_path_parts:
-                        is_included = True
-                        break
-
-            # Check if file matches included file patterns
-            if not is_included and included_files:
-                for included_file in included_files:
-                    if file_name == included_file or file_name.endswith(included_file):
-                        is_included = True
-                        break
-
-            # If no inclusion rules are specified for a category, allow all files from that category
-            if not included_dirs and not included_files:
-                is_included = True
-            elif not included_dirs and included_files:
-                # Only file patterns specified, allow all directories
-                pass  # is_included is already set based on file patterns
-            elif included_dirs and not included_files:
-                # Only directory patterns specified, allow all files in included directories
-                pass  # is_included is already set based on directory patterns
-
-            return is_included
-        else:
-            # Exclusion mode: file must not be in excluded directories or match excluded files
-            is_excluded = False
-
-            # Check if file is in an excluded directory
-            for excluded in excluded_dirs:
-                clean_excluded = excluded.strip("./").rstrip("/")
-                if clean_excluded in file_path_parts:
-                    is_excluded = True
-                    break
-
-            # Check if file matches excluded file patterns
-            if not is_excluded:
-                for excluded_file in excluded_files:
-                    if file_name == excluded_file:
-                        is_excluded = True
-                        break
-
-            return not is_excluded
-
-    # Process code files first
-    for ext in code_extensions:
-        files = glob.glob(f"{path}/**/*{ext}", recursive=True)
-        for file_path in files:
-            # Check if file should be processed based on inclusion/exclusion rules
-            if not should_process_file(file_path, use_inclusion_mode, included_dirs, included_files, excluded_dirs, excluded_files):
+            if include_everything or inside_included_dir or name in clean_included_dirs:
+                return True
+            return any(name == pattern or name.endswith(pattern) for pattern in included_file_patterns)
+        return name not in clean_excluded_dirs and name not in excluded_file_names
+
+    # Depth-first, files of a directory before its subdirectories, names sorted for a stable order
+    stack = [(path, False)]
+    while stack:
+        current_dir, inside_included_dir = stack.pop()
+        try:
+            with os.scandir(current_dir) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            logger.warning(f"Cannot list directory {current_dir}: {e}")
+            continue
+
+        subdirs = []
+        for entry in entries:
+            name = entry.name
+            if name.startswith("."):
                 continue
-
             try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    content = f.read()
-                    relative_path = os.path.relpath(file_path, path)
-
-                    # Determine if this is an implementation file
-                    is_implementation = (
-                        not relative_path.startswith("test_")
-                        and not relative_path.startswith("app_")
-                        and "test" not in relative_path.lower()
-                    )
-
-                    # Check token count
-                    token_count = count_tokens(content, embedder_type)
-                    if token_count > MAX_EMBEDDING_TOKENS * 10:
-                        logger.warning(f"Skipping large file {relative_path}: Token count ({token_count}) exceeds limit")
-                        continue
-
-                    doc = Document(
-                        text=content,
-                        meta_data={
-                            "file_path": relative_path,
-                            "type": ext[1:],
-                            "is_code": True,
-                            "is_implementation": is_implementation,
-                            "title": relative_path,
-                            "token_count": token_count,
-                        },
-                    )
-                    documents.append(doc)
-            except Exception as e:
-                logger.error(f"Error reading {file_path}: {e}")
-
-    # Then process documentation files
-    for ext in doc_extensions:
-        files = glob.glob(f"{path}/**/*{ext}", recursive=True)
-        for file_path in files:
-            # Check if file should be processed based on inclusion/exclusion rules
-            if not should_process_file(file_path, use_inclusion_mode, included_dirs, included_files, excluded_dirs, excluded_files):
+                if entry.is_dir(follow_symlinks=False):
+                    if use_inclusion:
+                        subdirs.append((entry.path, inside_included_dir or name in clean_included_dirs))
+                    elif name not in clean_excluded_dirs:
+                        subdirs.append((entry.path, False))
+                    continue
+                if not entry.is_file():
+                    continue
+            except OSError:
                 continue
 
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    content = f.read()
-                    relative_path = os.path.relpath(file_path, path)
-
-                    # Check token count
-                    token_count = count_tokens(content, embedder_type)
-                    if token_count > MAX_EMBEDDING_TOKENS:
-                        logger.warning(f"Skipping large file {relative_path}: Token count ({token_count}) exceeds limit")
-                        continue
-
-                    doc = Document(
-                        text=content,
-                        meta_data={
-                            "file_path": relative_path,
-                            "type": ext[1:],
-                            "is_code": False,
-                            "is_implementation": False,
-                            "title": relative_path,
-                            "token_count": token_count,
-                        },
-                    )
-                    documents.append(doc)
-            except Exception as e:
-                logger.error(f"Error reading {file_path}: {e}")
+            bucket = buckets.get(os.path.splitext(name)[1])
+            if bucket is not None and _accept_file(name, inside_included_dir):
+                bucket.append(entry.path)
+
+        stack.extend(reversed(subdirs))
+
+    for ext in CODE_EXTENSIONS:
+        for file_path in buckets[ext]:
+            yield file_path, ext, True
+    for ext in DOC_EXTENSIONS:
+        for file_path in buckets[ext]:
+            yield file_path, ext, False
+
+
+def iter_selected_files(path: str, file_paths: List[str], use_inclusion: bool, included_dirs: List[str],
+                        included_files: List[str], excluded_dirs: List[str], excluded_files: List[str]):
+    """
+    Yield the files among ``file_paths`` that should be indexed, without walking the tree.
+
+    Applies the same rules as ``iter_repo_files`` to an explicit list of paths relative to
+    ``path`` (e.g. the files reported by ``get_changed_files``). Paths that no longer exist
+    are skipped.
+
+    Yields:
+        tuple: (absolute file path, extension, is_code)
+    """
+    code_files, doc_files = [], []
+    for relative_path in file_paths:
+        relative_path = os.path.normpath(relative_path)
+        if any(part.startswith(".") for part in relative_path.split(os.sep)):
+            continue
+        ext = os.path.splitext(relative_path)[1]
+        if ext not in CODE_EXTENSIONS and ext not in DOC_EXTENSIONS:
+            continue
+        file_path = os.path.join(path, relative_path)
+        if not os.path.isfile(file_path):
+            continue
+        if not should_process_file(relative_path, use_inclusion, included_dirs, included_files,
+                                   excluded_dirs, excluded_files):
+            continue
+        (code_files if ext in CODE_EXTENSIONS else doc_files).append((file_path, ext))
+
+    for file_path, ext in code_files:
+        yield file_path, ext, True
+    for file_path, ext in doc_files:
+        yield file_path, ext, False
+
+
+def is_implementation_file(relative_path: str) -> bool:
+    """Tell whether a code file, given relative to the repository root, is implementation rather than test code."""
+    return (
+        not relative_path.startswith("test_")
+        and not relative_path.startswith("app_")
+        and "test" not in relative_path.lower()
+    )
+
+
+def _read_candidate(file_path: str, root_path: str, ext: str, is_code: bool, embedder_type: str = None):
+    """
+    Read one candidate file, rejecting files that are obviously too large to embed.
+
+    Returns:
+        tuple or None: (content, meta_data, token_limit), or None if the file was skipped.
+    """
+    relative_path = os.path.relpath(file_path, root_path)
+
+    if is_code:
+        is_implementation = is_implementation_file(relative_path)
+        token_limit = MAX_EMBEDDING_TOKENS * 10
+    else:
+        is_implementation = False
+        token_limit = MAX_EMBEDDING_TOKENS
+
+    file_size = os.path.getsize(file_path)
+    if exceeds_token_limit_by_length(file_size, token_limit, embedder_type):
+        logger.warning(f"Skipping large file {relative_path}: Size ({file_size} bytes) exceeds limit")
+        return None
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    meta_data = {
+        "file_path": relative_path,
+        "type": ext[1:],
+        "is_code": is_code,
+        "is_implementation": is_implementation,
+        "title": relative_path,
+    }
+    return content, meta_data, token_limit
+
+
+def read_document_batch(file_batch, root_path: str, embedder_type: str = None) -> List:
+    """
+    Read and tokenize a batch of candidate files.
+
+    This is the unit of work of both the serial and the parallel ingestion paths, and is
+    a module-level function so it can be shipped to worker processes. Token counts for the
+    whole batch are computed with one ``count_tokens_batch`` call.
+
+    Args:
+        file_batch: Iterable of (file path, extension, is_code) tuples from ``iter_repo_files``.
+        root_path (str): The repository root, used to compute relative paths.
+        embedder_type (str, optional): The embedder type used for token counting.
+
+    Returns:
+        list: One entry per input file, either a Document or None if the file was skipped.
+    """
+    candidates = []
+    for file_path, ext, is_code in file_batch:
+        try:
+            candidates.append(_read_candidate(file_path, root_path, ext, is_code, embedder_type))
+        except Exception as e:
+            logger.error(f"Error reading {file_path}: {e}")
+            candidates.append(None)
+
+    read = [candidate for candidate in candidates if candidate is not None]
+    token_counts = iter(count_tokens_batch([content for content, _, _ in read], embedder_type))
+
+    documents = []
+    for candidate in candidates:
+        if candidate is None:
+            documents.append(None)
+            continue
+        content, meta_data, token_limit = candidate
+        token_count = next(token_counts)
+        # Check token count
+        if token_count > token_limit:
+            logger.warning(f"Skipping large file {meta_data['file_path']}: Token count ({token_count}) exceeds limit")
+            documents.append(None)
+            continue
+        documents.append(Document(text=content, meta_data={**meta_data, "token_count": token_count}))
+    return documents
+
+
+def _iter_batches(iterable, batch_size: int):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _read_documents_parallel(candidates, root_path: str, embedder_type: str,
+                             max_workers: int, batch_size: int) -> List[Document]:
+    """
+    Read and tokenize candidate files in a process pool.
+
+    Batches are mapped in submission order, so the resulting list has the same order and
+    content as the serial path.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    logger.info(f"Reading documents with {max_workers} worker processes (batch size {batch_size})")
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(
+            read_document_batch,
+            _iter_batches(candidates, batch_size),
+            repeat(root_path),
+            repeat(embedder_type),
+        )
+        return [doc for batch in results for doc in batch if doc is not None]
+
+
+def read_all_documents(path: str, embedder_type: str = None, is_ollama_embedder: bool = None, 
+                      excluded_dirs: List[str] = None, excluded_files: List[str] = None,
+                      included_dirs: List[str] = None, included_files: List[str] = None,
+                      max_workers: int = None, file_paths: List[str] = None):
+    """
+    Recursively reads all documents in a directory and its subdirectories.
+
+    Args:
+        path (str): The root directory path.
+        embedder_type (str, optional): The embedder type ('openai', 'google', 'ollama').
+                                     If None, will be determined from configuration.
+        is_ollama_embedder (bool, optional): DEPRECATED. Use embedder_type instead.
+                                           If None, will be determined from configuration.
+        excluded_dirs (List[str], optional): List of directories to exclude from processing.
+            Overrides the default configuration if provided.
+        excluded_files (List[str], optional): List of file patterns to exclude from processing.
+            Overrides the default configuration if provided.
+        included_dirs (List[str], optional): List of directories to include exclusively.
+            When provided, only files in these directories will be processed.
+        included_files (List[str], optional): List of file patterns to include exclusively.
+            When provided, only files matching these patterns will be processed.
+        max_workers (int, optional): Number of worker processes used to read and tokenize
+            files. If None, ``ingestion.max_workers`` from the repo configuration is used;
+            values of 1 or less read files serially.
+        file_paths (List[str], optional): Read only these paths, relative to ``path``,
+            instead of walking the whole directory. The filters still apply.
+
+    Returns:
+        list: A list of Document objects with metadata.
+    """
+    # Handle backward compatibility
+    if embedder_type is None and is_ollama_embedder is not None:
+        embedder_type = 'ollama' if is_ollama_embedder else None
+
+    ingestion_config = configs.get("ingestion", {})
+    if max_workers is None:
+        max_workers = ingestion_config.get("max_workers", 1)
+    batch_size = max(1, ingestion_config.get("batch_size", 64))
+
+    filters = resolve_file_filters(excluded_dirs, excluded_files, included_dirs, included_files)
+
+    logger.info(f"Reading documents from {path}")
+
+    # Code files are yielded first, then documentation files
+    if file_paths is not None:
+        candidates = iter_selected_files(path, file_paths, *filters)
+    else:
+        candidates = iter_repo_files(path, *filters)
+    if max_workers and max_workers > 1:
+        # Resolve the embedder type once instead of in every worker
+        if embedder_type is None:
+            from core.config import get_embedder_type
+            embedder_type = get_embedder_type()
+        documents = _read_documents_parallel(candidates, path, embedder_type, max_workers, batch_size)
+    else:
+        documents = []
+        for batch in _iter_batches(candidates, batch_size):
+            documents.extend(doc for doc in read_document_batch(batch, path, embedder_type) if doc is not None)
 
     logger.info(f"Found {len(documents)} documents")
     return documents
 
-def prepare_data_pipeline(embedder_type: str = None, is_ollama_embedder: bool = None):
+class _ReportStage(adal.core.component.DataComponent):
+    """Pipeline step that reports a build stage and passes its input through."""
+
+    def __init__(self, stage: str, progress: ProgressCallback) -> None:
+        super().__init__()
+        self.stage = stage
+        self.progress = progress
+
+    def __call__(self, documents: List[Document]) -> List[Document]:
+        self.progress(self.stage, documents=len(documents))
+        return documents
+
+
+def prepare_data_pipeline(embedder_type: str = None, is_ollama_embedder: bool = None,
+                          progress: ProgressCallback = no_progress):
     """
     Creates and returns the data transformation pipeline.
 
@@ -448,6 +887,8 @@ def prepare_data_pipeline(embedder_type: str = None, is_ollama_embedder: bool =
                                      If None, will be determined from configuration.
         is_ollama_embedder (bool, optional): DEPRECATED. Use embedder_type instead.
                                            If None, will be determined from configuration.
+        progress (callable, optional): Receives the ``split`` and ``embed`` stages, each with
+            the number of documents entering the step.
 
     Returns:
         adal.Sequential: The data transformation pipeline
@@ -469,22 +910,115 @@ def prepare_data_pipeline(embedder_type: str = None, is_ollama_embedder: bool =
 
     # Choose appropriate processor based on embedder type
     if embedder_type == 'ollama':
-        # Use Ollama document processor for single-document processing
-        embedder_transformer = OllamaDocumentProcessor(embedder=embedder)
+        # Ollama embeds through its own HTTP API with a bounded pool of concurrent requests
+        ollama_config = configs.get("embedder_ollama", {})
+        embedder_transformer = OllamaDocumentProcessor(
+            embedder=embedder,
+            max_workers=ollama_config.get("max_workers", 4),
+            batch_size=ollama_config.get("batch_size", 32),
+        )
     else:
-        # Use batch processing for OpenAI and Google embedders
+        # Send batches concurrently for OpenAI, Google and Bedrock embedders
         batch_size = embedder_config.get("batch_size", 500)
-        embedder_transformer = ToEmbeddings(
+        embedder_transformer = ConcurrentToEmbeddings(
             embedder=embedder, batch_size=batch_size
         )
 
+    # Only chunks missing from the embedding cache reach the provider
+    embedding_cache = get_embedding_cache()
+    if embedding_cache is not None:
+        embedder_transformer = CachedEmbeddings(
+            embedder_transformer, cache=embedding_cache, namespace=embedding_namespace(embedder)
+        )
+
     data_transformer = adal.Sequential(
-        splitter, embedder_transformer
+        _ReportStage("split", progress), splitter, _ReportStage("embed", progress), embedder_transformer
     )  # sequential will chain together splitter and embedder
     return data_transformer
 
+# Bump when the manifest layout changes; older manifests are rebuilt from the database
+INDEX_MANIFEST_VERSION = 1
+
+
+def content_hash(text: str) -> str:
+    """Return the hex SHA-256 digest of a document's text."""
+    return hashlib.sha256(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+
+def get_manifest_path(db_path: str) -> str:
+    """Return the path of the index manifest stored next to a database."""
+    return os.path.splitext(db_path)[0] + ".manifest.json"
+
+
+def build_index_manifest(db: LocalDB, embedder_type: str = None, head: str = None) -> dict:
+    """
+    Build the per-file manifest of an indexed database.
+
+    The manifest maps each source file path to the hash of its content and the ids of
+    the chunks produced from it, so later refreshes can tell which files changed.
+
+    Args:
+        db (LocalDB): A database transformed with the ``split_and_embed`` key.
+        embedder_type (str, optional): The embedder type the vectors were produced with.
+        head (str, optional): The commit the repository was at when it was indexed.
+
+    Returns:
+        dict: The manifest.
+    """
+    chunk_ids_by_parent = {}
+    for chunk in db.get_transformed_data(key="split_and_embed"):
+        chunk_ids_by_parent.setdefault(chunk.parent_doc_id, []).append(chunk.id)
+
+    files = {}
+    for doc in db.items:
+        file_path = (doc.meta_data or {}).get("file_path")
+        if file_path is None:
+            continue
+        files[file_path] = {
+            "hash": content_hash(doc.text),
+            "chunk_ids": chunk_ids_by_parent.get(f"{doc.id}", []),
+        }
+
+    return {
+        "version": INDEX_MANIFEST_VERSION,
+        "embedder_type": embedder_type,
+        "head": head,
+        "files": files,
+    }
+
+
+def load_index_manifest(manifest_path: str):
+    """
+    Load an index manifest.
+
+    Returns:
+        dict or None: The manifest, or None if it is missing, unreadable or outdated.
+    """
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except Exception as e:
+        logger.warning(f"Could not read index manifest {manifest_path}: {e}")
+        return None
+    if manifest.get("version") != INDEX_MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def save_index_manifest(manifest: dict, manifest_path: str) -> None:
+    """Write an index manifest atomically."""
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+
 def transform_documents_and_save_to_db(
-    documents: List[Document], db_path: str, embedder_type: str = None, is_ollama_embedder: bool = None
+    documents: List[Document], db_path: str, embedder_type: str = None, is_ollama_embedder: bool = None,
+    head: str = None, progress: ProgressCallback = no_progress
 ) -> LocalDB:
     """
     Transforms a list of documents and saves them to a local database.
@@ -496,19 +1030,159 @@ def transform_documents_and_save_to_db(
                                      If None, will be determined from configuration.
         is_ollama_embedder (bool, optional): DEPRECATED. Use embedder_type instead.
                                            If None, will be determined from configuration.
+        head (str, optional): The commit the documents were read at, recorded in the manifest.
+        progress (callable, optional): Receives the ``split``, ``embed`` and ``persist`` stages.
     """
     # Get the data transformer
-    data_transformer = prepare_data_pipeline(embedder_type, is_ollama_embedder)
+    data_transformer = prepare_data_pipeline(embedder_type, is_ollama_embedder, progress=progress)
 
     # Save the documents to a local database
     db = LocalDB()
     db.register_transformer(transformer=data_transformer, key="split_and_embed")
     db.load(documents)
     db.transform(key="split_and_embed")
-    os.makedirs(os.path.dirname(db_path), exist_ok=True)
-    db.save_state(filepath=db_path)
+    progress("persist", chunks=len(db.get_transformed_data(key="split_and_embed")))
+    save_index_store(db, db_path)
+    save_index_manifest(
+        build_index_manifest(db, _resolve_embedder_type(embedder_type, is_ollama_embedder), head),
+        get_manifest_path(db_path),
+    )
+    return db
+
+
+def refresh_documents_in_db(
+    db: LocalDB, documents: List[Document], db_path: str, embedder_type: str = None, manifest: dict = None,
+    changed_paths: List[str] = None, head: str = None, progress: ProgressCallback = no_progress
+) -> LocalDB:
+    """
+    Bring an existing database up to date with the current repository documents.
+
+    Only added or modified files are split and embedded again; chunks of modified and
+    deleted files are dropped. The database and its manifest are saved afterwards.
+
+    When ``changed_paths`` is given, ``documents`` only holds the readable files among
+    those paths; the other indexed files are kept as they are, and changed paths without
+    a document are treated as deleted.
+
+    Args:
+        db (LocalDB): The database to update in place.
+        documents (list): The current `Document` objects read from the repository.
+        db_path (str): The path to the local database file.
+        embedder_type (str, optional): The embedder type ('openai', 'google', 'ollama').
+                                     If None, will be determined from configuration.
+        manifest (dict, optional): The manifest of ``db``. Rebuilt from ``db`` if None.
+        changed_paths (List[str], optional): The only paths that may have changed, e.g. from
+            ``get_changed_files``. If None, every indexed file is compared.
+        head (str, optional): The commit the documents were read at, recorded in the manifest.
+        progress (callable, optional): Receives the ``split``, ``embed`` and ``persist`` stages.
+
+    Returns:
+        LocalDB: The updated database.
+    """
+    embedder_type = _resolve_embedder_type(embedder_type)
+    if manifest is None:
+        manifest = build_index_manifest(db, embedder_type)
+    indexed_files = manifest["files"]
+
+    current = {doc.meta_data["file_path"]: doc for doc in documents}
+    added = [path for path in current if path not in indexed_files]
+    modified = [
+        path for path in current
+        if path in indexed_files and indexed_files[path]["hash"] != content_hash(current[path].text)
+    ]
+    if changed_paths is None:
+        deleted = [path for path in indexed_files if path not in current]
+    else:
+        candidates = {os.path.normpath(path) for path in changed_paths}
+        deleted = [path for path in indexed_files if path in candidates and path not in current]
+
+    logger.info(f"Refreshing index: {len(added)} added, {len(modified)} modified, {len(deleted)} deleted files")
+
+    changed_docs = [current[path] for path in added + modified]
+    stale_paths = set(modified) | set(deleted)
+
+    if stale_paths:
+        stale_chunk_ids = {chunk_id for path in stale_paths for chunk_id in indexed_files[path]["chunk_ids"]}
+        db.items = [doc for doc in db.items if (doc.meta_data or {}).get("file_path") not in stale_paths]
+        db.transformed_items["split_and_embed"] = [
+            chunk for chunk in db.get_transformed_data(key="split_and_embed") if chunk.id not in stale_chunk_ids
+        ]
+
+    if changed_docs:
+        data_transformer = prepare_data_pipeline(embedder_type, progress=progress)
+        new_chunks = data_transformer(changed_docs)
+        db.items = db.items + changed_docs
+        db.transformed_items["split_and_embed"] = db.get_transformed_data(key="split_and_embed") + list(new_chunks)
+
+    if changed_docs or stale_paths:
+        progress("persist", chunks=len(db.get_transformed_data(key="split_and_embed")))
+        save_index_store(db, db_path)
+    if changed_docs or stale_paths or head != manifest.get("head") \
+            or load_index_manifest(get_manifest_path(db_path)) is None:
+        save_index_manifest(build_index_manifest(db, embedder_type, head), get_manifest_path(db_path))
     return db
 
+
+def github_file_request(repo_url: str, file_path: str, access_token: str = None) -> Tuple[str, Dict[str, str]]:
+    """
+    Return the GitHub contents API URL and request headers of a repository file.
+
+    Supports both public GitHub (github.com) and GitHub Enterprise (custom domains).
+
+    Raises:
+        ValueError: If the URL is not a valid GitHub URL
+    """
+    # Parse the repository URL to support both github.com and enterprise GitHub
+    parsed_url = urlparse(repo_url)
+    if not parsed_url.scheme or not parsed_url.netloc:
+        raise ValueError("Not a valid GitHub repository URL")
+
+    # Check if it's a GitHub-like URL structure
+    path_parts = parsed_url.path.strip('/').split('/')
+    if len(path_parts) < 2:
+        raise ValueError("Invalid GitHub URL format - expected format: https://domain/owner/repo")
+
+    owner = path_parts[-2]
+    repo = path_parts[-1].replace(".git", "")
+
+    # Determine the API base URL
+    if parsed_url.netloc == "github.com":
+        # Public GitHub
+        api_base = "https://api.github.com"
+    else:
+        # GitHub Enterprise - API is typically at https://domain/api/v3/
+        api_base = f"{parsed_url.scheme}://{parsed_url.netloc}/api/v3"
+
+    # The API endpoint for getting file content is: /repos/{owner}/{repo}/contents/{path}
+    api_url = f"{api_base}/repos/{owner}/{repo}/contents/{file_path}"
+
+    headers = {}
+    if access_token:
+        headers["Authorization"] = f"token {access_token}"
+    return api_url, headers
+
+
+def decode_github_file(content_data: dict) -> str:
+    """
+    Return the file content of a GitHub contents API response.
+
+    Raises:
+        ValueError: If the response is an error or holds no decodable content
+    """
+    # Check if we got an error response
+    if "message" in content_data and "documentation_url" in content_data:
+        raise ValueError(f"GitHub API error: {content_data['message']}")
+
+    # GitHub API returns file content as base64 encoded string
+    if "content" in content_data and "encoding" in content_data:
+        if content_data["encoding"] == "base64":
+            # The content might be split into lines, so join them first
+            content_base64 = content_data["content"].replace("\n", "")
+            return base64.b64decode(content_base64).decode("utf-8")
+        raise ValueError(f"Unexpected encoding: {content_data['encoding']}")
+    raise ValueError("File content not found in GitHub API response")
+
+
 def get_github_file_content(repo_url: str, file_path: str, access_token: str = None) -> str:
     """
     Retrieves the content of a file from a GitHub repository using the GitHub API.
@@ -527,35 +1201,9 @@ def get_github_file_content(repo_url: str, file_path: str, access_token: str = N
         ValueError: If the file cannot be fetched or if the URL is not a valid GitHub URL
     """
     try:
-        # Parse the repository URL to support both github.com and enterprise GitHub
-        parsed_url = urlparse(repo_url)
-        if not parsed_url.scheme or not parsed_url.netloc:
-            raise ValueError("Not a valid GitHub repository URL")
-
-        # Check if it's a GitHub-like URL structure
-        path_parts = parsed_url.path.strip('/').split('/')
-        if len(path_parts) < 2:
-            raise ValueError("Invalid GitHub URL format - expected format: https://domain/owner/repo")
-
-        owner = path_parts[-2]
-        repo = path_parts[-1].replace(".git", "")
-
-        # Determine the API base URL
-        if parsed_url.netloc == "github.com":
-            # Public GitHub
-            api_base = "https://api.github.com"
-        else:
-            # GitHub Enterprise - API is typically at https://domain/api/v3/
-            api_base = f"{parsed_url.scheme}://{parsed_url.netloc}/api/v3"
-        
-        # Use GitHub API to get file content
-        # The API endpoint for getting file content is: /repos/{owner}/{repo}/contents/{path}
-        api_url = f"{api_base}/repos/{owner}/{repo}/contents/{file_path}"
+        api_url, headers = github_file_request(repo_url, file_path, access_token)
 
         # Fetch file content from GitHub API
-        headers = {}
-        if access_token:
-            headers["Authorization"] = f"token {access_token}"
         logger.info(f"Fetching file content from GitHub API: {api_url}")
         try:
             response = requests.get(api_url, headers=headers, timeout=10)
@@ -567,25 +1215,57 @@ def get_github_file_content(repo_url: str, file_path: str, access_token: str = N
         except json.JSONDecodeError:
             raise ValueError("Invalid response from GitHub API")
 
-        # Check if we got an error response
-        if "message" in content_data and "documentation_url" in content_data:
-            raise ValueError(f"GitHub API error: {content_data['message']}")
-
-        # GitHub API returns file content as base64 encoded string
-        if "content" in content_data and "encoding" in content_data:
-            if content_data["encoding"] == "base64":
-                # The content might be split into lines, so join them first
-                content_base64 = content_data["content"].replace("\n", "")
-                content = base64.b64decode(content_base64).decode("utf-8")
-                return content
-            else:
-                raise ValueError(f"Unexpected encoding: {content_data['encoding']}")
-        else:
-            raise ValueError("File content not found in GitHub API response")
+        return decode_github_file(content_data)
 
     except Exception as e:
         raise ValueError(f"Failed to get file content: {str(e)}")
 
+def gitlab_project_request(repo_url: str, access_token: str = None) -> Tuple[str, Dict[str, str]]:
+    """
+    Return the GitLab projects API URL and request headers of a repository.
+
+    Raises:
+        ValueError: If the URL is not a valid GitLab URL
+    """
+    # Parse and validate the URL
+    parsed_url = urlparse(repo_url)
+    if not parsed_url.scheme or not parsed_url.netloc:
+        raise ValueError("Not a valid GitLab repository URL")
+
+    gitlab_domain = f"{parsed_url.scheme}://{parsed_url.netloc}"
+    if parsed_url.port not in (None, 80, 443):
+        gitlab_domain += f":{parsed_url.port}"
+    path_parts = parsed_url.path.strip("/").split("/")
+    if len(path_parts) < 2:
+        raise ValueError("Invalid GitLab URL format — expected something like https://gitlab.domain.com/group/project")
+
+    # Build project path and encode for API
+    project_path = "/".join(path_parts).replace(".git", "")
+    encoded_project_path = quote(project_path, safe='')
+
+    headers = {}
+    if access_token:
+        headers["PRIVATE-TOKEN"] = access_token
+    return f"{gitlab_domain}/api/v4/projects/{encoded_project_path}", headers
+
+
+def check_gitlab_file(content: str) -> str:
+    """
+    Return raw GitLab file content, raising if it is a JSON error response instead.
+
+    Raises:
+        ValueError: If GitLab returned an error message
+    """
+    if content.startswith("{") and '"message":' in content:
+        try:
+            error_data = json.loads(content)
+            if "message" in error_data:
+                raise ValueError(f"GitLab API error: {error_data['message']}")
+        except json.JSONDecodeError:
+            pass
+    return content
+
+
 def get_gitlab_file_content(repo_url: str, file_path: str, access_token: str = None) -> str:
     """
     Retrieves the content of a file from a GitLab repository (cloud or self-hosted).
@@ -602,21 +1282,7 @@ def get_gitlab_file_content(repo_url: str, file_path: str, access_token: str = N
         ValueError: If anything fails
     """
     try:
-        # Parse and validate the URL
-        parsed_url = urlparse(repo_url)
-        if not parsed_url.scheme or not parsed_url.netloc:
-            raise ValueError("Not a valid GitLab repository URL")
-
-        gitlab_domain = f"{parsed_url.scheme}://{parsed_url.netloc}"
-        if parsed_url.port not in (None, 80, 443):
-            gitlab_domain += f":{parsed_url.port}"
-        path_parts = parsed_url.path.strip("/").split("/")
-        if len(path_parts) < 2:
-            raise ValueError("Invalid GitLab URL format — expected something like https://gitlab.domain.com/group/project")
-
-        # Build project path and encode for API
-        project_path = "/".join(path_parts).replace(".git", "")
-        encoded_project_path = quote(project_path, safe='')
+        project_info_url, headers = gitlab_project_request(repo_url, access_token)
 
         # Encode file path
         encoded_file_path = quote(file_path, safe='')
@@ -624,12 +1290,7 @@ def get_gitlab_file_content(repo_url: str, file_path: str, access_token: str = N
         # Try to get the default branch from the project info
         default_branch = None
         try:
-            project_info_url = f"{gitlab_domain}/api/v4/projects/{encoded_project_path}"
-            project_headers = {}
-            if access_token:
-                project_headers["PRIVATE-TOKEN"] = access_token
-            
-            project_response = requests.get(project_info_url, headers=project_headers, timeout=10)
+            project_response = requests.get(project_info_url, headers=headers, timeout=10)
             if project_response.status_code == 200:
                 project_data = project_response.json()
                 default_branch = project_data.get('default_branch', 'main')
@@ -641,11 +1302,8 @@ def get_gitlab_file_content(repo_url: str, file_path: str, access_token: str = N
             logger.warning(f"Error fetching project info: {e}, using 'main' as default branch")
             default_branch = 'main'
 
-        api_url = f"{gitlab_domain}/api/v4/projects/{encoded_project_path}/repository/files/{encoded_file_path}/raw?ref={default_branch}"
+        api_url = f"{project_info_url}/repository/files/{encoded_file_path}/raw?ref={default_branch}"
         # Fetch file content from GitLab API
-        headers = {}
-        if access_token:
-            headers["PRIVATE-TOKEN"] = access_token
         logger.info(f"Fetching file content from GitLab API: {api_url}")
         try:
             response = requests.get(api_url, headers=headers, timeout=10)
@@ -655,19 +1313,44 @@ def get_gitlab_file_content(repo_url: str, file_path: str, access_token: str = N
             raise ValueError(f"Error fetching file content: {e}")
 
         # Check for GitLab error response (JSON instead of raw file)
-        if content.startswith("{") and '"message":' in content:
-            try:
-                error_data = json.loads(content)
-                if "message" in error_data:
-                    raise ValueError(f"GitLab API error: {error_data['message']}")
-            except json.JSONDecodeError:
-                pass
-
-        return content
+        return check_gitlab_file(content)
 
     except Exception as e:
         raise ValueError(f"Failed to get file content: {str(e)}")
 
+# Messages of the Bitbucket API status codes that are not retried
+BITBUCKET_STATUS_ERRORS = {
+    404: "File not found on Bitbucket. Please check the file path and repository.",
+    401: "Unauthorized access to Bitbucket. Please check your access token.",
+    403: "Forbidden access to Bitbucket. You might not have permission to access this file.",
+    500: "Internal server error on Bitbucket. Please try again later.",
+}
+
+
+def bitbucket_repo_request(repo_url: str, access_token: str = None) -> Tuple[str, Dict[str, str]]:
+    """
+    Return the Bitbucket repositories API URL and request headers of a repository.
+
+    Raises:
+        ValueError: If the URL is not a valid Bitbucket URL
+    """
+    # Extract owner and repo name from Bitbucket URL
+    if not (repo_url.startswith("https://bitbucket.org/") or repo_url.startswith("http://bitbucket.org/")):
+        raise ValueError("Not a valid Bitbucket repository URL")
+
+    parts = repo_url.rstrip('/').split('/')
+    if len(parts) < 5:
+        raise ValueError("Invalid Bitbucket URL format")
+
+    owner = parts[-2]
+    repo = parts[-1].replace(".git", "")
+
+    headers = {}
+    if access_token:
+        headers["Authorization"] = f"Bearer {access_token}"
+    return f"https://api.bitbucket.org/2.0/repositories/{owner}/{repo}", headers
+
+
 def get_bitbucket_file_content(repo_url: str, file_path: str, access_token: str = None) -> str:
     """
     Retrieves the content of a file from a Bitbucket repository using the Bitbucket API.
@@ -681,26 +1364,12 @@ def get_bitbucket_file_content(repo_url: str, file_path: str, access_token: str
         str: The content of the file as a string
     """
     try:
-        # Extract owner and repo name from Bitbucket URL
-        if not (repo_url.startswith("https://bitbucket.org/") or repo_url.startswith("http://bitbucket.org/")):
-            raise ValueError("Not a valid Bitbucket repository URL")
-
-        parts = repo_url.rstrip('/').split('/')
-        if len(parts) < 5:
-            raise ValueError("Invalid Bitbucket URL format")
-
-        owner = parts[-2]
-        repo = parts[-1].replace(".git", "")
+        repo_info_url, headers = bitbucket_repo_request(repo_url, access_token)
 
         # Try to get the default branch from the repository info
         default_branch = None
         try:
-            repo_info_url = f"https://api.bitbucket.org/2.0/repositories/{owner}/{repo}"
-            repo_headers = {}
-            if access_token:
-                repo_headers["Authorization"] = f"Bearer {access_token}"
-            
-            repo_response = requests.get(repo_info_url, headers=repo_headers, timeout=10)
+            repo_response = requests.get(repo_info_url, headers=headers, timeout=10)
             if repo_response.status_code == 200:
                 repo_data = repo_response.json()
                 default_branch = repo_data.get('mainbranch', {}).get('name', 'main')
@@ -714,25 +1383,16 @@ def get_bitbucket_file_content(repo_url: str, file_path: str, access_token: str
 
         # Use Bitbucket API to get file content
         # The API endpoint for getting file content is: /2.0/repositories/{owner}/{repo}/src/{branch}/{path}
-        api_url = f"https://api.bitbucket.org/2.0/repositories/{owner}/{repo}/src/{default_branch}/{file_path}"
+        api_url = f"{repo_info_url}/src/{default_branch}/{file_path}"
 
         # Fetch file content from Bitbucket API
-        headers = {}
-        if access_token:
-            headers["Authorization"] = f"Bearer {access_token}"
         logger.info(f"Fetching file content from Bitbucket API: {api_url}")
         try:
             response = requests.get(api_url, headers=headers, timeout=10)
             if response.status_code == 200:
                 content = response.text
-            elif response.status_code == 404:
-                raise ValueError("File not found on Bitbucket. Please check the file path and repository.")
-            elif response.status_code == 401:
-                raise ValueError("Unauthorized access to Bitbucket. Please check your access token.")
-            elif response.status_code == 403:
-                raise ValueError("Forbidden access to Bitbucket. You might not have permission to access this file.")
-            elif response.status_code == 500:
-                raise ValueError("Internal server error on Bitbucket. Please try again later.")
+            elif response.status_code in BITBUCKET_STATUS_ERRORS:
+                raise ValueError(BITBUCKET_STATUS_ERRORS[response.status_code])
             else:
                 response.raise_for_status()
                 content = response.text
@@ -769,6 +1429,33 @@ def get_file_content(repo_url: str, file_path: str, repo_type: str = None, acces
     else:
         raise ValueError("Unsupported repository type. Only GitHub, GitLab, and Bitbucket are supported.")
 
+
+def _repo_name_from_url(repo_url_or_path: str, repo_type: str) -> str:
+    # Extract owner and repo name to create unique identifier
+    url_parts = repo_url_or_path.rstrip('/').split('/')
+
+    if repo_type in ["github", "gitlab", "bitbucket"] and len(url_parts) >= 5:
+        # GitHub URL format: https://github.com/owner/repo
+        # GitLab URL format: https://gitlab.com/owner/repo or https://gitlab.com/group/subgroup/repo
+        # Bitbucket URL format: https://bitbucket.org/owner/repo
+        owner = url_parts[-2]
+        repo = url_parts[-1].replace(".git", "")
+        return f"{owner}_{repo}"
+    return url_parts[-1].replace(".git", "")
+
+
+def get_repo_name(repo_url_or_path: str, repo_type: str = None) -> str:
+    """
+    Return the name a repository is cloned and indexed under.
+
+    ``owner_repo`` for GitHub, GitLab and Bitbucket URLs, the last path component otherwise.
+    """
+    repo_url_or_path = repo_url_or_path.strip()
+    if repo_url_or_path.startswith("https://") or repo_url_or_path.startswith("http://"):
+        return _repo_name_from_url(repo_url_or_path, repo_type)
+    return os.path.basename(repo_url_or_path)
+
+
 class DatabaseManager:
     """
     Manages the creation, loading, transformation, and persistence of LocalDB instances.
@@ -776,16 +1463,22 @@ class DatabaseManager:
 
     def __init__(self):
         self.db = None
+        self.store = None
         self.repo_url_or_path = None
         self.repo_paths = None
+        self.repo_changes = None
 
     def prepare_database(self, repo_url_or_path: str, repo_type: str = None, access_token: str = None,
                          embedder_type: str = None, is_ollama_embedder: bool = None,
-                         excluded_dirs: List[str] = None, excluded_files: List[str] = None,
-                         included_dirs: List[str] = None, included_files: List[str] = None) -> List[Document]:
+                         refresh: bool = False, progress: ProgressCallback = no_progress,
+                         file_filters: tuple = None) -> List[Document]:
         """
         Create a new database from the repository.
 
+        There is one canonical index per repository, built with the default file filters of
+        the configuration. Request-specific filters are applied at search time (see
+        ``core.chunk_filter``).
+
         Args:
             repo_type(str): Type of repository
             repo_url_or_path (str): The URL or local path of the repository
@@ -794,10 +1487,15 @@ class DatabaseManager:
                                          If None, will be determined from configuration.
             is_ollama_embedder (bool, optional): DEPRECATED. Use embedder_type instead.
                                                If None, will be determined from configuration.
-            excluded_dirs (List[str], optional): List of directories to exclude from processing
-            excluded_files (List[str], optional): List of file patterns to exclude from processing
-            included_dirs (List[str], optional): List of directories to include exclusively
-            included_files (List[str], optional): List of file patterns to include exclusively
+            refresh (bool, optional): Fetch the latest commit into an existing clone and re-index
+                only the files that changed since the existing database was built instead of
+                reusing it as is
+            progress (callable, optional): Receives the stages of the build (``download``,
+                ``load``, ``read``, ``split``, ``embed``, ``persist``) with counts, in addition
+                to the requests waiting for it.
+            file_filters (tuple, optional): The filters of the request, as returned by
+                ``resolve_file_filters``. A repository downloaded as a ZIP archive keeps the
+                files they select in addition to those of the default filters.
 
         Returns:
             List[Document]: List of Document objects
@@ -807,44 +1505,116 @@ class DatabaseManager:
             embedder_type = 'ollama' if is_ollama_embedder else None
         
         self.reset_database()
-        self._create_repo(repo_url_or_path, repo_type, access_token)
-        return self.prepare_db_index(embedder_type=embedder_type, excluded_dirs=excluded_dirs, excluded_files=excluded_files,
-                                   included_dirs=included_dirs, included_files=included_files)
+
+        # Loading a built index needs no coordination; only builds and refreshes take the build lock
+        if not refresh:
+            documents = self._load_built_index(repo_url_or_path, repo_type)
+            if documents is not None:
+                progress("load")
+                return documents
+
+        def build(build_progress: ProgressCallback) -> List[Document]:
+            def report(stage: str, **detail) -> None:
+                build_progress(stage, **detail)
+                progress(stage, **detail)
+
+            self._create_repo(repo_url_or_path, repo_type, access_token, refresh=refresh, progress=report,
+                              file_filters=file_filters)
+            return self.prepare_db_index(embedder_type=embedder_type, refresh=refresh, progress=report)
+
+        # Concurrent requests for one repository share a single clone and index build
+        return get_build_coordinator().run(
+            get_repo_name(repo_url_or_path, repo_type), build,
+            load=lambda: self._load_built_index(repo_url_or_path, repo_type),
+        )
 
     def reset_database(self):
         """
         Reset the database to its initial state.
         """
         self.db = None
+        self.store = None
         self.repo_url_or_path = None
         self.repo_paths = None
+        self.repo_changes = None
 
     def _extract_repo_name_from_url(self, repo_url_or_path: str, repo_type: str) -> str:
-        # Extract owner and repo name to create unique identifier
-        url_parts = repo_url_or_path.rstrip('/').split('/')
-
-        if repo_type in ["github", "gitlab", "bitbucket"] and len(url_parts) >= 5:
-            # GitHub URL format: https://github.com/owner/repo
-            # GitLab URL format: https://gitlab.com/owner/repo or https://gitlab.com/group/subgroup/repo
-            # Bitbucket URL format: https://bitbucket.org/owner/repo
-            owner = url_parts[-2]
-            repo = url_parts[-1].replace(".git", "")
-            repo_name = f"{owner}_{repo}"
-        else:
-            repo_name = url_parts[-1].replace(".git", "")
-        return repo_name
-
-    def _create_repo(self, repo_url_or_path: str, repo_type: str = None, access_token: str = None) -> None:
+        return _repo_name_from_url(repo_url_or_path, repo_type)
+
+    def _repo_storage_paths(self, repo_url_or_path: str, repo_type: str = None) -> dict:
+        """Return the clone directory and index store paths of a repository."""
+        root_path = get_adalflow_default_root_path()
+        if repo_url_or_path.startswith("https://") or repo_url_or_path.startswith("http://"):
+            repo_name = self._extract_repo_name_from_url(repo_url_or_path, repo_type)
+            save_repo_dir = os.path.join(root_path, "repos", repo_name)
+        else:  # local path
+            repo_name = os.path.basename(repo_url_or_path)
+            save_repo_dir = repo_url_or_path
+
+        # Base path of the index store files; earlier versions pickled the LocalDB here
+        save_db_file = os.path.join(root_path, "databases", f"{repo_name}.pkl")
+        return {
+            "save_repo_dir": save_repo_dir,
+            "save_db_file": save_db_file,
+            "save_manifest_file": get_manifest_path(save_db_file),
+        }
+
+    def _load_built_index(self, repo_url_or_path: str, repo_type: str = None) -> Optional[List[Document]]:
+        """
+        Load the index of a repository that is cloned and indexed already.
+
+        Saves replace the chunk table last and name the vector matrix after their build,
+        so the index can be read while another request rebuilds it: the store either opens
+        the chunks and vectors of one build or fails to open, and the request then goes
+        through the build coordinator.
+
+        Returns:
+            The documents of the index, or None if the repository still needs a download
+            or an index build.
+        """
+        repo_url_or_path = repo_url_or_path.strip()
+        paths = self._repo_storage_paths(repo_url_or_path, repo_type)
+        save_repo_dir = paths["save_repo_dir"]
+        if not (os.path.isdir(save_repo_dir) and os.listdir(save_repo_dir)) \
+                or not index_store_exists(paths["save_db_file"]):
+            return None
+        try:
+            store = IndexStore(paths["save_db_file"])
+            documents = store.documents()
+            usable = len(documents) > 0 and bool(store.has_vector.any())
+        except Exception as e:
+            logger.warning(f"Could not load existing database {paths['save_db_file']}: {e}")
+            return None
+        if not usable:
+            store.close()
+            return None
+
+        self.store = store
+        self.repo_paths = paths
+        self.repo_url_or_path = repo_url_or_path
+        logger.info(f"Loaded {len(documents)} documents from existing database {paths['save_db_file']}")
+        return documents
+
+    def _create_repo(self, repo_url_or_path: str, repo_type: str = None, access_token: str = None,
+                     refresh: bool = False, progress: ProgressCallback = no_progress,
+                     file_filters: tuple = None) -> None:
         """
         Download and prepare all paths.
         Paths:
         ~/.adalflow/repos/{owner}_{repo_name} (for url, local path will be the same)
-        ~/.adalflow/databases/{owner}_{repo_name}.pkl
+        ~/.adalflow/databases/{owner}_{repo_name}.vectors.{build}.npy
+        ~/.adalflow/databases/{owner}_{repo_name}.chunks.sqlite
+        ~/.adalflow/databases/{owner}_{repo_name}.manifest.json
 
         Args:
             repo_type(str): Type of repository
             repo_url_or_path (str): The URL or local path of the repository
             access_token (str, optional): Access token for private repositories
+            refresh (bool, optional): Update an existing clone to the latest remote commit.
+                The result of ``refresh_repo`` is kept in ``self.repo_changes``.
+            progress (callable, optional): Receives the ``download`` stage when the
+                repository is cloned or fetched.
+            file_filters (tuple, optional): The filters of the request, passed to ``download_repo``.
         """
         logger.info(f"Preparing repo storage for {repo_url_or_path}...")
 
@@ -852,35 +1622,30 @@ class DatabaseManager:
             # Strip whitespace to handle URLs with leading/trailing spaces
             repo_url_or_path = repo_url_or_path.strip()
             
-            root_path = get_adalflow_default_root_path()
-
-            os.makedirs(root_path, exist_ok=True)
+            os.makedirs(get_adalflow_default_root_path(), exist_ok=True)
+            repo_paths = self._repo_storage_paths(repo_url_or_path, repo_type)
+            save_repo_dir = repo_paths["save_repo_dir"]
+            save_db_file = repo_paths["save_db_file"]
             # url
             if repo_url_or_path.startswith("https://") or repo_url_or_path.startswith("http://"):
-                # Extract the repository name from the URL
-                repo_name = self._extract_repo_name_from_url(repo_url_or_path, repo_type)
-                logger.info(f"Extracted repo name: {repo_name}")
-
-                save_repo_dir = os.path.join(root_path, "repos", repo_name)
-
                 # Check if the repository directory already exists and is not empty
                 if not (os.path.exists(save_repo_dir) and os.listdir(save_repo_dir)):
                     # Only download if the repository doesn't exist or is empty
-                    download_repo(repo_url_or_path, save_repo_dir, repo_type, access_token)
+                    progress("download")
+                    download_repo(repo_url_or_path, save_repo_dir, repo_type, access_token, file_filters)
+                elif refresh:
+                    progress("download")
+                    try:
+                        self.repo_changes = refresh_repo(save_repo_dir, repo_url_or_path, repo_type, access_token)
+                    except ValueError as e:
+                        logger.warning(f"Could not refresh {save_repo_dir}, using existing repository: {e}")
                 else:
                     logger.info(f"Repository already exists at {save_repo_dir}. Using existing repository.")
-            else:  # local path
-                repo_name = os.path.basename(repo_url_or_path)
-                save_repo_dir = repo_url_or_path
 
-            save_db_file = os.path.join(root_path, "databases", f"{repo_name}.pkl")
             os.makedirs(save_repo_dir, exist_ok=True)
             os.makedirs(os.path.dirname(save_db_file), exist_ok=True)
 
-            self.repo_paths = {
-                "save_repo_dir": save_repo_dir,
-                "save_db_file": save_db_file,
-            }
+            self.repo_paths = repo_paths
             self.repo_url_or_path = repo_url_or_path
             logger.info(f"Repo paths: {self.repo_paths}")
 
@@ -888,66 +1653,54 @@ class DatabaseManager:
             logger.error(f"Failed to create repository structure: {e}")
             raise
 
-    def prepare_db_index(self, embedder_type: str = None, is_ollama_embedder: bool = None, 
-                        excluded_dirs: List[str] = None, excluded_files: List[str] = None,
-                        included_dirs: List[str] = None, included_files: List[str] = None) -> List[Document]:
+    def prepare_db_index(self, embedder_type: str = None, is_ollama_embedder: bool = None,
+                         refresh: bool = False, progress: ProgressCallback = no_progress) -> List[Document]:
         """
-        Prepare the indexed database for the repository.
+        Prepare the canonical indexed database for the repository.
 
         Args:
             embedder_type (str, optional): Embedder type to use ('openai', 'google', 'ollama').
                                          If None, will be determined from configuration.
             is_ollama_embedder (bool, optional): DEPRECATED. Use embedder_type instead.
                                                If None, will be determined from configuration.
-            excluded_dirs (List[str], optional): List of directories to exclude from processing
-            excluded_files (List[str], optional): List of file patterns to exclude from processing
-            included_dirs (List[str], optional): List of directories to include exclusively
-            included_files (List[str], optional): List of file patterns to include exclusively
+            refresh (bool, optional): Compare the repository against the index manifest and
+                re-embed only added or modified files, dropping chunks of deleted files
+            progress (callable, optional): Receives the ``load``, ``read``, ``split``, ``embed``
+                and ``persist`` stages.
 
         Returns:
             List[Document]: List of Document objects
         """
-        def _embedding_vector_length(doc: Document) -> int:
-            vector = getattr(doc, "vector", None)
-            if vector is None:
-                return 0
-            try:
-                if hasattr(vector, "shape"):
-                    if len(vector.shape) == 0:
-                        return 0
-                    return int(vector.shape[-1])
-                if hasattr(vector, "__len__"):
-                    return int(len(vector))
-            except Exception:
-                return 0
-            return 0
-
         # Handle backward compatibility
         if embedder_type is None and is_ollama_embedder is not None:
             embedder_type = 'ollama' if is_ollama_embedder else None
+        db_file = self.repo_paths["save_db_file"] if self.repo_paths else None
+        if db_file and not index_store_exists(db_file) and os.path.exists(db_file):
+            self._migrate_pickled_db(db_file)
+
         # check the database
-        if self.repo_paths and os.path.exists(self.repo_paths["save_db_file"]):
+        if db_file and index_store_exists(db_file):
             logger.info("Loading existing database...")
+            progress("load")
             try:
-                self.db = LocalDB.load_state(self.repo_paths["save_db_file"])
-                documents = self.db.get_transformed_data(key="split_and_embed")
-                if documents:
-                    lengths = [_embedding_vector_length(doc) for doc in documents]
-                    non_empty = sum(1 for n in lengths if n > 0)
-                    empty = len(lengths) - non_empty
-                    sample_sizes = sorted({n for n in lengths if n > 0})[:3]
+                self.store = IndexStore(db_file)
+                documents = self.store.documents()
+                if len(documents):
+                    non_empty = int(self.store.has_vector.sum())
                     logger.info(
-                        "Loaded %s documents from existing database (embeddings: %s non-empty, %s empty; sample_dims=%s)",
+                        "Loaded %s documents from existing database (embeddings: %s non-empty, %s empty; dim=%s)",
                         len(documents),
                         non_empty,
-                        empty,
-                        sample_sizes,
+                        len(documents) - non_empty,
+                        self.store.dimension,
                     )
 
                     if non_empty == 0:
                         logger.warning(
                             "Existing database contains no usable embeddings. Rebuilding embeddings..."
                         )
+                    elif refresh:
+                        return self._refresh_db_index(embedder_type=embedder_type, progress=progress)
                     else:
                         return documents
             except Exception as e:
@@ -956,22 +1709,89 @@ class DatabaseManager:
 
         # prepare the database
         logger.info("Creating new database...")
-        documents = read_all_documents(
-            self.repo_paths["save_repo_dir"],
-            embedder_type=embedder_type,
-            excluded_dirs=excluded_dirs,
-            excluded_files=excluded_files,
-            included_dirs=included_dirs,
-            included_files=included_files
-        )
+        progress("read")
+        documents = read_all_documents(self.repo_paths["save_repo_dir"], embedder_type=embedder_type)
         self.db = transform_documents_and_save_to_db(
-            documents, self.repo_paths["save_db_file"], embedder_type=embedder_type
+            documents, db_file, embedder_type=embedder_type,
+            head=get_repo_head(self.repo_paths["save_repo_dir"]), progress=progress
         )
         logger.info(f"Total documents: {len(documents)}")
-        transformed_docs = self.db.get_transformed_data(key="split_and_embed")
+        transformed_docs = self._reopen_store()
         logger.info(f"Total transformed documents: {len(transformed_docs)}")
         return transformed_docs
 
+    def _migrate_pickled_db(self, db_file: str) -> None:
+        """Convert a pickled ``LocalDB`` from earlier versions to the columnar index store."""
+        logger.info(f"Migrating pickled database {db_file} to the columnar index store...")
+        try:
+            db = LocalDB.load_state(db_file)
+            save_index_store(db, db_file)
+            os.remove(db_file)
+        except Exception as e:
+            logger.error(f"Could not migrate pickled database {db_file}: {e}")
+
+    def _reopen_store(self):
+        """Release the in-memory database and serve documents from the saved index store."""
+        self.db = None
+        if self.store is not None:
+            self.store.close()
+        self.store = IndexStore(self.repo_paths["save_db_file"])
+        return self.store.documents()
+
+    def _refresh_db_index(self, embedder_type: str = None,
+                          progress: ProgressCallback = no_progress) -> List[Document]:
+        """
+        Update the loaded index store with the files that changed in the repository.
+
+        If the manifest records the commit the index was built at, only the files in
+        ``git diff`` between that commit and the current HEAD are read; otherwise every
+        file is read and compared with the manifest. Falls back to a full rebuild when the
+        manifest was produced with another embedder.
+
+        Returns:
+            List[Document]: List of Document objects
+        """
+        embedder_type = _resolve_embedder_type(embedder_type)
+        repo_dir = self.repo_paths["save_repo_dir"]
+        manifest = load_index_manifest(self.repo_paths["save_manifest_file"])
+        head = get_repo_head(repo_dir)
+
+        if manifest is not None and manifest.get("embedder_type") not in (None, embedder_type):
+            logger.warning(
+                f"Index was built with the '{manifest.get('embedder_type')}' embedder, "
+                f"rebuilding it for '{embedder_type}'"
+            )
+            progress("read")
+            documents = read_all_documents(repo_dir, embedder_type=embedder_type)
+            self.db = transform_documents_and_save_to_db(
+                documents, self.repo_paths["save_db_file"], embedder_type=embedder_type, head=head,
+                progress=progress
+            )
+            return self._reopen_store()
+
+        changed_paths = None
+        indexed_head = manifest.get("head") if manifest is not None else None
+        if head is not None and indexed_head is not None:
+            try:
+                changed_paths = get_changed_files(repo_dir, indexed_head, head)
+            except subprocess.CalledProcessError as e:
+                logger.warning(f"Could not diff {indexed_head[:12]}..{head[:12]}, comparing all files: {e}")
+
+        if changed_paths == []:
+            logger.info(f"Index is up to date with {head[:12]}")
+            return self.store.documents()
+
+        progress("read")
+        documents = read_all_documents(repo_dir, embedder_type=embedder_type, file_paths=changed_paths)
+        self.db = refresh_documents_in_db(
+            self.store.to_local_db(), documents, self.repo_paths["save_db_file"], embedder_type=embedder_type,
+            manifest=manifest, changed_paths=changed_paths, head=head, progress=progress
+        )
+
+        transformed_docs = self._reopen_store()
+        logger.info(f"Total transformed documents after refresh: {len(transformed_docs)}")
+        return transformed_docs
+
     def prepare_retriever(self, repo_url_or_path: str, repo_type: str = None, access_token: str = None):
         """
         Prepare the retriever for a repository.
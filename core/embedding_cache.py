@@ -0,0 +1,230 @@
+"""Content-addressed, on-disk cache of chunk embeddings.
+
+Vectors are keyed by the embedder client, model, dimensions and the hash of the chunk
+text, so the same text is only sent to a provider once across rebuilds, forks and
+repositories that share files.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from copy import deepcopy
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from adalflow.core.component import DataComponent
+from adalflow.core.types import Document
+from adalflow.utils import get_adalflow_default_root_path
+
+from core.config import configs
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of host parameters per statement
+_SQL_BATCH_SIZE = 500
+
+
+def embedding_namespace(embedder) -> str:
+    """
+    Build the cache namespace of an embedder from its client, model and dimensions.
+
+    Args:
+        embedder: An ``adal.Embedder`` with ``model_client`` and ``model_kwargs``.
+
+    Returns:
+        str: The namespace, e.g. ``"OpenAIClient:text-embedding-3-small:256"``.
+    """
+    model_kwargs = getattr(embedder, "model_kwargs", None) or {}
+    client_name = type(getattr(embedder, "model_client", None)).__name__
+    return f"{client_name}:{model_kwargs.get('model')}:{model_kwargs.get('dimensions')}"
+
+
+class EmbeddingCache:
+    """
+    Persistent LRU cache of embedding vectors stored in a SQLite file.
+
+    Vectors are stored as float32. When the total size of stored vectors exceeds
+    ``max_bytes``, the least recently used entries are evicted.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+
+    def __getstate__(self):
+        # Locks cannot be pickled (the cache may be referenced from a pickled LocalDB)
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def make_key(namespace: str, text: str) -> str:
+        """Return the cache key of a chunk text within an embedder namespace."""
+        text_hash = hashlib.sha256(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+        return f"{namespace}:{text_hash}"
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        """
+        Look up vectors by key and mark the found entries as recently used.
+
+        Returns:
+            Dict[str, List[float]]: The cached vectors of the keys that were found.
+        """
+        unique_keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock, self._connect() as conn:
+            for start in range(0, len(unique_keys), _SQL_BATCH_SIZE):
+                batch = unique_keys[start:start + _SQL_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if found:
+                now = time.time()
+                conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+            self.hits += len(found)
+            self.misses += len(unique_keys) - len(found)
+        return found
+
+    def put_many(self, vectors: Dict[str, Sequence[float]]) -> None:
+        """Store vectors by key, evicting least recently used entries if over budget."""
+        if not vectors:
+            return
+        now = time.time()
+        rows = []
+        for key, vector in vectors.items():
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            rows.append((key, blob, len(blob), now))
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, size, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        to_free = total - self.max_bytes
+        stale_keys = []
+        for key, size in conn.execute("SELECT key, size FROM embeddings ORDER BY last_used"):
+            if to_free <= 0:
+                break
+            stale_keys.append(key)
+            to_free -= size
+        for start in range(0, len(stale_keys), _SQL_BATCH_SIZE):
+            batch = stale_keys[start:start + _SQL_BATCH_SIZE]
+            conn.execute(f"DELETE FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch)
+        self.evictions += len(stale_keys)
+        logger.info(f"Evicted {len(stale_keys)} entries from the embedding cache")
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and the current size of the cache."""
+        with self._lock, self._connect() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": size,
+        }
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Return the process-wide embedding cache, or None if it is disabled in the configuration.
+
+    Configured by ``embedding_cache`` in ``embedder.json`` (``enabled``, ``max_size_mb``).
+    """
+    global _cache
+    cache_config = configs.get("embedding_cache", {})
+    if not cache_config.get("enabled", True):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                path = os.path.join(get_adalflow_default_root_path(), "embedding_cache", "embeddings.sqlite")
+                max_bytes = int(cache_config.get("max_size_mb", 1024)) * 1024 * 1024
+                _cache = EmbeddingCache(path, max_bytes)
+    return _cache
+
+
+class CachedEmbeddings(DataComponent):
+    """
+    Put an embedding cache in front of an embedding transformer.
+
+    Documents whose text is already cached get their stored vector; only the remaining
+    unique texts are passed to the wrapped transformer (``ConcurrentToEmbeddings`` or
+    ``OllamaDocumentProcessor``), and the new vectors are added to the cache. Documents the
+    wrapped transformer drops are dropped from the output as well.
+    """
+
+    def __init__(self, transformer: DataComponent, cache: EmbeddingCache, namespace: str) -> None:
+        super().__init__()
+        self.transformer = transformer
+        self.cache = cache
+        self.namespace = namespace
+
+    def __call__(self, documents: Sequence[Document]) -> Sequence[Document]:
+        output = deepcopy(documents)
+        keys = [self.cache.make_key(self.namespace, doc.text) for doc in output]
+        vectors = self.cache.get_many(keys)
+
+        # Embed each uncached text once, even if several chunks share it
+        to_embed = {}
+        for doc, key in zip(output, keys):
+            if key not in vectors and key not in to_embed:
+                to_embed[key] = doc
+        logger.info(f"Embedding cache: {len(output) - len(to_embed)} cached, {len(to_embed)} to embed")
+
+        if to_embed:
+            key_by_id = {doc.id: key for key, doc in to_embed.items()}
+            embedded = self.transformer(list(to_embed.values()))
+            new_vectors = {
+                key_by_id[doc.id]: doc.vector
+                for doc in embedded
+                if doc.id in key_by_id and doc.vector is not None and len(doc.vector) > 0
+            }
+            self.cache.put_many(new_vectors)
+            vectors.update(new_vectors)
+
+        result = []
+        for doc, key in zip(output, keys):
+            if key in vectors:
+                doc.vector = vectors[key]
+                result.append(doc)
+        logger.info(f"Embedding cache stats: {self.cache.stats()}")
+        return result
+
+    def _extra_repr(self) -> str:
+        return f"namespace={self.namespace}"
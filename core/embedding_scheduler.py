@@ -0,0 +1,257 @@
+"""Concurrent, rate-limit-aware scheduling of embedding batches.
+
+Batches are sent to the provider from a thread pool, keeping several requests in
+flight. Concurrency is halved when the provider answers with a rate limit (HTTP 429,
+throttling) and grows back by one after a run of successful batches. Vectors are
+returned in the order of the input texts.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, List, Optional, Sequence
+
+from adalflow.core.component import DataComponent
+from adalflow.core.types import Document, ModelType
+
+from core.config import configs
+
+logger = logging.getLogger(__name__)
+
+# Used when a rate-limited response carries no usable Retry-After header
+DEFAULT_RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+
+_RATE_LIMIT_MARKERS = ("429", "rate limit", "ratelimit", "too many requests", "throttl", "resource exhausted")
+
+
+def _retry_after_seconds(value) -> Optional[float]:
+    """Parse a ``Retry-After`` header given either in seconds or as an HTTP date."""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        retry_at = parsedate_to_datetime(str(value))
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def rate_limit_delay(exc: BaseException) -> Optional[float]:
+    """
+    Tell whether an exception raised by an embedding call is a rate limit.
+
+    Recognizes HTTP 429 responses (``requests``, ``openai`` and similar clients expose
+    ``status_code`` or ``response.status_code``), gRPC/Google ``code == 429`` errors and
+    throttling messages from other providers.
+
+    Returns:
+        float or None: Seconds to wait before retrying, or None if ``exc`` is not a rate limit.
+    """
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+    if status is None and isinstance(getattr(exc, "code", None), int):
+        status = exc.code
+
+    if status == 429:
+        headers = getattr(response, "headers", None) or {}
+        delay = _retry_after_seconds(headers.get("retry-after") or headers.get("Retry-After"))
+        return min(delay, MAX_RETRY_DELAY) if delay is not None else DEFAULT_RETRY_DELAY
+    if status is not None:
+        return None
+
+    message = str(exc).lower()
+    if any(marker in message for marker in _RATE_LIMIT_MARKERS):
+        return DEFAULT_RETRY_DELAY
+    return None
+
+
+class EmbeddingScheduler:
+    """
+    Run embedding batches concurrently with adaptive, rate-limit-aware concurrency.
+
+    Args:
+        embed_batch: Function embedding a list of texts and returning one vector per text.
+            Rate limits must surface as exceptions (see ``rate_limit_delay``).
+        batch_size (int): Number of texts per request.
+        max_concurrency (int): Upper bound on batches in flight.
+        max_retries (int): Retries of a rate-limited batch before giving up on it.
+    """
+
+    def __init__(self, embed_batch: Callable[[List[str]], List[List[float]]], batch_size: int = 500,
+                 max_concurrency: int = 4, max_retries: int = 5):
+        self.embed_batch = embed_batch
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self._condition = threading.Condition()
+        self._reset_metrics()
+
+    def _reset_metrics(self) -> None:
+        self.concurrency = self.max_concurrency
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.batches_completed = 0
+        self.batches_failed = 0
+        self.texts_embedded = 0
+        self.rate_limited = 0
+        self._successes_since_backoff = 0
+        self._paused_until = 0.0
+        self._started_at = None
+        self._finished_at = None
+
+    def _acquire(self) -> None:
+        with self._condition:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait <= 0 and self.in_flight < self.concurrency:
+                    break
+                self._condition.wait(timeout=wait if wait > 0 else None)
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def _release(self, texts: int = 0, retry_delay: Optional[float] = None) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            if retry_delay is not None:
+                # Multiplicative decrease, and hold every worker until the provider's retry time
+                self.rate_limited += 1
+                self.concurrency = max(1, self.concurrency // 2)
+                self._successes_since_backoff = 0
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_delay)
+            elif texts:
+                self.batches_completed += 1
+                self.texts_embedded += texts
+                self._successes_since_backoff += 1
+                # Additive increase after a full round of successful batches
+                if self.concurrency < self.max_concurrency and self._successes_since_backoff >= self.concurrency:
+                    self.concurrency += 1
+                    self._successes_since_backoff = 0
+            self._condition.notify_all()
+
+    def _run_batch(self, texts: List[str]) -> Optional[List[List[float]]]:
+        for attempt in range(self.max_retries + 1):
+            self._acquire()
+            try:
+                vectors = self.embed_batch(texts)
+            except Exception as e:
+                delay = rate_limit_delay(e)
+                self._release(retry_delay=delay)
+                if delay is None:
+                    logger.error(f"Embedding batch of {len(texts)} texts failed: {e}")
+                    break
+                logger.warning(
+                    f"Embedding batch rate limited (attempt {attempt + 1}), retrying in {delay:.1f}s "
+                    f"with concurrency {self.concurrency}"
+                )
+                continue
+            self._release(texts=len(texts))
+            if len(vectors) != len(texts):
+                logger.error(f"Embedding batch returned {len(vectors)} vectors for {len(texts)} texts")
+                break
+            return vectors
+        with self._condition:
+            self.batches_failed += 1
+        return None
+
+    def embed(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """
+        Embed texts in batches, keeping up to ``max_concurrency`` batches in flight.
+
+        Returns:
+            List: One vector per input text, in input order; None for texts whose batch failed.
+        """
+        self._reset_metrics()
+        self._started_at = time.monotonic()
+        batches = [list(texts[start:start + self.batch_size]) for start in range(0, len(texts), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="embed") as executor:
+            results = list(executor.map(self._run_batch, batches))
+        self._finished_at = time.monotonic()
+
+        vectors = []
+        for batch, batch_vectors in zip(batches, results):
+            vectors.extend(batch_vectors if batch_vectors is not None else [None] * len(batch))
+        return vectors
+
+    def metrics(self) -> Dict[str, float]:
+        """Return throughput, concurrency and in-flight counters of the current or last run."""
+        with self._condition:
+            if self._started_at is None:
+                elapsed = 0.0
+            else:
+                elapsed = (self._finished_at or time.monotonic()) - self._started_at
+            return {
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "concurrency": self.concurrency,
+                "batches_completed": self.batches_completed,
+                "batches_failed": self.batches_failed,
+                "texts_embedded": self.texts_embedded,
+                "rate_limited": self.rate_limited,
+                "elapsed_seconds": elapsed,
+                "texts_per_second": self.texts_embedded / elapsed if elapsed > 0 else 0.0,
+            }
+
+
+def embedder_batch_function(embedder) -> Callable[[List[str]], List[List[float]]]:
+    """
+    Build an ``embed_batch`` function from an ``adal.Embedder``.
+
+    Calls the model client directly rather than ``Embedder.call``, which turns every
+    exception, including rate limits, into an error string.
+    """
+    def embed_batch(texts: List[str]) -> List[List[float]]:
+        model_client = embedder.model_client
+        api_kwargs = model_client.convert_inputs_to_api_kwargs(
+            input=texts, model_kwargs=embedder.model_kwargs, model_type=ModelType.EMBEDDER
+        )
+        response = model_client.call(api_kwargs=api_kwargs, model_type=ModelType.EMBEDDER)
+        output = model_client.parse_embedding_response(response)
+        if output.error:
+            raise RuntimeError(output.error)
+        return [embedding.embedding for embedding in output.data]
+
+    return embed_batch
+
+
+class ConcurrentToEmbeddings(DataComponent):
+    """
+    Drop-in replacement for ``ToEmbeddings`` that sends batches through an ``EmbeddingScheduler``.
+
+    Documents whose batch failed keep an empty vector and are filtered out downstream.
+    """
+
+    def __init__(self, embedder, batch_size: int = 500, max_concurrency: int = None, max_retries: int = None) -> None:
+        super().__init__()
+        scheduler_config = configs.get("embedding_scheduler", {})
+        if max_concurrency is None:
+            max_concurrency = scheduler_config.get("max_concurrency", 4)
+        if max_retries is None:
+            max_retries = scheduler_config.get("max_retries", 5)
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self.scheduler = EmbeddingScheduler(
+            embedder_batch_function(embedder), batch_size=batch_size,
+            max_concurrency=max_concurrency, max_retries=max_retries
+        )
+
+    def __call__(self, documents: Sequence[Document]) -> Sequence[Document]:
+        output = deepcopy(documents)
+        vectors = self.scheduler.embed([doc.text for doc in output])
+        for doc, vector in zip(output, vectors):
+            if vector is not None:
+                doc.vector = vector
+        logger.info(f"Embedding scheduler metrics: {self.scheduler.metrics()}")
+        return output
+
+    def _extra_repr(self) -> str:
+        return f"batch_size={self.batch_size}, max_concurrency={self.scheduler.max_concurrency}"
@@ -0,0 +1,331 @@
+"""Non-blocking retrieval of repository file contents for the chat handlers.
+
+The chat handlers run on the event loop, so a file fetched with ``requests`` stalls every
+connected client for as long as the hosting API takes to answer. Here files are read:
+
+1. from the local clone the repository was indexed from, when the file is in its index,
+   without any network call;
+2. otherwise from the GitHub, GitLab or Bitbucket API over one shared ``aiohttp``
+   session, which pools connections and applies the configured timeouts.
+
+Reads from the local clone do not check the access token of the request, so they are
+limited to the files of the index manifest, whose chunks are retrieved for any request of
+the repository. Everything else in the clone (``.git/config``, which holds the clone URL
+and its token, ``.env`` and the files the filters exclude) is only available through the
+authenticated API fetch. Contents fetched from the APIs are cached by repository, ref,
+path and access token, so a private file fetched with one token is never served to a
+request with another, for a limited time.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Hashable, Optional, Tuple
+from urllib.parse import quote
+
+import aiohttp
+from adalflow.utils import get_adalflow_default_root_path
+
+from core.config import configs
+from core.http_sessions import LoopSession
+from core.data_pipeline import (
+    BITBUCKET_STATUS_ERRORS,
+    bitbucket_repo_request,
+    check_gitlab_file,
+    decode_github_file,
+    get_manifest_path,
+    get_repo_name,
+    github_file_request,
+    gitlab_project_request,
+    load_index_manifest,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _file_fetch_config() -> dict:
+    return configs.get("file_fetch", {})
+
+
+class FileContentCache:
+    """
+    Thread-safe LRU cache of file contents bounded by size, whose entries expire after ``ttl_seconds``.
+
+    Files larger than the whole budget are not cached.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, content: str) -> None:
+        size = len(content)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, content)
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: Hashable) -> None:
+        self.size_bytes -= len(self._entries.pop(key)[1])
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and the current size of the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "size_bytes": self.size_bytes,
+            }
+
+
+def _new_http_session() -> aiohttp.ClientSession:
+    fetch_config = _file_fetch_config()
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=int(fetch_config.get("max_connections", 32)),
+            limit_per_host=int(fetch_config.get("max_connections_per_host", 8)),
+        ),
+        timeout=aiohttp.ClientTimeout(
+            total=float(fetch_config.get("timeout_seconds", 10)),
+            connect=float(fetch_config.get("connect_timeout_seconds", 5)),
+        ),
+    )
+
+
+_session = LoopSession(_new_http_session)
+_cache: Optional[FileContentCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """
+    Return the shared HTTP session of the running event loop, creating it on first use.
+
+    Configured by ``file_fetch`` in ``repo.json`` (``max_connections``,
+    ``max_connections_per_host``, ``timeout_seconds``, ``connect_timeout_seconds``).
+    """
+    return _session.get()
+
+
+async def close_http_session() -> None:
+    """Close the shared HTTP session; called on application shutdown."""
+    await _session.close()
+
+
+def get_file_content_cache() -> FileContentCache:
+    """Return the process-wide file content cache (``file_fetch.cache_max_mb``, ``cache_ttl_seconds``)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                fetch_config = _file_fetch_config()
+                _cache = FileContentCache(
+                    int(fetch_config.get("cache_max_mb", 64)) * 1024 * 1024,
+                    float(fetch_config.get("cache_ttl_seconds", 300)),
+                )
+    return _cache
+
+
+@lru_cache(maxsize=32)
+def _load_indexed_files(manifest_path: str, mtime_ns: int) -> frozenset:
+    manifest = load_index_manifest(manifest_path) or {}
+    return frozenset(os.path.normpath(path) for path in manifest.get("files", {}))
+
+
+def _indexed_files(manifest_path: str) -> frozenset:
+    """Return the files of an index manifest, reloaded when the manifest changes."""
+    try:
+        mtime_ns = os.stat(manifest_path).st_mtime_ns
+    except OSError:
+        return frozenset()
+    return _load_indexed_files(manifest_path, mtime_ns)
+
+
+def local_file_path(repo_url: str, file_path: str, repo_type: str = None) -> Optional[str]:
+    """
+    Return the path of a repository file in its local clone, or None if it may not be read there.
+
+    Only files of the repository's index manifest are read locally; hidden paths, paths
+    that resolve outside the clone and repositories given as local paths are rejected.
+    """
+    repo_url = repo_url.strip()
+    if not (repo_url.startswith("https://") or repo_url.startswith("http://")):
+        return None
+    relative_path = os.path.normpath(file_path.strip().lstrip("/"))
+    if any(part.startswith(".") for part in relative_path.split(os.sep)):
+        return None
+
+    root_path = get_adalflow_default_root_path()
+    repo_name = get_repo_name(repo_url, repo_type)
+    manifest_path = get_manifest_path(os.path.join(root_path, "databases", f"{repo_name}.pkl"))
+    if relative_path not in _indexed_files(manifest_path):
+        return None
+
+    repo_dir = os.path.realpath(os.path.join(root_path, "repos", repo_name))
+    path = os.path.realpath(os.path.join(repo_dir, relative_path))
+    if os.path.commonpath([repo_dir, path]) != repo_dir or not os.path.isfile(path):
+        return None
+    return path
+
+
+def _read_text(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+async def _get(url: str, headers: Dict[str, str]) -> aiohttp.ClientResponse:
+    try:
+        return await get_http_session().get(url, headers=headers)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise ValueError(f"Error fetching file content: {e!r}")
+
+
+async def get_github_file_content_async(repo_url: str, file_path: str, access_token: str = None,
+                                        ref: str = None) -> str:
+    """Asynchronous ``get_github_file_content``; ``ref`` defaults to the repository's default branch."""
+    try:
+        api_url, headers = github_file_request(repo_url, file_path, access_token)
+        if ref is not None:
+            api_url = f"{api_url}?ref={quote(ref, safe='')}"
+        logger.info(f"Fetching file content from GitHub API: {api_url}")
+        async with await _get(api_url, headers) as response:
+            if response.status >= 400:
+                raise ValueError(f"Error fetching file content: HTTP {response.status}")
+            try:
+                content_data = await response.json(content_type=None)
+            except ValueError:
+                raise ValueError("Invalid response from GitHub API")
+        return decode_github_file(content_data)
+    except Exception as e:
+        raise ValueError(f"Failed to get file content: {str(e)}")
+
+
+async def _default_branch(info_url: str, headers: Dict[str, str], read_branch) -> str:
+    try:
+        async with await _get(info_url, headers) as response:
+            if response.status == 200:
+                default_branch = read_branch(await response.json(content_type=None))
+                logger.info(f"Found default branch: {default_branch}")
+                return default_branch
+    except Exception as e:
+        logger.warning(f"Error fetching repository info: {e}, using 'main' as default branch")
+        return "main"
+    logger.warning("Could not fetch repository info, using 'main' as default branch")
+    return "main"
+
+
+async def get_gitlab_file_content_async(repo_url: str, file_path: str, access_token: str = None,
+                                        ref: str = None) -> str:
+    """Asynchronous ``get_gitlab_file_content``; ``ref`` defaults to the project's default branch."""
+    try:
+        project_info_url, headers = gitlab_project_request(repo_url, access_token)
+        if ref is None:
+            ref = await _default_branch(project_info_url, headers, lambda data: data.get("default_branch", "main"))
+        api_url = f"{project_info_url}/repository/files/{quote(file_path, safe='')}/raw?ref={quote(ref, safe='')}"
+        logger.info(f"Fetching file content from GitLab API: {api_url}")
+        async with await _get(api_url, headers) as response:
+            if response.status >= 400:
+                raise ValueError(f"Error fetching file content: HTTP {response.status}")
+            content = await response.text()
+        return check_gitlab_file(content)
+    except Exception as e:
+        raise ValueError(f"Failed to get file content: {str(e)}")
+
+
+async def get_bitbucket_file_content_async(repo_url: str, file_path: str, access_token: str = None,
+                                           ref: str = None) -> str:
+    """Asynchronous ``get_bitbucket_file_content``; ``ref`` defaults to the repository's main branch."""
+    try:
+        repo_info_url, headers = bitbucket_repo_request(repo_url, access_token)
+        if ref is None:
+            ref = await _default_branch(
+                repo_info_url, headers, lambda data: data.get("mainbranch", {}).get("name", "main")
+            )
+        api_url = f"{repo_info_url}/src/{ref}/{file_path}"
+        logger.info(f"Fetching file content from Bitbucket API: {api_url}")
+        async with await _get(api_url, headers) as response:
+            if response.status in BITBUCKET_STATUS_ERRORS:
+                raise ValueError(BITBUCKET_STATUS_ERRORS[response.status])
+            if response.status >= 400:
+                raise ValueError(f"Error fetching file content: HTTP {response.status}")
+            return await response.text()
+    except Exception as e:
+        raise ValueError(f"Failed to get file content: {str(e)}")
+
+
+async def get_file_content_async(repo_url: str, file_path: str, repo_type: str = None,
+                                 access_token: str = None, ref: str = None) -> str:
+    """
+    Retrieve the content of a repository file without blocking the event loop.
+
+    Args:
+        repo_url (str): The URL of the repository
+        file_path (str): The path to the file within the repository
+        repo_type (str): Type of repository
+        access_token (str, optional): Access token for private repositories
+        ref (str, optional): Branch, tag or commit to read. By default an indexed file is
+            read from the local clone (the revision the index was built from), any other
+            from the default branch.
+
+    Returns:
+        str: The content of the file as a string
+
+    Raises:
+        ValueError: If the file cannot be fetched or if the URL is not valid
+    """
+    if ref is None:
+        path = await asyncio.to_thread(local_file_path, repo_url, file_path, repo_type)
+        if path is not None:
+            try:
+                return await asyncio.to_thread(_read_text, path)
+            except (OSError, UnicodeDecodeError) as e:
+                logger.warning(f"Could not read {file_path} from the local clone, fetching it: {e}")
+
+    token_key = hashlib.sha256(access_token.encode()).hexdigest() if access_token else None
+    cache_key = (repo_url.strip(), ref, file_path, token_key)
+    cache = get_file_content_cache()
+    content = cache.get(cache_key)
+    if content is not None:
+        return content
+
+    if repo_type == "github":
+        content = await get_github_file_content_async(repo_url, file_path, access_token, ref)
+    elif repo_type == "gitlab":
+        content = await get_gitlab_file_content_async(repo_url, file_path, access_token, ref)
+    elif repo_type == "bitbucket":
+        content = await get_bitbucket_file_content_async(repo_url, file_path, access_token, ref)
+    else:
+        raise ValueError("Unsupported repository type. Only GitHub, GitLab, and Bitbucket are supported.")
+    cache.put(cache_key, content)
+    return content
@@ -0,0 +1,67 @@
+"""``aiohttp`` sessions shared by the requests of an event loop.
+
+An ``aiohttp.ClientSession`` belongs to the event loop it was created on and cannot be
+used from another one. The application serves every request from one loop, but tests
+and helpers that call ``asyncio.run`` start new loops, so a shared session is recreated
+when the running loop changes. The session it replaces is closed on its own loop while
+that loop still runs; once the loop has stopped the session can no longer be closed
+and is detached instead, which marks it closed and drops its connector.
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Callable, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+def _release(session: aiohttp.ClientSession, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """Close a session of another event loop, or detach it if that loop has stopped."""
+    if session.closed:
+        return
+    if loop is not None and loop.is_running():
+        asyncio.run_coroutine_threadsafe(session.close(), loop)
+    else:
+        session.detach()
+    logger.debug("Released the HTTP session of a previous event loop")
+
+
+class LoopSession:
+    """
+    Hold one ``aiohttp.ClientSession`` for the running event loop.
+
+    Args:
+        factory: Creates the session; called on the event loop that will use it.
+    """
+
+    def __init__(self, factory: Callable[[], aiohttp.ClientSession]):
+        self._factory = factory
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> aiohttp.ClientSession:
+        """Return the session of the running event loop, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._session is None or self._session.closed or self._loop is not loop:
+                if self._session is not None:
+                    _release(self._session, self._loop)
+                self._session = self._factory()
+                self._loop = loop
+            return self._session
+
+    async def close(self) -> None:
+        """Close the session; it is recreated if used again."""
+        with self._lock:
+            session, loop = self._session, self._loop
+            self._session = self._loop = None
+        if session is None or session.closed:
+            return
+        if loop is asyncio.get_running_loop():
+            await session.close()
+        else:
+            _release(session, loop)
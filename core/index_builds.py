@@ -0,0 +1,212 @@
+"""Single-flight coordination of repository index builds.
+
+Cloning and embedding a repository takes minutes, and several requests often ask for
+the same unindexed repository at once (two users, or the parallel page requests of wiki
+generation). Builds are coordinated per repository so that only one of them does the
+work:
+
+- Within a process, the first request runs the build and later ones wait for it to
+  finish, then load the index it wrote without building again (a refresh requested
+  while another one runs is served by that one). If the build fails, the waiting
+  requests get its error instead of starting another build.
+- Across worker processes, the build holds an exclusive file lock next to the index
+  store, so a build in another worker waits for it and then finds the index on disk.
+
+Requests for a repository that is already indexed load the index without going through
+the coordinator (see ``DatabaseManager.prepare_database``); only builds and refreshes
+take the lock.
+
+The running build reports its stage; waiting requests can read it with ``progress``,
+including progress reported by a build in another worker.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+from adalflow.utils import get_adalflow_default_root_path
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Called by a build to report its stage, with optional counts (``files``, ``chunks``, ...)
+ProgressCallback = Callable[..., None]
+
+
+def no_progress(stage: str, **detail) -> None:
+    """The progress callback of builds nobody is watching."""
+
+
+@dataclass
+class BuildProgress:
+    """The stage a repository index build has reached."""
+
+    stage: str = "waiting"
+    detail: Dict[str, Any] = field(default_factory=dict)
+    started_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    # The process running the build
+    pid: int = field(default_factory=os.getpid)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.progress = BuildProgress()
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class BuildCoordinator:
+    """
+    Run at most one index build per repository at a time.
+
+    Args:
+        lock_dir: Directory of the per-repository lock and progress files shared by the
+            worker processes.
+    """
+
+    def __init__(self, lock_dir: str):
+        self.lock_dir = lock_dir
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.lock_dir, f"{key}.build.{suffix}")
+
+    def run(self, key: str, build: Callable[[ProgressCallback], Any],
+            load: Optional[Callable[[], Any]] = None) -> Any:
+        """
+        Run ``build`` for a repository unless a build of it is already running in this process.
+
+        A request that finds a build running waits for it and then calls ``load`` to read
+        what the build wrote. Only if there is no ``load`` or it returns None does the
+        request run ``build`` itself, after any other waiting request that does.
+
+        Args:
+            key: The repository, as named in the index store paths.
+            build: Builds or loads the index, reporting its stages through the callback
+                it is given.
+            load: Loads the index a finished build wrote, returning None if there is none.
+
+        Returns:
+            The result of ``build``, or of ``load`` for a request that waited.
+        """
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                if flight is None:
+                    flight = self._flights[key] = _Flight()
+                    break
+                flight.waiters += 1
+            logger.info(f"Waiting for the running index build of {key}")
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            if load is not None:
+                result = load()
+                if result is not None:
+                    return result
+
+        try:
+            with self._file_lock(key):
+                return build(lambda stage, **detail: self._report(key, flight, stage, detail))
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def progress(self, key: str) -> Optional[BuildProgress]:
+        """
+        Return the progress of the running build of a repository, or None if none is running.
+
+        A build running in another worker is seen through its progress file.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+        if flight is not None and flight.progress.stage != "waiting":
+            return flight.progress
+        if flight is None and not self._locked_elsewhere(key):
+            return None
+        try:
+            with open(self._path(key, "json"), "r", encoding="utf-8") as f:
+                return BuildProgress(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return flight.progress if flight is not None else None
+
+    def _report(self, key: str, flight: _Flight, stage: str, detail: Dict[str, Any]) -> None:
+        flight.progress = BuildProgress(
+            stage=stage, detail=detail, started_at=flight.progress.started_at, updated_at=time.time()
+        )
+        logger.info(f"Index build of {key}: {stage} {detail or ''}".rstrip())
+        # Shared with waiting requests in other workers
+        tmp_path = self._path(key, f"json.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(flight.progress.to_dict(), f)
+            os.replace(tmp_path, self._path(key, "json"))
+        except OSError as e:
+            logger.warning(f"Could not write the progress of the index build of {key}: {e}")
+
+    @contextmanager
+    def _file_lock(self, key: str):
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.lock_dir, exist_ok=True)
+        with open(self._path(key, "lock"), "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.info(f"Waiting for the index build of {key} running in another worker")
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                try:
+                    os.remove(self._path(key, "json"))
+                except OSError:
+                    pass
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _locked_elsewhere(self, key: str) -> bool:
+        """Tell whether another worker holds the build lock of a repository."""
+        lock_path = self._path(key, "lock")
+        if fcntl is None or not os.path.exists(lock_path):
+            return False
+        with open(lock_path, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            return False
+
+
+_coordinator: Optional[BuildCoordinator] = None
+_coordinator_lock = threading.Lock()
+
+
+def get_build_coordinator() -> BuildCoordinator:
+    """Return the process-wide coordinator, locking under the adalflow ``databases`` directory."""
+    global _coordinator
+    if _coordinator is None:
+        with _coordinator_lock:
+            if _coordinator is None:
+                _coordinator = BuildCoordinator(os.path.join(get_adalflow_default_root_path(), "databases"))
+    return _coordinator
@@ -0,0 +1,353 @@
+"""Background queue of repository index builds.
+
+Indexing a repository inline with the first chat request keeps that connection open for
+minutes. Builds can instead be submitted as jobs (``POST /api/index``) and run by a
+bounded pool of worker threads, while clients poll the job (``GET /api/index/{job}``)
+for its stage: ``download``, ``read``, ``split``, ``embed``, ``persist``.
+
+Job state is kept in a SQLite file next to the index stores, so it is visible to every
+worker process and survives restarts. Access tokens are only held in memory by the job
+that uses them.
+
+Every job records the process instance that owns it (``INSTANCE_ID``, drawn when the
+module is imported, so it is never reused the way pids are after a restart), and the
+owner refreshes the heartbeat of its queued and running jobs while it runs. A job whose
+owner stopped refreshing it for ``heartbeat_timeout`` seconds is marked as failed when
+it is next looked up.
+"""
+
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+from uuid import uuid4
+
+from adalflow.utils import get_adalflow_default_root_path
+
+from core.config import configs
+from core.data_pipeline import DatabaseManager, get_repo_name
+from core.index_builds import ProgressCallback
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# The process instance that owns the jobs it queues
+INSTANCE_ID = uuid4().hex
+
+_COLUMNS = (
+    "id", "repo_key", "repo_url", "repo_type", "refresh", "status", "stages", "error",
+    "created_at", "started_at", "finished_at", "pid", "owner", "heartbeat_at",
+)
+
+
+@dataclass
+class IndexJob:
+    """A repository index build and the stages it has gone through."""
+
+    id: str
+    repo_key: str
+    repo_url: str
+    repo_type: str
+    refresh: bool = False
+    status: str = "queued"
+    # {"stage", "at", "detail"} entries in the order the stages were reached
+    stages: List[Dict[str, Any]] = field(default_factory=list)
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    pid: int = field(default_factory=os.getpid)
+    owner: Optional[str] = INSTANCE_ID
+    # When the owner last reported the job as alive
+    heartbeat_at: Optional[float] = field(default_factory=time.time)
+
+    @property
+    def stage(self) -> Optional[str]:
+        return self.stages[-1]["stage"] if self.stages else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        job = asdict(self)
+        for internal in ("pid", "owner", "heartbeat_at"):
+            del job[internal]
+        job["stage"] = self.stage
+        return job
+
+
+class IndexJobStore:
+    """
+    SQLite persistence of index jobs.
+
+    Args:
+        path: The SQLite file, shared by the worker processes.
+        heartbeat_timeout: Seconds after the last heartbeat of another instance's job
+            at which the job is considered interrupted.
+    """
+
+    def __init__(self, path: str, heartbeat_timeout: float = 60):
+        self.path = path
+        self.heartbeat_timeout = heartbeat_timeout
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS index_jobs ("
+                "id TEXT PRIMARY KEY, repo_key TEXT NOT NULL, repo_url TEXT NOT NULL, repo_type TEXT, "
+                "refresh INTEGER NOT NULL, status TEXT NOT NULL, stages TEXT NOT NULL, error TEXT, "
+                "created_at REAL NOT NULL, started_at REAL, finished_at REAL, pid INTEGER NOT NULL, "
+                "owner TEXT, heartbeat_at REAL)"
+            )
+            # Stores of earlier versions only recorded the pid; their active jobs have no owner
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(index_jobs)")}
+            for column, column_type in (("owner", "TEXT"), ("heartbeat_at", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE index_jobs ADD COLUMN {column} {column_type}")
+            conn.execute("CREATE INDEX IF NOT EXISTS index_jobs_repo ON index_jobs (repo_key, status)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def _to_job(row) -> IndexJob:
+        values = dict(zip(_COLUMNS, row))
+        values["refresh"] = bool(values["refresh"])
+        values["stages"] = json.loads(values["stages"])
+        return IndexJob(**values)
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, job: IndexJob) -> None:
+        values = asdict(job)
+        values["stages"] = json.dumps(job.stages)
+        values["refresh"] = int(job.refresh)
+        conn.execute(
+            f"INSERT OR REPLACE INTO index_jobs ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+            [values[column] for column in _COLUMNS],
+        )
+
+    def _fail_orphaned(self, conn: sqlite3.Connection) -> int:
+        cursor = conn.execute(
+            "UPDATE index_jobs SET status = 'failed', error = ?, finished_at = ? "
+            "WHERE status IN (?, ?) AND owner IS NOT ? AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+            ("Interrupted by a server restart", time.time(), *ACTIVE_STATUSES, INSTANCE_ID,
+             time.time() - self.heartbeat_timeout),
+        )
+        return cursor.rowcount
+
+    @staticmethod
+    def _active_row(conn: sqlite3.Connection, repo_key: str):
+        return conn.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM index_jobs WHERE repo_key = ? AND status IN (?, ?) "
+            "ORDER BY created_at LIMIT 1",
+            (repo_key, *ACTIVE_STATUSES),
+        ).fetchone()
+
+    def save(self, job: IndexJob) -> None:
+        with self._connect() as conn:
+            self._insert(conn, job)
+
+    def add_unless_active(self, job: IndexJob) -> IndexJob:
+        """
+        Save a new job unless its repository has an active job already.
+
+        The check and the insert are one transaction, so two workers submitting the same
+        repository at once never both add a job.
+
+        Returns:
+            IndexJob: ``job`` if it was added, otherwise the active job of its repository.
+        """
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._fail_orphaned(conn)
+                row = self._active_row(conn, job.repo_key)
+                if row is None:
+                    self._insert(conn, job)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+        return job if row is None else self._to_job(row)
+
+    def get(self, job_id: str) -> Optional[IndexJob]:
+        with self._connect() as conn:
+            self._fail_orphaned(conn)
+            row = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM index_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row else None
+
+    def active_job(self, repo_key: str) -> Optional[IndexJob]:
+        """Return the queued or running job of a repository, if any."""
+        with self._connect() as conn:
+            self._fail_orphaned(conn)
+            row = self._active_row(conn, repo_key)
+        return self._to_job(row) if row else None
+
+    def heartbeat(self, owner: str = INSTANCE_ID) -> None:
+        """Report the queued and running jobs of an instance as alive."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE index_jobs SET heartbeat_at = ? WHERE owner = ? AND status IN (?, ?)",
+                (time.time(), owner, *ACTIVE_STATUSES),
+            )
+
+    def fail_orphaned_jobs(self) -> int:
+        """Mark the active jobs of other instances that stopped sending heartbeats as failed."""
+        with self._connect() as conn:
+            return self._fail_orphaned(conn)
+
+
+def _build_index(job: IndexJob, access_token: Optional[str], progress: ProgressCallback) -> None:
+    DatabaseManager().prepare_database(
+        job.repo_url, job.repo_type, access_token, refresh=job.refresh, progress=progress
+    )
+
+
+class IndexJobQueue:
+    """
+    Run index jobs on a bounded pool of daemon worker threads.
+
+    Args:
+        store: Where job state is persisted.
+        max_workers: Number of builds that run at the same time.
+        max_queued: Number of jobs that may wait for a worker; ``submit`` raises
+            ``queue.Full`` beyond it.
+        build: Runs one job, reporting its stages; builds the repository's index store
+            by default.
+        heartbeat_interval: Seconds between heartbeats of the queued and running jobs;
+            well below the ``heartbeat_timeout`` of the store.
+    """
+
+    def __init__(self, store: IndexJobStore, max_workers: int = 2, max_queued: int = 32,
+                 build: Callable[[IndexJob, Optional[str], ProgressCallback], None] = _build_index,
+                 heartbeat_interval: float = 15):
+        self.store = store
+        self.max_workers = max_workers
+        self.build = build
+        self.heartbeat_interval = heartbeat_interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queued)
+        self._lock = threading.Lock()
+        self._workers: List[threading.Thread] = []
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def submit(self, repo_url: str, repo_type: str = "github", access_token: str = None,
+               refresh: bool = False) -> IndexJob:
+        """
+        Queue an index build of a repository.
+
+        Returns:
+            IndexJob: The new job, or the queued or running job of the same repository.
+        """
+        repo_url = repo_url.strip()
+        repo_key = get_repo_name(repo_url, repo_type)
+        with self._lock:
+            job = IndexJob(id=uuid4().hex, repo_key=repo_key, repo_url=repo_url, repo_type=repo_type, refresh=refresh)
+            # Only submit adds to the queue, so it cannot fill up between the check and the put
+            if self._queue.full():
+                active = self.store.active_job(repo_key)
+                if active is None:
+                    raise queue.Full
+            else:
+                active = self.store.add_unless_active(job)
+            if active is not job:
+                logger.info(f"Index job {active.id} of {repo_key} is already {active.status}")
+                return active
+            self._queue.put_nowait((job, access_token))
+            self._start_workers()
+        logger.info(f"Queued index job {job.id} for {repo_key}")
+        return job
+
+    def get(self, job_id: str) -> Optional[IndexJob]:
+        return self.store.get(job_id)
+
+    def active_job(self, repo_url: str, repo_type: str = None) -> Optional[IndexJob]:
+        """Return the queued or running job of a repository, if any."""
+        return self.store.active_job(get_repo_name(repo_url, repo_type))
+
+    def _start_workers(self) -> None:
+        if self._heartbeat is None:
+            self._heartbeat = threading.Thread(target=self._send_heartbeats, name="index-job-heartbeat", daemon=True)
+            self._heartbeat.start()
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(
+                target=self._work, name=f"index-job-worker-{len(self._workers)}", daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def _send_heartbeats(self) -> None:
+        while True:
+            time.sleep(self.heartbeat_interval)
+            try:
+                self.store.heartbeat()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not record the heartbeat of index jobs: {e}")
+
+    def _save(self, job: IndexJob) -> None:
+        job.heartbeat_at = time.time()
+        self.store.save(job)
+
+    def _work(self) -> None:
+        while True:
+            job, access_token = self._queue.get()
+            try:
+                self._run(job, access_token)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job: IndexJob, access_token: Optional[str]) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        self._save(job)
+
+        def progress(stage: str, **detail) -> None:
+            job.stages.append({"stage": stage, "at": time.time(), "detail": detail})
+            self._save(job)
+
+        try:
+            self.build(job, access_token, progress)
+            job.status = "succeeded"
+        except Exception as e:
+            logger.error(f"Index job {job.id} for {job.repo_key} failed: {e}")
+            job.status = "failed"
+            job.error = str(e)
+        job.finished_at = time.time()
+        self._save(job)
+        logger.info(f"Index job {job.id} for {job.repo_key} {job.status}")
+
+
+_queue: Optional[IndexJobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_index_job_queue() -> IndexJobQueue:
+    """
+    Return the process-wide index job queue.
+
+    Configured by ``index_jobs`` in ``repo.json`` (``max_workers``, ``max_queued``,
+    ``heartbeat_seconds``, ``heartbeat_timeout_seconds``).
+    """
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                jobs_config = configs.get("index_jobs", {})
+                store = IndexJobStore(
+                    os.path.join(get_adalflow_default_root_path(), "databases", "index_jobs.sqlite"),
+                    heartbeat_timeout=float(jobs_config.get("heartbeat_timeout_seconds", 60)),
+                )
+                orphaned = store.fail_orphaned_jobs()
+                if orphaned:
+                    logger.warning(f"Marked {orphaned} interrupted index jobs as failed")
+                _queue = IndexJobQueue(
+                    store,
+                    max_workers=int(jobs_config.get("max_workers", 2)),
+                    max_queued=int(jobs_config.get("max_queued", 32)),
+                    heartbeat_interval=float(jobs_config.get("heartbeat_seconds", 15)),
+                )
+    return _queue
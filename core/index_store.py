@@ -0,0 +1,668 @@
+"""Columnar on-disk storage of an indexed repository.
+
+An index is stored as files next to each other:
+
+- ``<name>.vectors.<build>.npy``: the chunk embeddings as one contiguous float32 matrix,
+  opened with ``np.load(mmap_mode="r")`` so worker processes share its pages through the
+  OS cache. The file is named after the build that wrote it, which the chunk table
+  records, so a store opened while another build replaces it always pairs its chunks
+  with their own vectors;
+- ``<name>.chunks.sqlite``: chunk text and metadata (one row per matrix row, with the
+  ``file_path`` in its own column) and the source documents, read on demand. It is
+  replaced last, so its presence marks a complete store;
+- ``<name>.faiss``: the FAISS index over the rows that hold an embedding, built once when
+  the store is written and read back with memory mapping. With ``ann_index.quantization``
+  its vectors are float16 or int8 codes, re-scored against the float32 matrix. The id of
+  the build that wrote it is kept in ``<name>.faiss.build`` and in the chunk table, so an
+  index left next to the chunks of another build is never used.
+
+Loading an index therefore costs the same regardless of its size; documents are only
+built for the rows that are actually accessed.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from collections.abc import Sequence as SequenceABC
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import faiss
+import numpy as np
+from adalflow.core.db import LocalDB
+from adalflow.core.types import Document
+
+from core.config import configs
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout changes; older stores are rebuilt
+INDEX_STORE_VERSION = 3
+
+TRANSFORMED_KEY = "split_and_embed"
+
+_FETCH_SIZE = 1000
+
+_CHUNK_COLUMNS = "row, id, parent_doc_id, chunk_order, text, meta_data, estimated_num_tokens, has_vector"
+
+
+def get_index_store_paths(db_path: str, build_id: str = None) -> dict:
+    """
+    Return the paths of the vector matrix, the chunk table and the FAISS index stored for ``db_path``.
+
+    The vector matrix is the one written by ``build_id``; without it, the path is the
+    prefix shared by the matrices of every build.
+    """
+    base = os.path.splitext(db_path)[0]
+    return {
+        "vectors": f"{base}.vectors.{build_id}.npy" if build_id else f"{base}.vectors.",
+        "chunks": f"{base}.chunks.sqlite",
+        "faiss": f"{base}.faiss",
+        "faiss_build": f"{base}.faiss.build",
+    }
+
+
+def index_store_exists(db_path: str) -> bool:
+    """Tell whether a columnar index has been saved for ``db_path``."""
+    return os.path.exists(get_index_store_paths(db_path)["chunks"])
+
+
+def get_retriever_metric() -> str:
+    """Return the similarity metric configured for the FAISS retriever."""
+    return configs.get("retriever", {}).get("metric", "prob")
+
+
+def get_ann_config() -> dict:
+    """Return the approximate-nearest-neighbour index settings (``ann_index`` in ``embedder.json``)."""
+    return configs.get("ann_index", {})
+
+
+def select_index_type(num_vectors: int, ann_config: dict = None) -> str:
+    """
+    Pick the FAISS index type for a corpus of ``num_vectors`` chunks.
+
+    ``ann_index.type`` forces ``"flat"``, ``"ivf"`` or ``"hnsw"``; with ``"auto"`` the type
+    is chosen by the ``ivf_min_chunks`` and ``hnsw_min_chunks`` thresholds (see
+    ``core.tools.ann_benchmark`` for the measurements behind the defaults).
+    """
+    ann_config = get_ann_config() if ann_config is None else ann_config
+    index_type = ann_config.get("type", "auto")
+    if index_type != "auto":
+        return index_type
+    if num_vectors >= ann_config.get("hnsw_min_chunks", 1000000):
+        return "hnsw"
+    if num_vectors >= ann_config.get("ivf_min_chunks", 50000):
+        return "ivf"
+    return "flat"
+
+
+_QUANTIZERS = {
+    "fp16": ("SQfp16", faiss.ScalarQuantizer.QT_fp16),
+    "int8": ("SQ8", faiss.ScalarQuantizer.QT_8bit),
+}
+
+
+def get_quantization(ann_config: dict = None) -> str:
+    """Return the configured vector quantization: ``"none"``, ``"fp16"`` or ``"int8"``."""
+    ann_config = get_ann_config() if ann_config is None else ann_config
+    quantization = ann_config.get("quantization", "none")
+    if quantization != "none" and quantization not in _QUANTIZERS:
+        raise ValueError(f"Unknown vector quantization: {quantization}")
+    return quantization
+
+
+def configure_index_search(index, ann_config: dict = None) -> None:
+    """Apply the search-time parameters (``ivf.nprobe``, ``hnsw.ef_search``) to an index."""
+    ann_config = get_ann_config() if ann_config is None else ann_config
+    ivf_index = faiss.try_extract_index_ivf(index)
+    if ivf_index is not None:
+        ivf_index.nprobe = min(ivf_index.nlist, ann_config.get("ivf", {}).get("nprobe", 16))
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ann_config.get("hnsw", {}).get("ef_search", 128)
+
+
+def build_faiss_index(vectors: np.ndarray, metric: str = "prob", index_type: str = None, ann_config: dict = None):
+    """
+    Build the FAISS index searched by the retriever.
+
+    Cosine-based metrics (``"cosine"``, ``"prob"``) use inner product over L2-normalized
+    vectors, ``"euclidean"`` L2 distance over the raw vectors. The index type defaults to
+    ``select_index_type(len(vectors))``.
+
+    With ``ann_index.quantization`` set to ``"fp16"`` or ``"int8"`` the index keeps scalar
+    quantized codes instead of float32 vectors; int8 codes use a per-dimension range
+    learned from ``vectors``.
+    """
+    ann_config = get_ann_config() if ann_config is None else ann_config
+    xb = np.array(vectors, dtype=np.float32, order="C", copy=True)
+    num_vectors, dimension = xb.shape
+    index_type = index_type or select_index_type(num_vectors, ann_config)
+    quantization = get_quantization(ann_config)
+    if metric == "euclidean":
+        metric_type = faiss.METRIC_L2
+    else:
+        metric_type = faiss.METRIC_INNER_PRODUCT
+        faiss.normalize_L2(xb)
+
+    encoding, qtype = _QUANTIZERS.get(quantization, ("Flat", None))
+    if index_type == "hnsw":
+        hnsw_config = ann_config.get("hnsw", {})
+        if qtype is None:
+            index = faiss.IndexHNSWFlat(dimension, hnsw_config.get("M", 32), metric_type)
+        else:
+            index = faiss.IndexHNSWSQ(dimension, qtype, hnsw_config.get("M", 32), metric_type)
+        index.hnsw.efConstruction = hnsw_config.get("ef_construction", 200)
+    elif index_type == "ivf":
+        # About 4 * sqrt(n) lists, keeping at least 39 training points per list as FAISS recommends
+        nlist = ann_config.get("ivf", {}).get("nlist") or int(4 * np.sqrt(num_vectors))
+        nlist = max(1, min(nlist, num_vectors // 39))
+        index = faiss.index_factory(dimension, f"IVF{nlist},{encoding}", metric_type)
+    elif index_type == "flat":
+        if qtype is not None:
+            index = faiss.IndexScalarQuantizer(dimension, qtype, metric_type)
+        elif metric_type == faiss.METRIC_INNER_PRODUCT:
+            index = faiss.IndexFlatIP(dimension)
+        else:
+            index = faiss.IndexFlatL2(dimension)
+    else:
+        raise ValueError(f"Unknown ANN index type: {index_type}")
+
+    if not index.is_trained:
+        index.train(xb)
+    index.add(xb)
+    configure_index_search(index, ann_config)
+    return index
+
+
+def faiss_index_type(index) -> str:
+    """Return ``"flat"``, ``"ivf"`` or ``"hnsw"`` for an index built by ``build_faiss_index``."""
+    index = getattr(index, "base_index", index)
+    if faiss.try_extract_index_ivf(index) is not None:
+        return "ivf"
+    if hasattr(index, "hnsw"):
+        return "hnsw"
+    return "flat"
+
+
+def _index_codes(index):
+    """Return the part of an index that stores the vector codes."""
+    index = getattr(index, "base_index", index)
+    if hasattr(index, "hnsw"):
+        return faiss.downcast_index(index.storage)
+    ivf_index = faiss.try_extract_index_ivf(index)
+    return faiss.downcast_index(ivf_index if ivf_index is not None else index)
+
+
+def faiss_quantization(index) -> str:
+    """Return ``"none"``, ``"fp16"`` or ``"int8"`` for an index built by ``build_faiss_index``."""
+    sq = getattr(_index_codes(index), "sq", None)
+    if sq is None:
+        return "none"
+    for quantization, (_, qtype) in _QUANTIZERS.items():
+        if sq.qtype == qtype:
+            return quantization
+    return "other"
+
+
+def index_nbytes(index) -> int:
+    """Estimate the bytes an index holds in process memory (codes plus re-scoring vectors)."""
+    nbytes = _index_codes(index).code_size * index.ntotal
+    vectors = getattr(index, "vectors", None)
+    if vectors is not None and not isinstance(vectors, np.memmap):
+        nbytes += vectors.nbytes
+    return nbytes
+
+
+class RescoredIndex:
+    """
+    A quantized FAISS index whose top candidates are re-ranked with exact float32 scores.
+
+    ``search`` asks the quantized index for ``rescore_factor * k`` candidates and scores
+    them again against their float32 vectors. ``vectors`` may be the memory-mapped matrix
+    of the index store, with ``rows`` mapping index ids to matrix rows, so only the
+    candidate rows are read.
+    """
+
+    def __init__(self, base_index, vectors: np.ndarray, rows: Optional[np.ndarray] = None, rescore_factor: int = 4):
+        self.base_index = base_index
+        self.vectors = vectors
+        self.rows = rows
+        self.rescore_factor = max(1, rescore_factor)
+
+    @property
+    def ntotal(self) -> int:
+        return self.base_index.ntotal
+
+    @property
+    def d(self) -> int:
+        return self.base_index.d
+
+    @property
+    def metric_type(self) -> int:
+        return self.base_index.metric_type
+
+    def search(self, xq: np.ndarray, k: int, params=None):
+        xq = np.asarray(xq, dtype=np.float32).reshape(-1, self.d)
+        inner_product = self.metric_type == faiss.METRIC_INNER_PRODUCT
+        _, candidates = self.base_index.search(xq, min(self.ntotal, k * self.rescore_factor), params=params)
+
+        # Padding follows FAISS: id -1 with the worst possible score
+        worst = np.finfo(np.float32).max
+        distances = np.full((len(xq), k), -worst if inner_product else worst, dtype=np.float32)
+        labels = np.full((len(xq), k), -1, dtype=np.int64)
+        for i, (query, ids) in enumerate(zip(xq, candidates)):
+            ids = ids[ids >= 0]
+            if not len(ids):
+                continue
+            rows = ids if self.rows is None else self.rows[ids]
+            vectors = np.asarray(self.vectors[rows], dtype=np.float32)
+            if inner_product:
+                vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+                scores = vectors @ query
+                order = np.argsort(-scores, kind="stable")[:k]
+            else:
+                scores = ((vectors - query) ** 2).sum(axis=1)
+                order = np.argsort(scores, kind="stable")[:k]
+            distances[i, :len(order)] = scores[order]
+            labels[i, :len(order)] = ids[order]
+        return distances, labels
+
+
+def with_rescoring(index, vectors: np.ndarray, rows: Optional[np.ndarray] = None, ann_config: dict = None):
+    """
+    Wrap a quantized index in a ``RescoredIndex`` when ``ann_index.rescore_factor`` enables it.
+
+    Indexes holding float32 vectors, or a ``rescore_factor`` of 0, are returned unchanged.
+    """
+    ann_config = get_ann_config() if ann_config is None else ann_config
+    rescore_factor = ann_config.get("rescore_factor", 4)
+    if faiss_quantization(index) == "none" or not rescore_factor:
+        return index
+    return RescoredIndex(index, vectors, rows=rows, rescore_factor=rescore_factor)
+
+
+def _faiss_mmap_flags() -> int:
+    # IO_FLAG_MMAP_IFC maps the codes of flat indexes; older releases only have IO_FLAG_MMAP
+    return getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def _vector_length(vector) -> int:
+    if vector is None:
+        return 0
+    try:
+        return len(vector)
+    except TypeError:
+        return 0
+
+
+def _dumps_meta(meta_data) -> str:
+    return json.dumps(meta_data or {}, default=str)
+
+
+def save_index_store(db: LocalDB, db_path: str) -> None:
+    """
+    Write the items and transformed chunks of a database in the columnar format.
+
+    Vectors are stored with the dimension shared by most chunks; chunks without a vector
+    or with another dimension are kept with a zero row and flagged as missing.
+
+    Args:
+        db (LocalDB): A database transformed with the ``split_and_embed`` key.
+        db_path (str): The database path the store files are derived from.
+    """
+    build_id = uuid.uuid4().hex
+    paths = get_index_store_paths(db_path, build_id)
+    os.makedirs(os.path.dirname(paths["vectors"]), exist_ok=True)
+    chunks = db.get_transformed_data(key=TRANSFORMED_KEY) or []
+
+    lengths = [_vector_length(chunk.vector) for chunk in chunks]
+    sizes = {}
+    for length in lengths:
+        if length > 0:
+            sizes[length] = sizes.get(length, 0) + 1
+    dimension = max(sizes, key=sizes.get) if sizes else 0
+
+    vectors = np.zeros((len(chunks), dimension), dtype=np.float32)
+    has_vector = []
+    for row, (chunk, length) in enumerate(zip(chunks, lengths)):
+        if dimension and length == dimension:
+            vectors[row] = np.asarray(chunk.vector, dtype=np.float32)
+            has_vector.append(1)
+        else:
+            has_vector.append(0)
+
+    metric = get_retriever_metric()
+    valid_rows = np.asarray(has_vector, dtype=bool)
+    faiss_ntotal = int(valid_rows.sum())
+    faiss_tmp = f"{paths['faiss']}.tmp"
+    faiss_build_tmp = f"{paths['faiss_build']}.tmp"
+    index_type = select_index_type(faiss_ntotal)
+    quantization = get_quantization()
+    if faiss_ntotal:
+        faiss.write_index(build_faiss_index(vectors[valid_rows], metric, index_type), faiss_tmp)
+        with open(faiss_build_tmp, "w", encoding="utf-8") as f:
+            f.write(build_id)
+
+    vectors_tmp = f"{paths['vectors']}.tmp.npy"
+    chunks_tmp = f"{paths['chunks']}.tmp"
+    np.save(vectors_tmp, vectors)
+    if os.path.exists(chunks_tmp):
+        os.remove(chunks_tmp)
+    conn = sqlite3.connect(chunks_tmp)
+    try:
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute(
+            "CREATE TABLE chunks (row INTEGER PRIMARY KEY, id TEXT, parent_doc_id TEXT, chunk_order INTEGER, "
+            "text TEXT NOT NULL, meta_data TEXT NOT NULL, estimated_num_tokens INTEGER, has_vector INTEGER NOT NULL, "
+            "file_path TEXT)"
+        )
+        conn.execute("CREATE TABLE items (row INTEGER PRIMARY KEY, id TEXT, text TEXT NOT NULL, meta_data TEXT NOT NULL)")
+        conn.executemany(
+            "INSERT INTO meta (key, value) VALUES (?, ?)",
+            [
+                ("version", str(INDEX_STORE_VERSION)),
+                ("count", str(len(chunks))),
+                ("dimension", str(dimension)),
+                ("faiss_ntotal", str(faiss_ntotal)),
+                ("faiss_metric", metric),
+                ("faiss_index_type", index_type),
+                ("faiss_quantization", quantization),
+                ("build_id", build_id),
+            ],
+        )
+        conn.executemany(
+            "INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    row,
+                    chunk.id,
+                    None if chunk.parent_doc_id is None else str(chunk.parent_doc_id),
+                    chunk.order,
+                    chunk.text,
+                    _dumps_meta(chunk.meta_data),
+                    chunk.estimated_num_tokens,
+                    has_vector[row],
+                    (chunk.meta_data or {}).get("file_path"),
+                )
+                for row, chunk in enumerate(chunks)
+            ),
+        )
+        conn.executemany(
+            "INSERT INTO items VALUES (?, ?, ?, ?)",
+            ((row, item.id, item.text, _dumps_meta(item.meta_data)) for row, item in enumerate(db.items or [])),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+    # The chunk table is replaced last: a store is only complete once it names the matrix of its build.
+    # The build id goes before the index, so an interrupted save never pairs an index with the id of
+    # the chunk table it replaces.
+    if faiss_ntotal:
+        os.replace(faiss_build_tmp, paths["faiss_build"])
+        os.replace(faiss_tmp, paths["faiss"])
+    else:
+        for path in (paths["faiss"], paths["faiss_build"]):
+            if os.path.exists(path):
+                os.remove(path)
+    os.replace(vectors_tmp, paths["vectors"])
+    os.replace(chunks_tmp, paths["chunks"])
+    # Stores opened before the replace keep their memory-mapped matrix after it is unlinked
+    _remove_other_vectors(db_path, build_id)
+    logger.info(f"Saved index store with {len(chunks)} chunks (dimension {dimension}) to {paths['chunks']}")
+
+
+def _remove_other_vectors(db_path: str, build_id: str) -> None:
+    prefix = get_index_store_paths(db_path)["vectors"]
+    directory, name = os.path.split(prefix)
+    current = os.path.basename(get_index_store_paths(db_path, build_id)["vectors"])
+    for entry in os.listdir(directory or "."):
+        if entry.startswith(name) and entry.endswith(".npy") and entry != current and ".tmp" not in entry:
+            try:
+                os.remove(os.path.join(directory, entry))
+            except OSError as e:
+                logger.warning(f"Could not remove the vectors of a previous build {entry}: {e}")
+
+
+class IndexStore:
+    """
+    Read-only view of a columnar index.
+
+    Args:
+        db_path (str): The database path the store files are derived from.
+
+    Raises:
+        ValueError: If the store is from another format version or its files disagree.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.paths = get_index_store_paths(db_path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"file:{self.paths['chunks']}?mode=ro", uri=True, check_same_thread=False)
+
+        meta = dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+        if int(meta.get("version", 0)) != INDEX_STORE_VERSION:
+            self.close()
+            raise ValueError(f"Unsupported index store version {meta.get('version')} in {self.paths['chunks']}")
+        self.count = int(meta["count"])
+        self.dimension = int(meta["dimension"])
+        self.faiss_ntotal = int(meta.get("faiss_ntotal", 0))
+        self.faiss_metric = meta.get("faiss_metric")
+        self.faiss_index_type = meta.get("faiss_index_type", "flat")
+        self.faiss_quantization = meta.get("faiss_quantization", "none")
+        self.build_id = meta.get("build_id")
+
+        # The matrix of the build the chunk table was written by, whatever was saved since
+        self.paths = get_index_store_paths(db_path, self.build_id)
+        try:
+            self.vectors = np.load(self.paths["vectors"], mmap_mode="r")
+        except OSError:
+            self.close()
+            raise
+        if self.vectors.shape != (self.count, self.dimension):
+            self.close()
+            raise ValueError(
+                f"Index store {self.paths['vectors']} has shape {self.vectors.shape}, "
+                f"expected {(self.count, self.dimension)}"
+            )
+        self._has_vector = None
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def mtime(self) -> float:
+        """Return the modification time of the store, which changes whenever it is rewritten."""
+        return os.path.getmtime(self.paths["chunks"])
+
+    @property
+    def has_vector(self) -> np.ndarray:
+        """Boolean mask of the rows that hold a stored embedding."""
+        if self._has_vector is None:
+            with self._lock:
+                rows = self._conn.execute("SELECT has_vector FROM chunks ORDER BY row").fetchall()
+            self._has_vector = np.fromiter((flag for (flag,) in rows), dtype=bool, count=len(rows))
+        return self._has_vector
+
+    def load_faiss_index(self, metric: str = None):
+        """
+        Load the persisted FAISS index with memory mapping.
+
+        The index is only returned if it matches the store: written by the same build, one
+        entry per row holding an embedding, the store's dimension, the requested metric and the index type and
+        quantization the current ``ann_index`` settings select.
+
+        Returns:
+            faiss.Index or None: The index, or None if it is missing or stale.
+        """
+        metric = metric or get_retriever_metric()
+        if not os.path.exists(self.paths["faiss"]):
+            return None
+        try:
+            with open(self.paths["faiss_build"], "r", encoding="utf-8") as f:
+                faiss_build_id = f.read().strip()
+        except OSError:
+            faiss_build_id = None
+        if faiss_build_id != self.build_id:
+            logger.warning(
+                f"Ignoring FAISS index {self.paths['faiss']} of build {faiss_build_id}, "
+                f"the chunks are from build {self.build_id}"
+            )
+            return None
+        try:
+            index = faiss.read_index(self.paths["faiss"], _faiss_mmap_flags())
+        except Exception as e:
+            logger.warning(f"Could not read FAISS index {self.paths['faiss']}: {e}")
+            return None
+
+        expected_metric_type = faiss.METRIC_L2 if metric == "euclidean" else faiss.METRIC_INNER_PRODUCT
+        expected_ntotal = int(self.has_vector.sum())
+        expected_index_type = select_index_type(expected_ntotal)
+        expected_quantization = get_quantization()
+        if (index.ntotal != expected_ntotal or index.ntotal != self.faiss_ntotal or index.d != self.dimension
+                or index.metric_type != expected_metric_type or self.faiss_metric != metric
+                or faiss_index_type(index) != expected_index_type
+                or faiss_quantization(index) != expected_quantization):
+            logger.warning(
+                f"Ignoring stale FAISS index {self.paths['faiss']}: {faiss_index_type(index)} index "
+                f"({faiss_quantization(index)} codes) with {index.ntotal} vectors of dimension {index.d}, "
+                f"expected {expected_index_type} index ({expected_quantization} codes) with "
+                f"{expected_ntotal} of dimension {self.dimension} for metric '{metric}'"
+            )
+            return None
+        configure_index_search(index)
+        return index
+
+    def file_paths(self) -> List[Optional[str]]:
+        """Return the ``file_path`` metadata of every row, in row order."""
+        with self._lock:
+            rows = self._conn.execute("SELECT file_path FROM chunks ORDER BY row").fetchall()
+        return [file_path for (file_path,) in rows]
+
+    def _document(self, row, chunk_id, parent_doc_id, order, text, meta_data, estimated_num_tokens, has_vector):
+        return Document(
+            id=chunk_id,
+            text=text,
+            meta_data=json.loads(meta_data),
+            vector=self.vectors[row] if has_vector else [],
+            parent_doc_id=parent_doc_id,
+            order=order,
+            estimated_num_tokens=estimated_num_tokens,
+        )
+
+    def get_documents(self, rows: Sequence[int]) -> List[Document]:
+        """Build the documents of the given rows, in the given order."""
+        rows = [int(row) for row in rows]
+        found = {}
+        with self._lock:
+            for start in range(0, len(rows), _FETCH_SIZE):
+                batch = rows[start:start + _FETCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                query = f"SELECT {_CHUNK_COLUMNS} FROM chunks WHERE row IN ({placeholders})"
+                for record in self._conn.execute(query, batch):
+                    found[record[0]] = self._document(*record)
+        missing = [row for row in rows if row not in found]
+        if missing:
+            raise IndexError(f"Rows {missing[:5]} are not in the index store")
+        return [found[row] for row in rows]
+
+    def iter_documents(self) -> Iterator[Document]:
+        """Yield every stored chunk in row order."""
+        with self._lock:
+            records = self._conn.execute(f"SELECT {_CHUNK_COLUMNS} FROM chunks ORDER BY row").fetchall()
+        for record in records:
+            yield self._document(*record)
+
+    def documents(self) -> "StoredDocuments":
+        """Return a lazy, list-like view of the stored chunks."""
+        return StoredDocuments(self)
+
+    def to_local_db(self) -> LocalDB:
+        """Materialize the store as a ``LocalDB``, e.g. to update it in place."""
+        db = LocalDB()
+        with self._lock:
+            items = self._conn.execute("SELECT id, text, meta_data FROM items ORDER BY row").fetchall()
+        db.load([Document(id=item_id, text=text, meta_data=json.loads(meta_data)) for item_id, text, meta_data in items])
+        chunks = []
+        for doc in self.iter_documents():
+            if len(doc.vector):
+                doc.vector = doc.vector.tolist()
+            chunks.append(doc)
+        db.transformed_items[TRANSFORMED_KEY] = chunks
+        return db
+
+
+class StoredDocuments(SequenceABC):
+    """
+    List-like access to the chunks of an ``IndexStore``.
+
+    Documents are built from the chunk table when accessed; their vectors are rows of the
+    memory-mapped matrix.
+    """
+
+    def __init__(self, store: IndexStore, rows: Optional[np.ndarray] = None):
+        self.store = store
+        self._all_rows = rows is None
+        self.rows = np.arange(len(store)) if rows is None else np.asarray(rows, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return StoredDocuments(self.store, self.rows[index])
+        return self.store.get_documents([self.rows[index]])[0]
+
+    def __iter__(self) -> Iterator[Document]:
+        for start in range(0, len(self.rows), _FETCH_SIZE):
+            yield from self.store.get_documents(self.rows[start:start + _FETCH_SIZE])
+
+    def select(self, indices: Sequence[int]) -> "StoredDocuments":
+        """Return a lazy view of the documents at the given positions."""
+        return StoredDocuments(self.store, self.rows[np.asarray(indices, dtype=np.int64)])
+
+    def take(self, indices: Sequence[int]) -> List[Document]:
+        """Build the documents at the given positions with one lookup."""
+        return self.store.get_documents(self.rows[np.asarray(indices, dtype=np.int64)])
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """The embedding rows of these documents (a memory-mapped view when not subset)."""
+        if self._all_rows:
+            return self.store.vectors
+        return self.store.vectors[self.rows]
+
+    @property
+    def has_vector(self) -> np.ndarray:
+        return self.store.has_vector[self.rows]
+
+    @property
+    def file_paths(self) -> List[Optional[str]]:
+        """The ``file_path`` metadata of these documents, read without building them."""
+        file_paths = self.store.file_paths()
+        return [file_paths[row] for row in self.rows]
+
+
+def build_file_index(documents: Sequence[Document]) -> Dict[str, np.ndarray]:
+    """
+    Map each ``file_path`` to the positions of its chunks in ``documents``, in order.
+
+    ``StoredDocuments`` are mapped from the ``file_path`` column of the chunk table
+    without building the documents.
+    """
+    if isinstance(documents, StoredDocuments):
+        file_paths = documents.file_paths
+    else:
+        file_paths = [(doc.meta_data or {}).get("file_path") for doc in documents]
+    positions = {}
+    for position, file_path in enumerate(file_paths):
+        if file_path is not None:
+            positions.setdefault(file_path, []).append(position)
+    return {file_path: np.array(found, dtype=np.int64) for file_path, found in positions.items()}
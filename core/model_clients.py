@@ -0,0 +1,217 @@
+"""Process-wide registry of provider model clients.
+
+Constructing a model client opens a new HTTP connection pool, so a client built per
+request pays for a fresh TLS handshake on every call (and, for Bedrock with a role,
+an STS role assumption). Clients are instead created once per provider class,
+constructor arguments and credentials, and their connections are shared by every
+request of the process.
+
+Each request still gets its own model client: ``call`` and ``acall`` of the OpenAI,
+Azure and Dashscope clients store per-call state on the client (``_api_kwargs``, and
+``chat_completion_parser`` for streamed answers), so one client shared by concurrent
+requests could parse one request's answer with another's parser. ``get`` returns a
+shallow copy of the shared client, which has its own attributes but the same
+``sync_client``, ``async_client`` and sessions, and so the same connection pools.
+
+The credentials a client reads from the environment are part of its key, so changing
+them yields a new client. Clients are replaced once they are older than
+``max_age_seconds``, which keeps assumed-role credentials from expiring under a
+long-lived client. A replaced client is closed ``retired_grace_seconds`` later, once
+the requests that got it have finished; the remaining clients are closed on shutdown.
+"""
+
+import asyncio
+import copy
+import hashlib
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from core.config import configs
+
+logger = logging.getLogger(__name__)
+
+# The environment variables each client reads its endpoint and credentials from
+CREDENTIAL_ENV_VARS: Dict[str, Tuple[str, ...]] = {
+    "OpenAIClient": ("OPENAI_API_KEY", "OPENAI_BASE_URL"),
+    "OpenRouterClient": ("OPENROUTER_API_KEY",),
+    "AzureAIClient": ("AZURE_OPENAI_API_KEY", "AZURE_OPENAI_ENDPOINT", "AZURE_OPENAI_VERSION"),
+    "BedrockClient": ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_SESSION_TOKEN", "AWS_REGION", "AWS_ROLE_ARN"),
+    "DashscopeClient": ("DASHSCOPE_API_KEY", "DASHSCOPE_BASE_URL", "DASHSCOPE_WORKSPACE_ID"),
+    "GoogleEmbedderClient": ("GOOGLE_API_KEY",),
+    "OllamaClient": ("OLLAMA_HOST",),
+}
+
+
+def credentials_fingerprint(client_class: Type, init_kwargs: Dict[str, Any]) -> str:
+    """
+    Hash the constructor arguments of a client and the credentials it reads from the environment.
+
+    Variables named by ``env_*_name`` arguments (``env_api_key_name="..."``) are included.
+    """
+    env_vars = list(CREDENTIAL_ENV_VARS.get(client_class.__name__, ()))
+    env_vars += [value for name, value in init_kwargs.items()
+                 if name.startswith("env_") and name.endswith("_name") and isinstance(value, str)]
+    material = json.dumps(
+        {"kwargs": init_kwargs, "env": {name: os.getenv(name) for name in env_vars}},
+        sort_keys=True,
+        default=repr,
+    )
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+async def _close(obj: Any) -> None:
+    for name in ("aclose", "close"):
+        close = getattr(obj, name, None)
+        if callable(close):
+            result = close()
+            if inspect.isawaitable(result):
+                await result
+            return
+
+
+async def close_model_client(client: Any) -> None:
+    """Close the connections of a model client and of its sync and async API clients."""
+    # The model client itself only owns connections when it has an ``aclose`` (OpenRouterClient)
+    objects = [client] if hasattr(client, "aclose") else []
+    objects += [getattr(client, "sync_client", None), getattr(client, "async_client", None)]
+    closed = set()
+    for obj in objects:
+        # Bedrock uses its sync client for async calls too
+        if obj is None or id(obj) in closed:
+            continue
+        closed.add(id(obj))
+        try:
+            await _close(obj)
+        except Exception as e:
+            logger.warning(f"Error closing {type(client).__name__}: {e}")
+
+
+def _init_async_client(client: Any) -> None:
+    """Create the async API client up front, so that the copies handed out share it."""
+    init_async_client = getattr(client, "init_async_client", None)
+    if getattr(client, "async_client", False) is not None or not callable(init_async_client):
+        return
+    try:
+        client.async_client = init_async_client()
+    except Exception as e:
+        # Each copy then creates its own on its first async call
+        logger.warning(f"Could not create the async client of {type(client).__name__}: {e}")
+
+
+class ModelClientRegistry:
+    """
+    Share the connections of one client per provider class, constructor arguments and credentials.
+
+    Args:
+        max_age_seconds: Age after which a client is replaced by a new one; 0 keeps
+            clients for the life of the process.
+        retired_grace_seconds: Time a replaced client is left to the requests still
+            using it before it is closed.
+    """
+
+    def __init__(self, max_age_seconds: float = 0, retired_grace_seconds: float = 600):
+        self.max_age_seconds = max_age_seconds
+        self.retired_grace_seconds = retired_grace_seconds
+        self._clients: Dict[Tuple[str, str], Tuple[float, Any]] = {}
+        # (retired at, client) of replaced clients that requests may still be using
+        self._retired: List[Tuple[float, Any]] = []
+        self._closing = set()
+        self._lock = threading.Lock()
+
+    def get(self, client_class: Type, **init_kwargs) -> Any:
+        """
+        Return a client of a class and constructor arguments for one request.
+
+        The client is a copy of the shared one, created on first use: its per-call state is
+        its own, its connections are shared.
+        """
+        key = (f"{client_class.__module__}.{client_class.__qualname__}",
+               credentials_fingerprint(client_class, init_kwargs))
+        now = time.monotonic()
+        with self._lock:
+            self._close_retired(now)
+            entry = self._clients.get(key)
+            if entry is not None:
+                created_at, client = entry
+                if not self.max_age_seconds or now - created_at < self.max_age_seconds:
+                    return copy.copy(client)
+                logger.info(f"Replacing {client_class.__name__} created {self.max_age_seconds}s ago")
+                self._retired.append((now, client))
+                del self._clients[key]
+            client = client_class(**init_kwargs)
+            _init_async_client(client)
+            self._clients[key] = (now, client)
+        logger.info(f"Created shared {client_class.__name__}")
+        return copy.copy(client)
+
+    def _close_retired(self, now: float) -> None:
+        """Close the replaced clients whose grace period is over; called with the lock held."""
+        due = [client for retired_at, client in self._retired if now - retired_at >= self.retired_grace_seconds]
+        if not due:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Async clients are closed on the event loop; the next request on it does it
+            return
+        self._retired = [(retired_at, client) for retired_at, client in self._retired
+                         if now - retired_at < self.retired_grace_seconds]
+        for client in due:
+            task = loop.create_task(close_model_client(client))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    async def close(self) -> None:
+        """Close and forget every client."""
+        with self._lock:
+            clients = [client for _, client in self._clients.values()]
+            clients += [client for _, client in self._retired]
+            closing = list(self._closing)
+            self._clients = {}
+            self._retired = []
+        for client in clients:
+            await close_model_client(client)
+        if closing:
+            await asyncio.gather(*closing, return_exceptions=True)
+
+
+_registry: Optional[ModelClientRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_model_client_registry() -> ModelClientRegistry:
+    """
+    Return the process-wide registry.
+
+    Configured by ``model_clients`` in ``generator.json`` (``max_age_seconds``,
+    ``retired_grace_seconds``).
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                client_config = configs.get("model_clients", {})
+                _registry = ModelClientRegistry(
+                    float(client_config.get("max_age_seconds", 3000)),
+                    float(client_config.get("retired_grace_seconds", 600)),
+                )
+    return _registry
+
+
+def get_model_client(client_class: Type, **init_kwargs) -> Any:
+    """Return a client of a provider class for one request, see ``ModelClientRegistry.get``."""
+    return get_model_client_registry().get(client_class, **init_kwargs)
+
+
+async def close_model_clients() -> None:
+    """Close every shared client; called on application shutdown."""
+    if _registry is not None:
+        await _registry.close()
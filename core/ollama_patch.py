@@ -1,11 +1,13 @@
 from typing import Sequence, List
 from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 import logging
 import adalflow as adal
 from adalflow.core.types import Document
 from adalflow.core.component import DataComponent
 import requests
+import requests.adapters
 import os
 
 # Configure logging
@@ -59,47 +61,140 @@ def check_ollama_model_exists(model_name: str, ollama_host: str = None) -> bool:
         logger.warning(f"Error checking Ollama model availability: {e}")
         return False
 
+class _EmbedEndpointUnavailable(Exception):
+    """The Ollama server predates the batch ``/api/embed`` endpoint."""
+
+
+def _ollama_base_url(host: str = None) -> str:
+    """Normalize an Ollama host (``OLLAMA_HOST`` style) to a base URL without the ``/api`` suffix."""
+    host = (host or os.getenv("OLLAMA_HOST", "http://localhost:11434")).rstrip("/")
+    if host.endswith("/api"):
+        host = host[:-4]
+    if "://" not in host:
+        host = f"http://{host}"
+    return host
+
 class OllamaDocumentProcessor(DataComponent):
     """
-    Process documents for Ollama embeddings by processing one document at a time.
-    Adalflow Ollama Client does not support batch embedding, so we need to process each document individually.
+    Process documents for Ollama embeddings with a bounded pool of concurrent requests.
+
+    Requests go straight to the Ollama HTTP API over a persistent session. Documents are
+    sent in batches to ``/api/embed``; servers that predate it fall back to one
+    ``/api/embeddings`` request per document. When a batch fails, its documents are
+    retried one at a time so a failing chunk only drops itself.
     """
-    def __init__(self, embedder: adal.Embedder) -> None:
+    def __init__(self, embedder: adal.Embedder, max_workers: int = 4, batch_size: int = 32) -> None:
         super().__init__()
         self.embedder = embedder
+        self.max_workers = max(1, max_workers)
+        self.batch_size = max(1, batch_size)
+        self.model_kwargs = dict(getattr(embedder, "model_kwargs", None) or {})
+        self.base_url = _ollama_base_url(getattr(embedder.model_client, "_host", None))
+        self.supports_batch = None  # unknown until the first /api/embed request
+        self._session = None
+
+    def _get_session(self) -> requests.Session:
+        if self._session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._session = session
+        return self._session
+
+    def __getstate__(self):
+        # Sessions hold sockets and cannot be pickled (the processor is kept in the pickled LocalDB)
+        state = self.__dict__.copy()
+        state["_session"] = None
+        return state
+
+    def _embed_one(self, text: str) -> List[float]:
+        if self.supports_batch is not False:
+            try:
+                return self._embed_batch([text])[0]
+            except _EmbedEndpointUnavailable:
+                pass
+        response = self._get_session().post(
+            f"{self.base_url}/api/embeddings", json={**self.model_kwargs, "prompt": text}, timeout=300
+        )
+        response.raise_for_status()
+        return response.json()["embedding"]
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        response = self._get_session().post(
+            f"{self.base_url}/api/embed", json={**self.model_kwargs, "input": texts}, timeout=300
+        )
+        if response.status_code == 404 and self.supports_batch is None:
+            # Ollama also answers 404 for an unknown model, which the older endpoint would not fix
+            if "model" in response.text.lower():
+                raise OllamaModelNotFoundError(f"Ollama model not found: {response.text.strip()}")
+            logger.info("Ollama server does not support /api/embed, embedding documents one at a time")
+            self.supports_batch = False
+            raise _EmbedEndpointUnavailable("/api/embed is not available")
+        response.raise_for_status()
+        self.supports_batch = True
+        embeddings = response.json()["embeddings"]
+        if len(embeddings) != len(texts):
+            raise ValueError(f"Ollama returned {len(embeddings)} embeddings for {len(texts)} inputs")
+        return embeddings
+
+    def _process_batch(self, batch: List[Document]) -> List:
+        """Embed a batch of documents, returning an embedding or an exception per document."""
+        if self.supports_batch is not False and len(batch) > 1:
+            try:
+                return self._embed_batch([doc.text for doc in batch])
+            except Exception as e:
+                if self.supports_batch:
+                    logger.warning(f"Batch of {len(batch)} documents failed ({e}), retrying them individually")
+
+        results = []
+        for doc in batch:
+            try:
+                results.append(self._embed_one(doc.text))
+            except Exception as e:
+                results.append(e)
+        return results
 
     def __call__(self, documents: Sequence[Document]) -> Sequence[Document]:
         output = deepcopy(documents)
-        logger.info(f"Processing {len(output)} documents individually for Ollama embeddings")
+        logger.info(
+            f"Processing {len(output)} documents for Ollama embeddings "
+            f"({self.max_workers} workers, batches of {self.batch_size})"
+        )
+
+        batches = [output[start:start + self.batch_size] for start in range(0, len(output), self.batch_size)]
+        results = []
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ollama-embed") as executor:
+            for batch_results in tqdm(
+                executor.map(self._process_batch, batches),
+                total=len(batches),
+                desc="Processing documents for Ollama embeddings",
+            ):
+                results.extend(batch_results)
 
         successful_docs = []
         expected_embedding_size = None
 
-        for i, doc in enumerate(tqdm(output, desc="Processing documents for Ollama embeddings")):
-            try:
-                # Get embedding for a single document
-                result = self.embedder(input=doc.text)
-                if result.data and len(result.data) > 0:
-                    embedding = result.data[0].embedding
-
-                    # Validate embedding size consistency
-                    if expected_embedding_size is None:
-                        expected_embedding_size = len(embedding)
-                        logger.info(f"Expected embedding size set to: {expected_embedding_size}")
-                    elif len(embedding) != expected_embedding_size:
-                        file_path = getattr(doc, 'meta_data', {}).get('file_path', f'document_{i}')
-                        logger.warning(f"Document '{file_path}' has inconsistent embedding size {len(embedding)} != {expected_embedding_size}, skipping")
-                        continue
-
-                    # Assign the embedding to the document
-                    output[i].vector = embedding
-                    successful_docs.append(output[i])
-                else:
-                    file_path = getattr(doc, 'meta_data', {}).get('file_path', f'document_{i}')
-                    logger.warning(f"Failed to get embedding for document '{file_path}', skipping")
-            except Exception as e:
-                file_path = getattr(doc, 'meta_data', {}).get('file_path', f'document_{i}')
-                logger.error(f"Error processing document '{file_path}': {e}, skipping")
+        for i, (doc, embedding) in enumerate(zip(output, results)):
+            file_path = getattr(doc, 'meta_data', {}).get('file_path', f'document_{i}')
+            if isinstance(embedding, Exception):
+                logger.error(f"Error processing document '{file_path}': {embedding}, skipping")
+                continue
+            if not embedding:
+                logger.warning(f"Failed to get embedding for document '{file_path}', skipping")
+                continue
+
+            # Validate embedding size consistency
+            if expected_embedding_size is None:
+                expected_embedding_size = len(embedding)
+                logger.info(f"Expected embedding size set to: {expected_embedding_size}")
+            elif len(embedding) != expected_embedding_size:
+                logger.warning(f"Document '{file_path}' has inconsistent embedding size {len(embedding)} != {expected_embedding_size}, skipping")
+                continue
+
+            # Assign the embedding to the document
+            doc.vector = embedding
+            successful_docs.append(doc)
 
         logger.info(f"Successfully processed {len(successful_docs)}/{len(output)} documents with consistent embeddings")
-        return successful_docs
\ No newline at end of file
+        return successful_docs
@@ -14,6 +14,8 @@ from adalflow.core.types import (
     GeneratorOutput,
 )
 
+from core.http_sessions import LoopSession
+
 log = logging.getLogger(__name__)
 
 class OpenRouterClient(ModelClient):
@@ -41,6 +43,8 @@ class OpenRouterClient(ModelClient):
         super().__init__(*args, **kwargs)
         self.sync_client = self.init_sync_client()
         self.async_client = None  # Initialize async client only when needed
+        # Shared by the calls of this client, see _get_session
+        self._session = LoopSession(aiohttp.ClientSession)
 
     def init_sync_client(self):
         """Initialize the synchronous OpenRouter client."""
@@ -68,6 +72,14 @@ class OpenRouterClient(ModelClient):
             "base_url": "https://openrouter.ai/api/v1"
         }
 
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the HTTP session of the running event loop, creating it on first use."""
+        return self._session.get()
+
+    async def aclose(self) -> None:
+        """Close the HTTP session of the client."""
+        await self._session.close()
+
     def convert_inputs_to_api_kwargs(
         self, input: Any, model_kwargs: Dict = None, model_type: ModelType = None
     ) -> Dict:
@@ -144,190 +156,190 @@ class OpenRouterClient(ModelClient):
                 log.info(f"Request headers: {headers}")
                 log.info(f"Request body: {api_kwargs}")
 
-                async with aiohttp.ClientSession() as session:
-                    try:
-                        async with session.post(
-                            f"{self.async_client['base_url']}/chat/completions",
-                            headers=headers,
-                            json=api_kwargs,
-                            timeout=60
-                        ) as response:
-                            if response.status != 200:
-                                error_text = await response.text()
-                                log.error(f"OpenRouter API error ({response.status}): {error_text}")
-
-                                # Return a generator that yields the error message
-                                async def error_response_generator():
-                                    yield f"OpenRouter API error ({response.status}): {error_text}"
-                                return error_response_generator()
-
-                            # Get the full response
-                            data = await response.json()
-                            log.info(f"Received response from OpenRouter: {data}")
-
-                            # Create a generator that yields the content
-                            async def content_generator():
-                                if "choices" in data and len(data["choices"]) > 0:
-                                    choice = data["choices"][0]
-                                    if "message" in choice and "content" in choice["message"]:
-                                        content = choice["message"]["content"]
-                                        log.info("Successfully retrieved response")
-
-                                        # Check if the content is XML and ensure it's properly formatted
-                                        if content.strip().startswith("<") and ">" in content:
-                                            # It's likely XML, let's make sure it's properly formatted
-                                            try:
-                                                # Extract the XML content
-                                                xml_content = content
-
-                                                # Check if it's a wiki_structure XML
-                                                if "<wiki_structure>" in xml_content:
-                                                    log.info("Found wiki_structure XML, ensuring proper format")
-
-                                                    # Extract just the wiki_structure XML
-                                                    import re
-                                                    wiki_match = re.search(r'<wiki_structure>[\s\S]*?<\/wiki_structure>', xml_content)
-                                                    if wiki_match:
-                                                        # Get the raw XML
-                                                        raw_xml = wiki_match.group(0)
-
-                                                        # Clean the XML by removing any leading/trailing whitespace
-                                                        # and ensuring it's properly formatted
-                                                        clean_xml = raw_xml.strip()
-
-                                                        # Try to fix common XML issues
+                session = self._get_session()
+                try:
+                    async with session.post(
+                        f"{self.async_client['base_url']}/chat/completions",
+                        headers=headers,
+                        json=api_kwargs,
+                        timeout=60
+                    ) as response:
+                        if response.status != 200:
+                            error_text = await response.text()
+                            log.error(f"OpenRouter API error ({response.status}): {error_text}")
+
+                            # Return a generator that yields the error message
+                            async def error_response_generator():
+                                yield f"OpenRouter API error ({response.status}): {error_text}"
+                            return error_response_generator()
+
+                        # Get the full response
+                        data = await response.json()
+                        log.info(f"Received response from OpenRouter: {data}")
+
+                        # Create a generator that yields the content
+                        async def content_generator():
+                            if "choices" in data and len(data["choices"]) > 0:
+                                choice = data["choices"][0]
+                                if "message" in choice and "content" in choice["message"]:
+                                    content = choice["message"]["content"]
+                                    log.info("Successfully retrieved response")
+
+                                    # Check if the content is XML and ensure it's properly formatted
+                                    if content.strip().startswith("<") and ">" in content:
+                                        # It's likely XML, let's make sure it's properly formatted
+                                        try:
+                                            # Extract the XML content
+                                            xml_content = content
+
+                                            # Check if it's a wiki_structure XML
+                                            if "<wiki_structure>" in xml_content:
+                                                log.info("Found wiki_structure XML, ensuring proper format")
+
+                                                # Extract just the wiki_structure XML
+                                                import re
+                                                wiki_match = re.search(r'<wiki_structure>[\s\S]*?<\/wiki_structure>', xml_content)
+                                                if wiki_match:
+                                                    # Get the raw XML
+                                                    raw_xml = wiki_match.group(0)
+
+                                                    # Clean the XML by removing any leading/trailing whitespace
+                                                    # and ensuring it's properly formatted
+                                                    clean_xml = raw_xml.strip()
+
+                                                    # Try to fix common XML issues
+                                                    try:
+                                                        # Replace problematic characters in XML
+                                                        fixed_xml = clean_xml
+
+                                                        # Replace & with &amp; if not already part of an entity
+                                                        fixed_xml = re.sub(r'&(?!amp;|lt;|gt;|apos;|quot;)', '&amp;', fixed_xml)
+
+                                                        # Fix other common XML issues
+                                                        fixed_xml = fixed_xml.replace('</', '</').replace('  >', '>')
+
+                                                        # Try to parse the fixed XML
+                                                        from xml.dom.minidom import parseString
+                                                        dom = parseString(fixed_xml)
+
+                                                        # Get the pretty-printed XML with proper indentation
+                                                        pretty_xml = dom.toprettyxml()
+
+                                                        # Remove XML declaration
+                                                        if pretty_xml.startswith('<?xml'):
+                                                            pretty_xml = pretty_xml[pretty_xml.find('?>')+2:].strip()
+
+                                                        log.info(f"Extracted and validated XML: {pretty_xml[:100]}...")
+                                                        yield pretty_xml
+                                                    except Exception as xml_parse_error:
+                                                        log.warning(f"XML validation failed: {str(xml_parse_error)}, using raw XML")
+
+                                                        # If XML validation fails, try a more aggressive approach
                                                         try:
-                                                            # Replace problematic characters in XML
-                                                            fixed_xml = clean_xml
-
-                                                            # Replace & with &amp; if not already part of an entity
-                                                            fixed_xml = re.sub(r'&(?!amp;|lt;|gt;|apos;|quot;)', '&amp;', fixed_xml)
-
-                                                            # Fix other common XML issues
-                                                            fixed_xml = fixed_xml.replace('</', '</').replace('  >', '>')
-
-                                                            # Try to parse the fixed XML
-                                                            from xml.dom.minidom import parseString
-                                                            dom = parseString(fixed_xml)
-
-                                                            # Get the pretty-printed XML with proper indentation
-                                                            pretty_xml = dom.toprettyxml()
-
-                                                            # Remove XML declaration
-                                                            if pretty_xml.startswith('<?xml'):
-                                                                pretty_xml = pretty_xml[pretty_xml.find('?>')+2:].strip()
-
-                                                            log.info(f"Extracted and validated XML: {pretty_xml[:100]}...")
-                                                            yield pretty_xml
-                                                        except Exception as xml_parse_error:
-                                                            log.warning(f"XML validation failed: {str(xml_parse_error)}, using raw XML")
-
-                                                            # If XML validation fails, try a more aggressive approach
-                                                            try:
-                                                                # Use regex to extract just the structure without any problematic characters
-                                                                import re
-
-                                                                # Extract the basic structure
-                                                                structure_match = re.search(r'<wiki_structure>(.*?)</wiki_structure>', clean_xml, re.DOTALL)
-                                                                if structure_match:
-                                                                    structure = structure_match.group(1).strip()
-
-                                                                    # Rebuild a clean XML structure
-                                                                    clean_structure = "<wiki_structure>\n"
-
-                                                                    # Extract title
-                                                                    title_match = re.search(r'<title>(.*?)</title>', structure, re.DOTALL)
-                                                                    if title_match:
-                                                                        title = title_match.group(1).strip()
-                                                                        clean_structure += f"  <title>{title}</title>\n"
-
-                                                                    # Extract description
-                                                                    desc_match = re.search(r'<description>(.*?)</description>', structure, re.DOTALL)
-                                                                    if desc_match:
-                                                                        desc = desc_match.group(1).strip()
-                                                                        clean_structure += f"  <description>{desc}</description>\n"
-
-                                                                    # Add pages section
-                                                                    clean_structure += "  <pages>\n"
-
-                                                                    # Extract pages
-                                                                    pages = re.findall(r'<page id="(.*?)">(.*?)</page>', structure, re.DOTALL)
-                                                                    for page_id, page_content in pages:
-                                                                        clean_structure += f'    <page id="{page_id}">\n'
-
-                                                                        # Extract page title
-                                                                        page_title_match = re.search(r'<title>(.*?)</title>', page_content, re.DOTALL)
-                                                                        if page_title_match:
-                                                                            page_title = page_title_match.group(1).strip()
-                                                                            clean_structure += f"      <title>{page_title}</title>\n"
-
-                                                                        # Extract page description
-                                                                        page_desc_match = re.search(r'<description>(.*?)</description>', page_content, re.DOTALL)
-                                                                        if page_desc_match:
-                                                                            page_desc = page_desc_match.group(1).strip()
-                                                                            clean_structure += f"      <description>{page_desc}</description>\n"
-
-                                                                        # Extract importance
-                                                                        importance_match = re.search(r'<importance>(.*?)</importance>', page_content, re.DOTALL)
-                                                                        if importance_match:
-                                                                            importance = importance_match.group(1).strip()
-                                                                            clean_structure += f"      <importance>{importance}</importance>\n"
-
-                                                                        # Extract relevant files
-                                                                        clean_structure += "      <relevant_files>\n"
-                                                                        file_paths = re.findall(r'<file_path>(.*?)</file_path>', page_content, re.DOTALL)
-                                                                        for file_path in file_paths:
-                                                                            clean_structure += f"        <file_path>{file_path.strip()}</file_path>\n"
-                                                                        clean_structure += "      </relevant_files>\n"
-
-                                                                        # Extract related pages
-                                                                        clean_structure += "      <related_pages>\n"
-                                                                        related_pages = re.findall(r'<related>(.*?)</related>', page_content, re.DOTALL)
-                                                                        for related in related_pages:
-                                                                            clean_structure += f"        <related>{related.strip()}</related>\n"
-                                                                        clean_structure += "      </related_pages>\n"
-
-                                                                        clean_structure += "    </page>\n"
-
-                                                                    clean_structure += "  </pages>\n</wiki_structure>"
-
-                                                                    log.info("Successfully rebuilt clean XML structure")
-                                                                    yield clean_structure
-                                                                else:
-                                                                    log.warning("Could not extract wiki structure, using raw XML")
-                                                                    yield clean_xml
-                                                            except Exception as rebuild_error:
-                                                                log.warning(f"Failed to rebuild XML: {str(rebuild_error)}, using raw XML")
+                                                            # Use regex to extract just the structure without any problematic characters
+                                                            import re
+
+                                                            # Extract the basic structure
+                                                            structure_match = re.search(r'<wiki_structure>(.*?)</wiki_structure>', clean_xml, re.DOTALL)
+                                                            if structure_match:
+                                                                structure = structure_match.group(1).strip()
+
+                                                                # Rebuild a clean XML structure
+                                                                clean_structure = "<wiki_structure>\n"
+
+                                                                # Extract title
+                                                                title_match = re.search(r'<title>(.*?)</title>', structure, re.DOTALL)
+                                                                if title_match:
+                                                                    title = title_match.group(1).strip()
+                                                                    clean_structure += f"  <title>{title}</title>\n"
+
+                                                                # Extract description
+                                                                desc_match = re.search(r'<description>(.*?)</description>', structure, re.DOTALL)
+                                                                if desc_match:
+                                                                    desc = desc_match.group(1).strip()
+                                                                    clean_structure += f"  <description>{desc}</description>\n"
+
+                                                                # Add pages section
+                                                                clean_structure += "  <pages>\n"
+
+                                                                # Extract pages
+                                                                pages = re.findall(r'<page id="(.*?)">(.*?)</page>', structure, re.DOTALL)
+                                                                for page_id, page_content in pages:
+                                                                    clean_structure += f'    <page id="{page_id}">\n'
+
+                                                                    # Extract page title
+                                                                    page_title_match = re.search(r'<title>(.*?)</title>', page_content, re.DOTALL)
+                                                                    if page_title_match:
+                                                                        page_title = page_title_match.group(1).strip()
+                                                                        clean_structure += f"      <title>{page_title}</title>\n"
+
+                                                                    # Extract page description
+                                                                    page_desc_match = re.search(r'<description>(.*?)</description>', page_content, re.DOTALL)
+                                                                    if page_desc_match:
+                                                                        page_desc = page_desc_match.group(1).strip()
+                                                                        clean_structure += f"      <description>{page_desc}</description>\n"
+
+                                                                    # Extract importance
+                                                                    importance_match = re.search(r'<importance>(.*?)</importance>', page_content, re.DOTALL)
+                                                                    if importance_match:
+                                                                        importance = importance_match.group(1).strip()
+                                                                        clean_structure += f"      <importance>{importance}</importance>\n"
+
+                                                                    # Extract relevant files
+                                                                    clean_structure += "      <relevant_files>\n"
+                                                                    file_paths = re.findall(r'<file_path>(.*?)</file_path>', page_content, re.DOTALL)
+                                                                    for file_path in file_paths:
+                                                                        clean_structure += f"        <file_path>{file_path.strip()}</file_path>\n"
+                                                                    clean_structure += "      </relevant_files>\n"
+
+                                                                    # Extract related pages
+                                                                    clean_structure += "      <related_pages>\n"
+                                                                    related_pages = re.findall(r'<related>(.*?)</related>', page_content, re.DOTALL)
+                                                                    for related in related_pages:
+                                                                        clean_structure += f"        <related>{related.strip()}</related>\n"
+                                                                    clean_structure += "      </related_pages>\n"
+
+                                                                    clean_structure += "    </page>\n"
+
+                                                                clean_structure += "  </pages>\n</wiki_structure>"
+
+                                                                log.info("Successfully rebuilt clean XML structure")
+                                                                yield clean_structure
+                                                            else:
+                                                                log.warning("Could not extract wiki structure, using raw XML")
                                                                 yield clean_xml
-                                                    else:
-                                                        # If we can't extract it, just yield the original content
-                                                        log.warning("Could not extract wiki_structure XML, yielding original content")
-                                                        yield xml_content
+                                                        except Exception as rebuild_error:
+                                                            log.warning(f"Failed to rebuild XML: {str(rebuild_error)}, using raw XML")
+                                                            yield clean_xml
                                                 else:
-                                                    # For other XML content, just yield it as is
-                                                    yield content
-                                            except Exception as xml_error:
-                                                log.error(f"Error processing XML content: {str(xml_error)}")
+                                                    # If we can't extract it, just yield the original content
+                                                    log.warning("Could not extract wiki_structure XML, yielding original content")
+                                                    yield xml_content
+                                            else:
+                                                # For other XML content, just yield it as is
                                                 yield content
-                                        else:
-                                            # Not XML, just yield the content
+                                        except Exception as xml_error:
+                                            log.error(f"Error processing XML content: {str(xml_error)}")
                                             yield content
                                     else:
-                                        log.error(f"Unexpected response format: {data}")
-                                        yield "Error: Unexpected response format from OpenRouter API"
+                                        # Not XML, just yield the content
+                                        yield content
                                 else:
-                                    log.error(f"No choices in response: {data}")
-                                    yield "Error: No response content from OpenRouter API"
-
-                            return content_generator()
-                    except aiohttp.ClientError as e:
-                        e_client = e
-                        log.error(f"Connection error with OpenRouter API: {str(e_client)}")
-
-                        # Return a generator that yields the error message
-                        async def connection_error_generator():
-                            yield f"Connection error with OpenRouter API: {str(e_client)}. Please check your internet connection and that the OpenRouter API is accessible."
-                        return connection_error_generator()
+                                    log.error(f"Unexpected response format: {data}")
+                                    yield "Error: Unexpected response format from OpenRouter API"
+                            else:
+                                log.error(f"No choices in response: {data}")
+                                yield "Error: No response content from OpenRouter API"
+
+                        return content_generator()
+                except aiohttp.ClientError as e:
+                    e_client = e
+                    log.error(f"Connection error with OpenRouter API: {str(e_client)}")
+
+                    # Return a generator that yields the error message
+                    async def connection_error_generator():
+                        yield f"Connection error with OpenRouter API: {str(e_client)}. Please check your internet connection and that the OpenRouter API is accessible."
+                    return connection_error_generator()
 
             except RequestException as e:
                 e_req = e
@@ -0,0 +1,158 @@
+"""In-memory cache of query embeddings.
+
+Users re-ask questions, and deep-research "continue" turns search the original topic
+again, so the same query text reaches the embedder many times. Query vectors are kept
+per embedder model and normalized query text for a limited time, so a repeated query
+goes straight to retrieval without a provider round trip.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple, Union
+
+from adalflow.core.types import EmbedderOutput, Embedding
+
+from core.config import configs
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Return the cache form of a query: trimmed, with runs of whitespace collapsed.
+
+    Case is kept, since embedding models tell "Config" and "config" apart.
+    """
+    return _WHITESPACE.sub(" ", query).strip()
+
+
+class QueryEmbeddingCache:
+    """
+    Thread-safe LRU cache of query vectors whose entries expire after ``ttl_seconds``.
+
+    Holds at most ``max_entries`` vectors; the least recently used one is evicted first.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[List[float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, vector: Sequence[float]) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, list(vector))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and the current number of entries."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+            }
+
+
+_cache: Optional[QueryEmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_query_embedding_cache() -> Optional[QueryEmbeddingCache]:
+    """
+    Return the process-wide query embedding cache, or None if it is disabled in the configuration.
+
+    Configured by ``query_embedding_cache`` in ``embedder.json`` (``enabled``,
+    ``max_entries``, ``ttl_seconds``).
+    """
+    global _cache
+    cache_config = configs.get("query_embedding_cache", {})
+    if not cache_config.get("enabled", True):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = QueryEmbeddingCache(
+                    int(cache_config.get("max_entries", 10000)), float(cache_config.get("ttl_seconds", 3600))
+                )
+    return _cache
+
+
+class CachedQueryEmbedder:
+    """
+    Put the query embedding cache in front of an ``adal.Embedder``.
+
+    Called like the embedder, with one query or a list of queries. Only the queries
+    missing from the cache are sent, in one call; failed embeddings are returned as is
+    and not cached.
+    """
+
+    def __init__(self, embedder, cache: QueryEmbeddingCache, namespace: str) -> None:
+        self.embedder = embedder
+        self.cache = cache
+        self.namespace = namespace
+
+    def __call__(self, input: Union[str, Sequence[str]], model_kwargs: Optional[Dict] = None) -> EmbedderOutput:
+        queries = [input] if isinstance(input, str) else list(input)
+        keys = [(self.namespace, normalize_query(query)) for query in queries]
+        vectors = {}
+        for key in keys:
+            if key not in vectors:
+                vector = self.cache.get(key)
+                if vector is not None:
+                    vectors[key] = vector
+
+        # Embed the normalized text of each uncached query once, so every spelling
+        # that maps to an entry gets the same vector
+        to_embed = {key: key[1] for key in keys if key not in vectors}
+        model = None
+        if to_embed:
+            texts = list(to_embed.values())
+            output = self.embedder(input=texts[0] if isinstance(input, str) else texts, model_kwargs=model_kwargs or {})
+            if output.error or len(output.data) != len(texts):
+                return output
+            model = output.model
+            for key, embedding in zip(to_embed, output.data):
+                vectors[key] = embedding.embedding
+                self.cache.put(key, embedding.embedding)
+        logger.info(f"Query embedding cache: {len(queries) - len(to_embed)} cached, {len(to_embed)} to embed")
+
+        return EmbedderOutput(
+            data=[Embedding(embedding=vectors[key], index=i) for i, key in enumerate(keys)],
+            model=model,
+            input=queries,
+        )
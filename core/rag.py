@@ -1,4 +1,5 @@
 import logging
+import os
 import weakref
 import re
 from dataclasses import dataclass
@@ -6,6 +7,7 @@ from typing import Any, List, Tuple, Dict
 from uuid import uuid4
 
 import adalflow as adal
+import numpy as np
 
 from core.tools.embedder import get_embedder
 from core.prompts import RAG_SYSTEM_PROMPT as system_prompt, RAG_TEMPLATE
@@ -39,8 +41,22 @@ class CustomConversation:
 
 # Import other adalflow components
 from adalflow.components.retriever.faiss_retriever import FAISSRetriever
+from adalflow.core.types import RetrieverOutput
+from core.chunk_filter import ChunkFilter, FilteredIndex
 from core.config import configs
-from core.data_pipeline import DatabaseManager
+from core.data_pipeline import DatabaseManager, resolve_file_filters
+from core.model_clients import get_model_client
+from core.index_store import (
+    StoredDocuments,
+    build_faiss_index,
+    faiss_index_type,
+    faiss_quantization,
+    get_retriever_metric,
+    with_rescoring,
+)
+from core.embedding_cache import embedding_namespace
+from core.query_embedding_cache import CachedQueryEmbedder, get_query_embedding_cache
+from core.retriever_cache import PreparedIndex, get_retriever_cache, retriever_cache_key
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -48,6 +64,18 @@ logger = logging.getLogger(__name__)
 # Maximum token limit for embedding models
 MAX_INPUT_TOKENS = 7500  # Safe threshold below 8192 token limit
 
+def _embedding_size(doc) -> int:
+    """Return the length of a document's embedding, or 0 if it has no usable one-dimensional vector."""
+    vector = getattr(doc, 'vector', None)
+    if vector is None:
+        return 0
+    try:
+        if hasattr(vector, 'shape'):
+            return int(vector.shape[0]) if len(vector.shape) == 1 else 0
+        return len(vector)
+    except Exception:
+        return 0
+
 class Memory(adal.core.component.DataComponent):
     """Simple conversation management with a list of dialog turns."""
 
@@ -150,6 +178,17 @@ class RAGAnswer(adal.DataClass):
 
     __output_fields__ = ["rationale", "answer"]
 
+
+@dataclass
+class BatchRetrieval:
+    """The chunks retrieved for several queries searched together."""
+
+    # One RetrieverOutput per query, in the order of the queries
+    results: List[RetrieverOutput]
+    # The union of the retrieved chunks, each once, best score first
+    documents: List = field(default_factory=list)
+    doc_scores: List[float] = field(default_factory=list)
+
 class RAG(adal.Component):
     """RAG with one repo.
     If you want to load a new repos, call prepare_retriever(repo_url_or_path) first."""
@@ -189,6 +228,12 @@ class RAG(adal.Component):
         # Initialize components
         self.memory = Memory()
         self.embedder = get_embedder(embedder_type=self.embedder_type)
+        # Queries go through the process-wide query embedding cache; repeated ones skip the provider
+        query_cache = get_query_embedding_cache()
+        self.cached_embedder = (
+            CachedQueryEmbedder(self.embedder, query_cache, embedding_namespace(self.embedder))
+            if query_cache is not None else self.embedder
+        )
 
         self_weakref = weakref.ref(self)
         # Patch: ensure query embedding is always single string for Ollama
@@ -200,10 +245,10 @@ class RAG(adal.Component):
                 query = query[0]
             instance = self_weakref()
             assert instance is not None, "RAG instance is no longer available, but the query embedder was called."
-            return instance.embedder(input=query)
+            return instance.cached_embedder(input=query)
 
         # Use single string embedder for Ollama, regular embedder for others
-        self.query_embedder = single_string_embedder if self.is_ollama_embedder else self.embedder
+        self.query_embedder = single_string_embedder if self.is_ollama_embedder else self.cached_embedder
 
         self.initialize_db_manager()
 
@@ -237,7 +282,7 @@ IMPORTANT FORMATTING RULES:
                 "system_prompt": system_prompt,
                 "contexts": None,
             },
-            model_client=generator_config["model_client"](),
+            model_client=get_model_client(generator_config["model_client"]),
             model_kwargs=generator_config["model_kwargs"],
             output_processors=data_parser,
         )
@@ -247,104 +292,118 @@ IMPORTANT FORMATTING RULES:
         """Initialize the database manager with local storage"""
         self.db_manager = DatabaseManager()
         self.transformed_docs = []
+        self.embedding_matrix = None
+        self.file_index = {}
+        # The chunks kept by the request's file filters; None keeps every chunk
+        self.chunk_mask = None
 
     def _validate_and_filter_embeddings(self, documents: List) -> List:
         """
         Validate embeddings and filter out documents with invalid or mismatched embedding sizes.
 
+        The vectors are stacked into one float32 matrix; rows whose size differs from the
+        most common one or that contain NaN/inf values are dropped. The matrix of the
+        kept rows is stored in ``self.embedding_matrix`` for the retriever.
+
         Args:
             documents: List of documents with embeddings
 
         Returns:
             List of documents with valid embeddings of consistent size
         """
+        self.embedding_matrix = None
         if not documents:
             logger.warning("No documents provided for embedding validation")
             return []
 
-        valid_documents = []
-        embedding_sizes = {}
-
-        # First pass: collect all embedding sizes and count occurrences
-        for i, doc in enumerate(documents):
-            if not hasattr(doc, 'vector') or doc.vector is None:
-                logger.warning(f"Document {i} has no embedding vector, skipping")
-                continue
-
-            try:
-                if isinstance(doc.vector, list):
-                    embedding_size = len(doc.vector)
-                elif hasattr(doc.vector, 'shape'):
-                    embedding_size = doc.vector.shape[0] if len(doc.vector.shape) == 1 else doc.vector.shape[-1]
-                elif hasattr(doc.vector, '__len__'):
-                    embedding_size = len(doc.vector)
-                else:
-                    logger.warning(f"Document {i} has invalid embedding vector type: {type(doc.vector)}, skipping")
-                    continue
-
-                if embedding_size == 0:
-                    logger.warning(f"Document {i} has empty embedding vector, skipping")
-                    continue
-
-                embedding_sizes[embedding_size] = embedding_sizes.get(embedding_size, 0) + 1
-
-            except Exception as e:
-                logger.warning(f"Error checking embedding size for document {i}: {str(e)}, skipping")
-                continue
+        if isinstance(documents, StoredDocuments):
+            # Stored vectors already share one dimension; missing ones are flagged
+            sizes = np.where(documents.has_vector, documents.store.dimension, 0)
+        else:
+            sizes = np.fromiter((_embedding_size(doc) for doc in documents), dtype=np.int64, count=len(documents))
 
-        if not embedding_sizes:
+        counts = np.bincount(sizes)
+        counts[0] = 0
+        if not counts.any():
             logger.error("No valid embeddings found in any documents")
             return []
 
-        # Find the most common embedding size (this should be the correct one)
-        target_size = max(embedding_sizes.keys(), key=lambda k: embedding_sizes[k])
-        logger.info(f"Target embedding size: {target_size} (found in {embedding_sizes[target_size]} documents)")
-
-        # Log all embedding sizes found
-        for size, count in embedding_sizes.items():
+        # The most common embedding size should be the correct one
+        target_size = int(counts.argmax())
+        logger.info(f"Target embedding size: {target_size} (found in {counts[target_size]} documents)")
+        for size in np.flatnonzero(counts):
             if size != target_size:
-                logger.warning(f"Found {count} documents with incorrect embedding size {size}, will be filtered out")
-
-        # Second pass: filter documents with the target embedding size
-        for i, doc in enumerate(documents):
-            if not hasattr(doc, 'vector') or doc.vector is None:
-                continue
-
-            try:
-                if isinstance(doc.vector, list):
-                    embedding_size = len(doc.vector)
-                elif hasattr(doc.vector, 'shape'):
-                    embedding_size = doc.vector.shape[0] if len(doc.vector.shape) == 1 else doc.vector.shape[-1]
-                elif hasattr(doc.vector, '__len__'):
-                    embedding_size = len(doc.vector)
-                else:
-                    continue
-
-                if embedding_size == target_size:
-                    valid_documents.append(doc)
-                else:
-                    # Log which document is being filtered out
-                    file_path = getattr(doc, 'meta_data', {}).get('file_path', f'document_{i}')
-                    logger.warning(f"Filtering out document '{file_path}' due to embedding size mismatch: {embedding_size} != {target_size}")
-
-            except Exception as e:
-                file_path = getattr(doc, 'meta_data', {}).get('file_path', f'document_{i}')
-                logger.warning(f"Error validating embedding for document '{file_path}': {str(e)}, skipping")
-                continue
+                logger.warning(f"Found {counts[size]} documents with incorrect embedding size {size}, will be filtered out")
+        empty = int((sizes == 0).sum())
+        if empty:
+            logger.warning(f"Found {empty} documents without a usable embedding vector, will be filtered out")
+
+        rows = np.flatnonzero(sizes == target_size)
+        if isinstance(documents, StoredDocuments):
+            vectors = documents.vectors
+            matrix = vectors if len(rows) == len(documents) else vectors[rows]
+        else:
+            matrix = np.array([documents[i].vector for i in rows], dtype=np.float32)
+
+        finite = np.isfinite(matrix).all(axis=1)
+        if not finite.all():
+            for i in rows[~finite]:
+                file_path = (documents[int(i)].meta_data or {}).get('file_path', f'document_{i}')
+                logger.warning(f"Filtering out document '{file_path}' due to NaN or infinite embedding values")
+            rows = rows[finite]
+            matrix = matrix[finite]
+
+        if isinstance(documents, StoredDocuments):
+            valid_documents = documents if len(rows) == len(documents) else documents.select(rows)
+        else:
+            valid_documents = [documents[i] for i in rows]
 
         logger.info(f"Embedding validation complete: {len(valid_documents)}/{len(documents)} documents have valid embeddings")
 
         if len(valid_documents) == 0:
             logger.error("No documents with valid embeddings remain after filtering")
-        elif len(valid_documents) < len(documents):
+            return []
+        if len(valid_documents) < len(documents):
             filtered_count = len(documents) - len(valid_documents)
             logger.warning(f"Filtered out {filtered_count} documents due to embedding issues")
 
+        self.embedding_matrix = matrix
         return valid_documents
 
+    def _load_persisted_index(self, store):
+        """
+        Load the FAISS index saved with the index store, if it is still valid.
+
+        Returns:
+            PreparedIndex or None: The index with the documents of its rows, or None if there is no
+            usable persisted index.
+        """
+        index = store.load_faiss_index()
+        if index is None:
+            return None
+        rows = np.flatnonzero(store.has_vector)
+        index = with_rescoring(index, store.vectors, rows=rows)
+        documents = store.documents().select(rows)
+        logger.info(f"Loaded persisted FAISS index with {index.ntotal} vectors of dimension {index.d}")
+        return PreparedIndex.from_index(index, documents, store.dimension)
+
+    def _use_prepared_index(self, prepared: PreparedIndex, chunk_filter: ChunkFilter, retrieve_embedder) -> None:
+        """Create the retriever over a prepared index, restricted to the chunks kept by ``chunk_filter``."""
+        self.transformed_docs = prepared.documents
+        self.file_index = prepared.file_index
+        self.retriever = FAISSRetriever(**configs["retriever"], embedder=retrieve_embedder)
+        prepared.attach(self.retriever)
+        mask = self.chunk_mask = prepared.filter_mask(chunk_filter)
+        if mask is not None:
+            self.retriever.index = FilteredIndex(prepared.index, mask)
+            logger.info(f"Searching {int(mask.sum())} of {len(mask)} chunks selected by the file filters")
+            if not mask.any():
+                logger.warning("The file filters exclude every chunk of the repository")
+
     def prepare_retriever(self, repo_url_or_path: str, type: str = "github", access_token: str = None,
                       excluded_dirs: List[str] = None, excluded_files: List[str] = None,
-                      included_dirs: List[str] = None, included_files: List[str] = None):
+                      included_dirs: List[str] = None, included_files: List[str] = None,
+                      refresh: bool = False):
         """
         Prepare the retriever for a repository.
         Will load database from local storage if available.
@@ -352,25 +411,49 @@ IMPORTANT FORMATTING RULES:
         Args:
             repo_url_or_path: URL or local path to the repository
             access_token: Optional access token for private repositories
-            excluded_dirs: Optional list of directories to exclude from processing
-            excluded_files: Optional list of file patterns to exclude from processing
-            included_dirs: Optional list of directories to include exclusively
-            included_files: Optional list of file patterns to include exclusively
+            excluded_dirs: Optional list of directories to exclude from retrieval
+            excluded_files: Optional list of file patterns to exclude from retrieval
+            included_dirs: Optional list of directories to retrieve from exclusively
+            included_files: Optional list of file patterns to retrieve from exclusively
+            refresh: Fetch the latest commit and re-index only the files that changed
+
+        The repository has one index whatever the filters; they select the chunks searched.
         """
         self.initialize_db_manager()
         self.repo_url_or_path = repo_url_or_path
+        file_filters = None
+        if any([excluded_dirs, excluded_files, included_dirs, included_files]):
+            file_filters = resolve_file_filters(excluded_dirs, excluded_files, included_dirs, included_files)
         self.transformed_docs = self.db_manager.prepare_database(
             repo_url_or_path,
             type,
             access_token,
             embedder_type=self.embedder_type,
-            excluded_dirs=excluded_dirs,
-            excluded_files=excluded_files,
-            included_dirs=included_dirs,
-            included_files=included_files
+            refresh=refresh,
+            file_filters=file_filters,
         )
         logger.info(f"Loaded {len(self.transformed_docs)} documents for retrieval")
 
+        # Reuse the index prepared by an earlier request for the same database build,
+        # or the FAISS index persisted with the database
+        retrieve_embedder = self.query_embedder
+        chunk_filter = ChunkFilter.from_lists(excluded_dirs, excluded_files, included_dirs, included_files)
+        retriever_cache = get_retriever_cache()
+        cache_key = None
+        prepared = None
+        store = self.db_manager.store
+        if retriever_cache is not None and store is not None:
+            cache_key = retriever_cache_key(repo_url_or_path, type, self.embedder_type, store.mtime())
+            prepared = retriever_cache.get(cache_key)
+        if prepared is None and store is not None:
+            prepared = self._load_persisted_index(store)
+            if prepared is not None and cache_key is not None:
+                retriever_cache.put(cache_key, prepared)
+        if prepared is not None:
+            self._use_prepared_index(prepared, chunk_filter, retrieve_embedder)
+            logger.info(f"Using prepared FAISS index with {len(self.transformed_docs)} documents for retrieval")
+            return
+
         # Validate and filter embeddings to ensure consistent sizes
         self.transformed_docs = self._validate_and_filter_embeddings(self.transformed_docs)
 
@@ -380,57 +463,162 @@ IMPORTANT FORMATTING RULES:
         logger.info(f"Using {len(self.transformed_docs)} documents with valid embeddings for retrieval")
 
         try:
-            # Use the appropriate embedder for retrieval
-            retrieve_embedder = self.query_embedder if self.is_ollama_embedder else self.embedder
-            self.retriever = FAISSRetriever(
-                **configs["retriever"],
-                embedder=retrieve_embedder,
-                documents=self.transformed_docs,
-                document_map_func=lambda doc: doc.vector,
+            # Index the validated matrix directly, with the index type selected for the corpus size
+            index = build_faiss_index(self.embedding_matrix, get_retriever_metric())
+            index = with_rescoring(index, self.embedding_matrix)
+            prepared = PreparedIndex.from_index(index, self.transformed_docs, index.d, resident=True)
+            self._use_prepared_index(prepared, chunk_filter, retrieve_embedder)
+            logger.info(
+                f"FAISS retriever created successfully "
+                f"({faiss_index_type(index)} index, {faiss_quantization(index)} quantization)"
             )
-            logger.info("FAISS retriever created successfully")
+            if cache_key is not None:
+                retriever_cache.put(cache_key, prepared)
         except Exception as e:
             logger.error(f"Error creating FAISS retriever: {str(e)}")
-            # Try to provide more specific error information
-            if "All embeddings should be of the same size" in str(e):
-                logger.error("Embedding size validation failed. This suggests there are still inconsistent embedding sizes.")
-                # Log embedding sizes for debugging
-                sizes = []
-                for i, doc in enumerate(self.transformed_docs[:10]):  # Check first 10 docs
-                    if hasattr(doc, 'vector') and doc.vector is not None:
-                        try:
-                            if isinstance(doc.vector, list):
-                                size = len(doc.vector)
-                            elif hasattr(doc.vector, 'shape'):
-                                size = doc.vector.shape[0] if len(doc.vector.shape) == 1 else doc.vector.shape[-1]
-                            elif hasattr(doc.vector, '__len__'):
-                                size = len(doc.vector)
-                            else:
-                                size = "unknown"
-                            sizes.append(f"doc_{i}: {size}")
-                        except Exception:
-                            sizes.append(f"doc_{i}: error")
-                logger.error(f"Sample embedding sizes: {', '.join(sizes)}")
             raise
 
-    def call(self, query: str, language: str = "en") -> Tuple[List]:
+    def _documents_at(self, doc_indices: List[int]) -> List:
+        if isinstance(self.transformed_docs, StoredDocuments):
+            return self.transformed_docs.take(doc_indices)
+        return [self.transformed_docs[doc_index] for doc_index in doc_indices]
+
+    def _retrieve_for_file(self, query: str, file_path: str):
+        """
+        Retrieve the chunks of one file from the file path index.
+
+        The file's own chunks take the first ``top_k`` slots in order. The query is only
+        embedded and searched when the file has fewer chunks than that, to fill the rest.
+        Chunks excluded by the request's file filters are neither returned nor searched.
+
+        Returns:
+            List[RetrieverOutput] or None: None if the file has no indexed chunks the
+            filters keep.
+        """
+        positions = self.file_index.get(os.path.normpath(file_path.strip().lstrip("/")))
+        if positions is not None and self.chunk_mask is not None:
+            positions = positions[self.chunk_mask[positions]]
+        if positions is None or not len(positions):
+            return None
+        top_k = self.retriever.top_k
+        doc_indices = positions[:top_k].tolist()
+        doc_scores = [1.0] * len(doc_indices)
+
+        if len(doc_indices) < top_k:
+            selected = set(doc_indices)
+            found = self._search([query], top_k + len(doc_indices))[0]
+            for doc_index, score in found:
+                if len(doc_indices) == top_k:
+                    break
+                if doc_index not in selected:
+                    doc_indices.append(doc_index)
+                    doc_scores.append(score)
+        else:
+            logger.info(f"Retrieved {top_k} chunks of {file_path} from the file index without a vector search")
+
+        return [RetrieverOutput(
+            doc_indices=doc_indices, doc_scores=doc_scores, query=query, documents=self._documents_at(doc_indices)
+        )]
+
+    def _search(self, queries: List[str], top_k: int) -> List[List[Tuple[int, float]]]:
+        """
+        Embed queries in one request and search them through the retriever's index.
+
+        The index is the ``FilteredIndex`` of the request's file filters when it has any.
+        It is searched here rather than through FAISSRetriever, which cuts every query's
+        results to the shortest row when any query gets fewer than ``top_k``.
+
+        Returns:
+            The (row, score) pairs found for each query, best first.
+        """
+        if self.is_ollama_embedder:
+            embeddings = [self.query_embedder(query).data[0].embedding for query in queries]
+        else:
+            output = self.query_embedder(queries)
+            if output.error:
+                raise ValueError(output.error)
+            embeddings = [data.embedding for data in output.data]
+        scores, indices = self.retriever.index.search(np.asarray(embeddings, dtype=np.float32), top_k)
+
+        # The scores FAISSRetriever gives string queries, as in ``call``
+        scores = np.round((np.clip(scores, -1, 1) + 1) / 2, 3)
+        # Filtered and IVF/HNSW searches pad short rows with -1
+        return [
+            [(int(i), float(score)) for i, score in zip(row_indices, row_scores) if i >= 0]
+            for row_indices, row_scores in zip(indices, scores)
+        ]
+
+    def call_batch(self, queries: List[str], language: str = "en") -> BatchRetrieval:
+        """
+        Retrieve chunks for several queries with one embedding batch and one index search.
+
+        Deep research and wiki generation ask several related questions per turn. The
+        queries are embedded in a single provider request (one request per query for
+        Ollama, which embeds a single string at a time) and searched as one query matrix;
+        each query keeps every result it got, however many the other queries got.
+
+        Args:
+            queries: The queries. Empty queries get an empty result.
+
+        Returns:
+            BatchRetrieval: Per-query results plus the merged chunks, deduplicated and
+            ordered by the best score any query gave them.
+        """
+        results = [RetrieverOutput(doc_indices=[], doc_scores=[], query=query, documents=[]) for query in queries]
+        positions = [i for i, query in enumerate(queries) if query and query.strip()]
+        if not positions:
+            return BatchRetrieval(results=results)
+
+        try:
+            found = self._search([queries[i] for i in positions], self.retriever.top_k)
+        except Exception as e:
+            logger.error(f"Error in batched RAG call: {str(e)}")
+            return BatchRetrieval(results=results)
+
+        best_scores = {}
+        for position, kept in zip(positions, found):
+            results[position].doc_indices = [i for i, _ in kept]
+            results[position].doc_scores = [score for _, score in kept]
+            for doc_index, score in kept:
+                if score > best_scores.get(doc_index, float("-inf")):
+                    best_scores[doc_index] = score
+
+        # Read every retrieved chunk once, then share the documents between the results
+        merged = sorted(best_scores, key=best_scores.get, reverse=True)
+        documents = dict(zip(merged, self._documents_at(merged)))
+        for result in results:
+            result.documents = [documents[i] for i in result.doc_indices]
+        logger.info(f"Retrieved {len(merged)} distinct chunks for {len(positions)} queries")
+
+        return BatchRetrieval(
+            results=results,
+            documents=[documents[i] for i in merged],
+            doc_scores=[best_scores[i] for i in merged],
+        )
+
+    def call(self, query: str, language: str = "en", file_path: str = None) -> Tuple[List]:
         """
         Process a query using RAG.
 
         Args:
             query: The user's query
+            file_path: Optional repository file the query is about. Its chunks are returned
+                first, straight from the file path index, and vector search fills the rest.
 
         Returns:
             Tuple of (RAGAnswer, retrieved_documents)
         """
         try:
+            if file_path:
+                retrieved_documents = self._retrieve_for_file(query, file_path)
+                if retrieved_documents is not None:
+                    return retrieved_documents
+                logger.info(f"No indexed chunks for {file_path}, falling back to vector search")
+
             retrieved_documents = self.retriever(query)
 
             # Fill in the documents
-            retrieved_documents[0].documents = [
-                self.transformed_docs[doc_index]
-                for doc_index in retrieved_documents[0].doc_indices
-            ]
+            retrieved_documents[0].documents = self._documents_at(retrieved_documents[0].doc_indices)
 
             return retrieved_documents
 
@@ -0,0 +1,186 @@
+"""Process-wide cache of prepared retrieval indexes.
+
+Every chat message builds a new ``RAG`` and prepares its retriever. The validated
+documents and the FAISS index of a repository only change when its index store is
+rewritten, so they are kept here and shared by all ``RAG`` instances that ask for the
+same repository and embedder. Entries are keyed by repository, repository type, embedder
+and index store modification time; file filters are not part of the key, the chunk masks
+of the most recently used filters are computed once and kept with the entry. Entries are
+evicted least recently used first once their estimated size exceeds the configured memory
+budget.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, Optional, Sequence
+
+import numpy as np
+
+from core.config import configs
+from core.index_store import build_file_index, index_nbytes
+
+logger = logging.getLogger(__name__)
+
+# Rough per-document overhead of a Python Document object and its metadata dict
+_DOCUMENT_OVERHEAD_BYTES = 1024
+# Chunk masks kept per entry; each takes one byte per document
+_MAX_FILTER_MASKS = 16
+
+
+def retriever_cache_key(repo_url_or_path: str, repo_type: str, embedder_type: str, db_mtime: float) -> Hashable:
+    """
+    Build the cache key of a prepared retriever.
+
+    Returns:
+        tuple: ``(identity, db_mtime)``, where identity covers the repository and embedder.
+    """
+    return (repo_url_or_path.strip(), repo_type, embedder_type), db_mtime
+
+
+@dataclass
+class PreparedIndex:
+    """The retrieval state shared between ``RAG`` instances for one repository."""
+
+    documents: Sequence[Any]
+    index: Any
+    dimensions: int
+    nbytes: int
+    # file_path -> positions of its chunks in ``documents``
+    file_index: Dict[str, Any] = field(default_factory=dict)
+    # ChunkFilter -> bitmap of the chunks it keeps, least recently used first
+    filter_masks: "OrderedDict[Hashable, Any]" = field(default_factory=OrderedDict)
+    _masks_lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @classmethod
+    def from_index(cls, index, documents: Sequence[Any], dimensions: int, resident: bool = False) -> "PreparedIndex":
+        """
+        Wrap a FAISS index and the documents of its rows, indexing the documents by file path.
+
+        The size includes room for the largest number of chunk masks the entry keeps.
+
+        Args:
+            resident (bool): Whether the index vectors live in process memory. Memory-mapped
+                indexes are backed by the OS page cache and only count their bookkeeping.
+        """
+        file_index = build_file_index(documents)
+        nbytes = _DOCUMENT_OVERHEAD_BYTES + 16 * len(documents) + sum(len(path) for path in file_index)
+        nbytes += _MAX_FILTER_MASKS * len(documents)
+        if resident:
+            nbytes += index_nbytes(index)
+            if isinstance(documents, list):
+                nbytes += sum(len(doc.text) for doc in documents) + _DOCUMENT_OVERHEAD_BYTES * len(documents)
+        return cls(documents=documents, index=index, dimensions=dimensions, nbytes=nbytes, file_index=file_index)
+
+    def filter_mask(self, chunk_filter) -> Optional[np.ndarray]:
+        """
+        Return the bitmap of the chunks kept by a ``ChunkFilter``, or None if it keeps them all.
+
+        Masks are computed from the file index and the last ``_MAX_FILTER_MASKS`` of them
+        are kept with the entry.
+        """
+        if chunk_filter.is_empty():
+            return None
+        with self._masks_lock:
+            mask = self.filter_masks.get(chunk_filter)
+            if mask is not None:
+                self.filter_masks.move_to_end(chunk_filter)
+        if mask is None:
+            mask = chunk_filter.chunk_mask(self.file_index, len(self.documents))
+            with self._masks_lock:
+                self.filter_masks[chunk_filter] = mask
+                while len(self.filter_masks) > _MAX_FILTER_MASKS:
+                    self.filter_masks.popitem(last=False)
+        return None if mask.all() else mask
+
+    def attach(self, retriever) -> None:
+        """Point a freshly constructed ``FAISSRetriever`` at this index."""
+        retriever.index = self.index
+        retriever.dimensions = self.dimensions
+        retriever.total_documents = self.index.ntotal
+        retriever.indexed = True
+
+
+class RetrieverCache:
+    """
+    Thread-safe LRU cache of ``PreparedIndex`` entries bounded by a memory budget.
+
+    An entry larger than the whole budget is not cached.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, PreparedIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[PreparedIndex]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Hashable, entry: PreparedIndex) -> None:
+        if entry.nbytes > self.max_bytes:
+            logger.info(f"Prepared index of {entry.nbytes} bytes exceeds the retriever cache budget, not caching it")
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size_bytes -= previous.nbytes
+            # Drop entries of older builds of the same repository and embedder
+            for stale_key in [k for k in self._entries if k[0] == key[0]]:
+                self.size_bytes -= self._entries.pop(stale_key).nbytes
+            self._entries[key] = entry
+            self.size_bytes += entry.nbytes
+            while self.size_bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.size_bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and the current size of the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "size_bytes": self.size_bytes,
+            }
+
+
+_cache: Optional[RetrieverCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_retriever_cache() -> Optional[RetrieverCache]:
+    """
+    Return the process-wide retriever cache, or None if it is disabled in the configuration.
+
+    Configured by ``retriever_cache`` in ``embedder.json`` (``enabled``, ``max_memory_mb``).
+    """
+    global _cache
+    cache_config = configs.get("retriever_cache", {})
+    if not cache_config.get("enabled", True):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RetrieverCache(int(cache_config.get("max_memory_mb", 2048)) * 1024 * 1024)
+    return _cache
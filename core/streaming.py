@@ -0,0 +1,381 @@
+"""Provider-independent answers for the chat endpoints.
+
+``get_provider_model`` creates the model client of a request's provider with the model
+arguments of its configuration, and ``answer_stream`` streams the answer to a prompt,
+retrying without the retrieved context when the prompt is too long for the model.
+
+Every provider streams its answer in its own shape: Ollama response objects, OpenAI and
+Azure completion chunks, plain text from OpenRouter and Dashscope, a single Bedrock
+string, or the synchronous iterator of Google Generative AI. ``stream_answer`` turns any
+of them into an async iterator of text, and ``coalesce_stream`` groups that text into
+frames of up to ``max_bytes`` or ``max_delay`` seconds, so that an answer of a few
+thousand tokens is sent as tens of WebSocket messages or HTTP chunks instead of
+thousands.
+
+Upstream chunks are only read as fast as the frames are sent: at most one read is
+in flight while a frame is being written, so a slow client slows the upstream read
+rather than growing a buffer.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional
+
+import google.generativeai as genai
+from adalflow.components.model_client.ollama_client import OllamaClient
+from adalflow.core.types import ModelType
+
+from core.azureai_client import AzureAIClient
+from core.bedrock_client import BedrockClient
+from core.config import (
+    AWS_ACCESS_KEY_ID,
+    AWS_SECRET_ACCESS_KEY,
+    OPENAI_API_KEY,
+    OPENROUTER_API_KEY,
+    configs,
+    get_model_config,
+)
+from core.dashscope_client import DashscopeClient
+from core.model_clients import get_model_client
+from core.openai_client import OpenAIClient
+from core.openrouter_client import OpenRouterClient
+
+logger = logging.getLogger(__name__)
+
+# Providers called through an adalflow model client; any other is Google Generative AI
+CLIENT_PROVIDERS = ("ollama", "openrouter", "openai", "bedrock", "azure", "dashscope")
+
+# Errors of these providers are reported in the answer rather than raised
+PROVIDER_ERRORS: Dict[str, tuple] = {
+    "openrouter": (
+        "OpenRouter API",
+        "Please check that you have set the OPENROUTER_API_KEY environment variable with a valid API key.",
+    ),
+    "openai": (
+        "Openai API",
+        "Please check that you have set the OPENAI_API_KEY environment variable with a valid API key.",
+    ),
+    "bedrock": (
+        "AWS Bedrock API",
+        "Please check that you have set the AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY "
+        "environment variables with valid credentials.",
+    ),
+    "azure": (
+        "Azure AI API",
+        "Please check that you have set the AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT, and "
+        "AZURE_OPENAI_VERSION environment variables with valid values.",
+    ),
+    "dashscope": (
+        "Dashscope API",
+        "Please check that you have set the DASHSCOPE_API_KEY (and optionally "
+        "DASHSCOPE_WORKSPACE_ID) environment variables with valid values.",
+    ),
+}
+
+# Errors of prompts longer than the model's context, answered again without context
+TOKEN_LIMIT_ERRORS = ("maximum context length", "token limit", "too many tokens")
+
+_DONE = object()
+
+
+def _ollama_text(chunk: Any) -> Optional[str]:
+    text = None
+    if isinstance(chunk, dict):
+        message = chunk.get("message")
+        text = message.get("content") if isinstance(message, dict) else message
+    else:
+        message = getattr(chunk, "message", None)
+        if message is not None:
+            text = message.get("content") if isinstance(message, dict) else getattr(message, "content", None)
+
+    if not text:
+        text = getattr(chunk, "response", None) or getattr(chunk, "text", None)
+
+    if not text and hasattr(chunk, "__dict__"):
+        message = chunk.__dict__.get("message")
+        if isinstance(message, dict):
+            text = message.get("content")
+
+    if isinstance(text, str) and text and not text.startswith("model=") and not text.startswith("created_at="):
+        return text.replace("<think>", "").replace("</think>", "")
+    return None
+
+
+def _delta_text(chunk: Any) -> Optional[str]:
+    choices = getattr(chunk, "choices", [])
+    if len(choices) > 0:
+        delta = getattr(choices[0], "delta", None)
+        if delta is not None:
+            return getattr(delta, "content", None)
+    return None
+
+
+def chunk_text(provider: str, chunk: Any) -> Optional[str]:
+    """Return the text of one streamed chunk of a provider, or None if it carries none."""
+    if provider == "ollama":
+        return _ollama_text(chunk)
+    if provider in ("openai", "azure"):
+        return _delta_text(chunk)
+    if provider in ("openrouter", "dashscope"):
+        return chunk if isinstance(chunk, str) else None
+    return getattr(chunk, "text", None)
+
+
+async def _iterate_in_thread(iterable) -> AsyncIterator[Any]:
+    """Iterate a blocking iterator without blocking the event loop."""
+    iterator = iter(iterable)
+    while True:
+        chunk = await asyncio.to_thread(next, iterator, _DONE)
+        if chunk is _DONE:
+            return
+        yield chunk
+
+
+async def provider_text_stream(provider: str, model: Any, api_kwargs: Dict = None,
+                               prompt: str = None) -> AsyncIterator[str]:
+    """
+    Call a provider and stream the text of its answer.
+
+    Args:
+        provider: The provider of the request.
+        model: Its model client, or a ``genai.GenerativeModel`` for Google.
+        api_kwargs: The API arguments of the call, for model clients.
+        prompt: The prompt, for Google.
+    """
+    if provider not in CLIENT_PROVIDERS:
+        response = await asyncio.to_thread(model.generate_content, prompt, stream=True)
+        chunks = _iterate_in_thread(response)
+    else:
+        if provider in PROVIDER_ERRORS:
+            logger.info(f"Making {PROVIDER_ERRORS[provider][0]} call")
+        response = await model.acall(api_kwargs=api_kwargs, model_type=ModelType.LLM)
+        if provider == "bedrock":
+            # Bedrock does not stream yet and returns the whole answer
+            yield response if isinstance(response, str) else str(response)
+            return
+        chunks = response
+
+    async for chunk in chunks:
+        text = chunk_text(provider, chunk)
+        if text:
+            yield text
+
+
+async def stream_answer(provider: str, model: Any, api_kwargs: Dict = None, prompt: str = None,
+                        fallback: bool = False) -> AsyncIterator[str]:
+    """
+    Stream the text of a provider's answer, see ``provider_text_stream``.
+
+    Errors of the providers in ``PROVIDER_ERRORS`` end the answer with a message telling
+    how to configure the provider; errors of Ollama and Google are raised, so the caller
+    can retry without context when the prompt was too long.
+
+    Args:
+        fallback: Whether this is the retry of a request without context, as told in
+            error messages.
+    """
+    try:
+        async for text in provider_text_stream(provider, model, api_kwargs, prompt):
+            yield text
+    except Exception as e:
+        if provider not in PROVIDER_ERRORS:
+            raise
+        api_name, hint = PROVIDER_ERRORS[provider]
+        if fallback:
+            api_name += " fallback"
+        logger.error(f"Error with {api_name}: {str(e)}")
+        yield f"\nError with {api_name}: {str(e)}\n\n{hint}"
+
+
+@dataclass
+class ProviderModel:
+    """The model of a chat request: its provider, client and model arguments."""
+
+    provider: str
+    # A model client, or a ``genai.GenerativeModel`` for Google
+    model: Any
+    model_kwargs: Optional[Dict[str, Any]] = None
+
+    def prompt(self, prompt: str) -> str:
+        """Return a prompt as sent to the provider."""
+        return prompt + " /no_think" if self.provider == "ollama" else prompt
+
+    def api_kwargs(self, prompt: str) -> Optional[Dict]:
+        """Return the API arguments of a call with a prompt, or None for Google."""
+        if self.provider not in CLIENT_PROVIDERS:
+            return None
+        return self.model.convert_inputs_to_api_kwargs(
+            input=self.prompt(prompt), model_kwargs=self.model_kwargs, model_type=ModelType.LLM
+        )
+
+
+def _copy_keys(model_config: Dict[str, Any], model_kwargs: Dict[str, Any], *keys: str) -> Dict[str, Any]:
+    for key in keys:
+        if key in model_config:
+            model_kwargs[key] = model_config[key]
+    return model_kwargs
+
+
+def get_provider_model(provider: str, model_name: str = None) -> ProviderModel:
+    """
+    Return the model of a chat request, configured by ``generator.json``.
+
+    Args:
+        provider: The provider of the request; an unknown one is Google.
+        model_name: The model of the request, or None for the provider's default.
+    """
+    model_config = get_model_config(provider, model_name)["model_kwargs"]
+    if provider != "ollama" and provider in CLIENT_PROVIDERS:
+        logger.info(f"Using {provider} with model: {model_name}")
+
+    if provider == "ollama":
+        return ProviderModel(provider, get_model_client(OllamaClient), {
+            "model": model_config["model"],
+            "stream": True,
+            "options": {
+                "temperature": model_config["temperature"],
+                "top_p": model_config["top_p"],
+                "num_ctx": model_config["num_ctx"],
+            },
+        })
+    if provider in ("openrouter", "openai"):
+        # The clients report a missing key in the answer
+        if provider == "openrouter" and not OPENROUTER_API_KEY:
+            logger.warning("OPENROUTER_API_KEY not configured, but continuing with request")
+        if provider == "openai" and not OPENAI_API_KEY:
+            logger.warning("OPENAI_API_KEY not configured, but continuing with request")
+        client_class = OpenRouterClient if provider == "openrouter" else OpenAIClient
+        model_kwargs = {"model": model_name, "stream": True, "temperature": model_config["temperature"]}
+        return ProviderModel(provider, get_model_client(client_class), _copy_keys(model_config, model_kwargs, "top_p"))
+    if provider == "bedrock":
+        if not AWS_ACCESS_KEY_ID or not AWS_SECRET_ACCESS_KEY:
+            logger.warning("AWS_ACCESS_KEY_ID or AWS_SECRET_ACCESS_KEY not configured, but continuing with request")
+        model_kwargs = _copy_keys(model_config, {"model": model_name}, "temperature", "top_p")
+        return ProviderModel(provider, get_model_client(BedrockClient), model_kwargs)
+    if provider in ("azure", "dashscope"):
+        client_class = AzureAIClient if provider == "azure" else DashscopeClient
+        return ProviderModel(provider, get_model_client(client_class), {
+            "model": model_name,
+            "stream": True,
+            "temperature": model_config["temperature"],
+            "top_p": model_config["top_p"],
+        })
+
+    # Google Generative AI, the default provider
+    return ProviderModel(provider, genai.GenerativeModel(
+        model_name=model_config["model"],
+        generation_config={
+            "temperature": model_config["temperature"],
+            "top_p": model_config["top_p"],
+            "top_k": model_config["top_k"],
+        },
+    ))
+
+
+def no_context_prompt(system_prompt: str, conversation_history: str, query: str,
+                      file_path: str = None, file_content: str = None) -> str:
+    """Return the prompt of a request without the retrieved context, for prompts too long for the model."""
+    prompt = f"/no_think {system_prompt}\n\n"
+    if conversation_history:
+        prompt += f"<conversation_history>\n{conversation_history}</conversation_history>\n\n"
+    # Include file content in the fallback prompt if it was retrieved
+    if file_path and file_content:
+        prompt += f"<currentFileContent path=\"{file_path}\">\n{file_content}\n</currentFileContent>\n\n"
+    prompt += "<note>Answering without retrieval augmentation due to input size constraints.</note>\n\n"
+    prompt += f"<query>\n{query}\n</query>\n\nAssistant: "
+    return prompt
+
+
+async def answer_stream(model: ProviderModel, prompt: str, fallback_prompt: str) -> AsyncIterator[str]:
+    """
+    Stream the answer of a model to a prompt.
+
+    If the prompt is too long for the model, ``fallback_prompt`` (see ``no_context_prompt``)
+    is answered instead. Errors end the answer with their message.
+    """
+    try:
+        async for text in stream_answer(model.provider, model.model, model.api_kwargs(prompt), model.prompt(prompt)):
+            yield text
+    except Exception as e_outer:
+        logger.error(f"Error in streaming response: {str(e_outer)}")
+        error_message = str(e_outer)
+        if not any(phrase in error_message for phrase in TOKEN_LIMIT_ERRORS):
+            yield f"\nError: {error_message}"
+            return
+
+        logger.warning("Token limit exceeded, retrying without context")
+        try:
+            async for text in stream_answer(
+                model.provider, model.model, model.api_kwargs(fallback_prompt), model.prompt(fallback_prompt),
+                fallback=True,
+            ):
+                yield text
+        except Exception as e2:
+            logger.error(f"Error in fallback streaming response: {str(e2)}")
+            yield "\nI apologize, but your request is too large for me to process. Please try a shorter query or break it into smaller parts."
+
+
+def _streaming_config() -> dict:
+    return configs.get("streaming", {})
+
+
+async def coalesce_stream(texts: AsyncIterator[str], max_bytes: int = None,
+                          max_delay: float = None) -> AsyncIterator[str]:
+    """
+    Group streamed text into frames.
+
+    A frame is sent once it holds ``max_bytes`` of UTF-8 text or ``max_delay`` seconds
+    after its first text arrived, whichever comes first, and when the stream ends.
+    Defaults are ``streaming.coalesce_max_bytes`` and ``streaming.coalesce_max_delay_ms``
+    in ``generator.json``.
+
+    Text received before an error is sent before the error is raised.
+    """
+    if max_bytes is None:
+        max_bytes = int(_streaming_config().get("coalesce_max_bytes", 512))
+    if max_delay is None:
+        max_delay = float(_streaming_config().get("coalesce_max_delay_ms", 20)) / 1000
+
+    loop = asyncio.get_running_loop()
+    iterator = texts.__aiter__()
+    buffer = []
+    size = 0
+    deadline = None
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                # The frame is due; the pending read carries over to the next one
+                yield "".join(buffer)
+                buffer, size, deadline = [], 0, None
+                continue
+
+            read, pending = pending, None
+            try:
+                text = read.result()
+            except StopAsyncIteration:
+                break
+            except Exception:
+                if buffer:
+                    yield "".join(buffer)
+                    buffer = []
+                raise
+
+            buffer.append(text)
+            size += len(text.encode("utf-8"))
+            if deadline is None:
+                deadline = loop.time() + max_delay
+            if size >= max_bytes:
+                yield "".join(buffer)
+                buffer, size, deadline = [], 0, None
+
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        if pending is not None:
+            pending.cancel()
@@ -0,0 +1,204 @@
+"""Recall@k versus latency benchmark of the FAISS index types used by the retriever.
+
+Builds flat, IVF and HNSW indexes with ``core.index_store.build_faiss_index`` over
+synthetic, clustered, L2-normalized vectors (embeddings of source code cluster by file
+and topic, unlike uniform noise) and measures build time, single-query latency and
+recall@k against exact search.
+
+Usage:
+    python -m core.tools.ann_benchmark --sizes 10000 50000 200000 --dimension 256
+    python -m core.tools.ann_benchmark --quantization --sizes 50000
+
+Measured on one CPU core, d=256, 200 queries, recall@20 against exact search:
+
+      chunks  index  params           build s  ms/query  recall@20
+       10000  flat   -                   0.01     0.437      1.000
+       10000  ivf    nprobe=16           0.73     0.046      1.000
+       10000  hnsw   ef_search=128       2.85     0.152      1.000
+       50000  flat   -                   0.07     2.874      1.000
+       50000  ivf    nprobe=16          14.70     0.179      1.000
+       50000  hnsw   ef_search=128      27.61     0.260      1.000
+      200000  flat   -                   0.35    23.619      1.000
+      200000  ivf    nprobe=16         120.91     0.314      1.000
+      200000  hnsw   ef_search=128     224.30     0.638      1.000
+
+The ``ann_index`` defaults in ``embedder.json`` follow from these numbers. Up to about
+50k chunks a flat scan answers within a few milliseconds, exactly and with no build
+cost, so it stays the default (``ivf_min_chunks``). Past that IVF is an order of
+magnitude faster per query. HNSW builds twice as slowly as IVF and was not faster up to
+200k chunks, so it is only selected from 1M chunks (``hnsw_min_chunks``), where IVF's
+latency keeps growing with the list sizes.
+
+``--quantization`` compares the vector codes of ``ann_index.quantization`` on the same
+corpora (index MB counts the vector codes; the float32 re-scoring rows are read from the
+memory-mapped matrix):
+
+      chunks  index  codes  rescore  index MB  ms/query  recall@20
+       50000  flat   none   -            48.8     2.508      1.000
+       50000  flat   fp16   -            24.4     1.578      0.999
+       50000  flat   fp16   x4           24.4     1.771      1.000
+       50000  flat   int8   -            12.2     2.029      0.976
+       50000  flat   int8   x4           12.2     2.261      1.000
+       50000  ivf    none   -            48.8     0.109      1.000
+       50000  ivf    int8   -            12.2     0.105      0.985
+       50000  ivf    int8   x4           12.2     0.228      1.000
+
+float16 halves the index with no measurable recall loss. int8 quarters it and loses about
+2% recall@20, which re-scoring four times as many candidates in float32 wins back.
+"""
+
+import argparse
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from core.index_store import build_faiss_index, index_nbytes, with_rescoring
+
+
+def make_corpus(num_vectors: int, dimension: int, num_queries: int, seed: int = 0):
+    """
+    Generate clustered, normalized corpus vectors and queries drawn from the same clusters.
+
+    Returns:
+        tuple: (corpus, queries) as float32 matrices.
+    """
+    rng = np.random.default_rng(seed)
+    num_clusters = max(1, num_vectors // 100)
+    centers = rng.standard_normal((num_clusters, dimension)).astype(np.float32)
+
+    def sample(count):
+        points = centers[rng.integers(0, num_clusters, count)]
+        points = points + 0.5 * rng.standard_normal((count, dimension)).astype(np.float32)
+        return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+    return sample(num_vectors), sample(num_queries)
+
+
+def recall_at_k(found: np.ndarray, expected: np.ndarray) -> float:
+    """Return the mean fraction of the exact top-k neighbours found by an approximate search."""
+    hits = [len(set(f[f >= 0]) & set(e)) / len(e) for f, e in zip(found, expected)]
+    return float(np.mean(hits))
+
+
+def benchmark(num_vectors: int, dimension: int = 256, num_queries: int = 200, k: int = 20,
+              settings: List[Dict] = None) -> List[Dict]:
+    """
+    Measure each index setting on one synthetic corpus.
+
+    Args:
+        settings: ``{"type": ..., "ann_config": ...}`` entries passed to ``build_faiss_index``.
+
+    Returns:
+        List[Dict]: One row per setting with build time, latency and recall@k.
+    """
+    if settings is None:
+        settings = [
+            {"type": "flat", "ann_config": {}},
+            {"type": "ivf", "ann_config": {"ivf": {"nprobe": 8}}},
+            {"type": "ivf", "ann_config": {"ivf": {"nprobe": 16}}},
+            {"type": "ivf", "ann_config": {"ivf": {"nprobe": 32}}},
+            {"type": "hnsw", "ann_config": {"hnsw": {"M": 32, "ef_construction": 200, "ef_search": 64}}},
+            {"type": "hnsw", "ann_config": {"hnsw": {"M": 32, "ef_construction": 200, "ef_search": 128}}},
+        ]
+    corpus, queries = make_corpus(num_vectors, dimension, num_queries)
+
+    exact = build_faiss_index(corpus, index_type="flat", ann_config={})
+    _, expected = exact.search(queries, k)
+
+    rows = []
+    for setting in settings:
+        start = time.perf_counter()
+        index = build_faiss_index(corpus, index_type=setting["type"], ann_config=setting["ann_config"])
+        build_seconds = time.perf_counter() - start
+
+        found = np.empty((num_queries, k), dtype=np.int64)
+        start = time.perf_counter()
+        for i in range(num_queries):
+            _, found[i:i + 1] = index.search(queries[i:i + 1], k)
+        latency_ms = 1000 * (time.perf_counter() - start) / num_queries
+
+        params = {name: value for section in setting["ann_config"].values() for name, value in section.items()}
+        rows.append({
+            "chunks": num_vectors,
+            "index": setting["type"],
+            "params": ", ".join(f"{name}={value}" for name, value in params.items()) or "-",
+            "build_s": build_seconds,
+            "latency_ms": latency_ms,
+            f"recall@{k}": recall_at_k(found, expected),
+        })
+    return rows
+
+
+def quantization_benchmark(num_vectors: int, dimension: int = 256, num_queries: int = 200, k: int = 20,
+                           index_type: str = "flat", rescore_factor: int = 4) -> List[Dict]:
+    """
+    Compare float32, float16 and int8 codes of one index type, with and without re-scoring.
+
+    Returns:
+        List[Dict]: One row per quantization with the index memory, latency and recall@k.
+    """
+    corpus, queries = make_corpus(num_vectors, dimension, num_queries)
+    _, expected = build_faiss_index(corpus, index_type="flat", ann_config={}).search(queries, k)
+
+    rows = []
+    for quantization in ["none", "fp16", "int8"]:
+        ann_config = {"quantization": quantization, "rescore_factor": rescore_factor}
+        base = build_faiss_index(corpus, index_type=index_type, ann_config=ann_config)
+        # The re-scoring vectors come from the memory-mapped matrix and are not counted
+        variants = [("-", base)]
+        if quantization != "none":
+            variants.append((f"x{rescore_factor}", with_rescoring(base, corpus, ann_config=ann_config)))
+        for rescore, index in variants:
+            found = np.empty((num_queries, k), dtype=np.int64)
+            start = time.perf_counter()
+            for i in range(num_queries):
+                _, found[i:i + 1] = index.search(queries[i:i + 1], k)
+            latency_ms = 1000 * (time.perf_counter() - start) / num_queries
+            rows.append({
+                "chunks": num_vectors,
+                "index": index_type,
+                "codes": quantization,
+                "rescore": rescore,
+                "index_mb": index_nbytes(base) / 2 ** 20,
+                "latency_ms": latency_ms,
+                f"recall@{k}": recall_at_k(found, expected),
+            })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 200000])
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--quantization", action="store_true", help="compare float32, float16 and int8 codes")
+    parser.add_argument("--index-type", default="flat", help="index type of the --quantization comparison")
+    args = parser.parse_args()
+
+    if args.quantization:
+        header = f"{'chunks':>8}  {'index':<5}  {'codes':<5}  {'rescore':<7}  {'index MB':>8}  {'ms/query':>8}  {'recall@' + str(args.k):>9}"
+        print(header)
+        print("-" * len(header))
+        for size in args.sizes:
+            for row in quantization_benchmark(size, args.dimension, args.queries, args.k, args.index_type):
+                print(
+                    f"{row['chunks']:>8}  {row['index']:<5}  {row['codes']:<5}  {row['rescore']:<7}  "
+                    f"{row['index_mb']:>8.1f}  {row['latency_ms']:>8.3f}  {row[f'recall@{args.k}']:>9.3f}"
+                )
+        return
+
+    header = f"{'chunks':>8}  {'index':<5}  {'params':<40}  {'build s':>8}  {'ms/query':>8}  {'recall@' + str(args.k):>9}"
+    print(header)
+    print("-" * len(header))
+    for size in args.sizes:
+        for row in benchmark(size, args.dimension, args.queries, args.k):
+            print(
+                f"{row['chunks']:>8}  {row['index']:<5}  {row['params']:<40}  {row['build_s']:>8.2f}  "
+                f"{row['latency_ms']:>8.3f}  {row[f'recall@{args.k}']:>9.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
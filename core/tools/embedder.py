@@ -1,6 +1,7 @@
 import adalflow as adal
 
 from core.config import configs, get_embedder_type
+from core.model_clients import get_model_client
 
 
 def get_embedder(is_local_ollama: bool = False, use_google_embedder: bool = False, embedder_type: str = None) -> adal.Embedder:
@@ -42,10 +43,7 @@ def get_embedder(is_local_ollama: bool = False, use_google_embedder: bool = Fals
 
     # --- Initialize Embedder ---
     model_client_class = embedder_config["model_client"]
-    if "initialize_kwargs" in embedder_config:
-        model_client = model_client_class(**embedder_config["initialize_kwargs"])
-    else:
-        model_client = model_client_class()
+    model_client = get_model_client(model_client_class, **embedder_config.get("initialize_kwargs", {}))
     
     # Create embedder with basic parameters
     embedder_kwargs = {"model_client": model_client, "model_kwargs": embedder_config["model_kwargs"]}
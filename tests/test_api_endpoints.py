@@ -49,3 +49,8 @@ def test_get_lang_config():
     data = response.json()
     assert "supported_languages" in data
     assert "default" in data
+
+def test_get_unknown_index_job():
+    response = client.get("/api/index/does-not-exist")
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Index job not found"
@@ -0,0 +1,52 @@
+from unittest.mock import patch
+
+from adalflow.core.types import Document
+
+from core.config import configs
+from core.context_packer import get_context_budget, get_context_window, pack_context
+
+_CONFIG = {
+    "context_packing": {
+        "max_context_tokens": 1000,
+        "reserved_output_tokens": 100,
+        "default_context_window": 4000,
+        "provider_context_windows": {"google": 100000},
+        "model_context_windows": {"gpt-4": 2000},
+    },
+    "providers": {
+        "ollama": {"default_model": "small", "models": {"small": {"options": {"num_ctx": 500}}}},
+        "openai": {"default_model": "gpt-4", "models": {"gpt-4": {}}},
+    },
+}
+
+
+def _chunk(file_path, tokens):
+    return Document(text=f"{file_path}:{tokens}", meta_data={"file_path": file_path}, estimated_num_tokens=tokens)
+
+
+def test_context_budget_follows_the_model_window():
+    with patch.dict(configs, _CONFIG):
+        assert get_context_window("openai", "gpt-4") == 2000
+        assert get_context_window("openai") == 2000
+        assert get_context_window("ollama") == 500
+        assert get_context_window("google", "gemini") == 100000
+        assert get_context_window("dashscope", "qwen") == 4000
+
+        assert get_context_budget("google", "gemini", 300) == 1000
+        assert get_context_budget("openai", "gpt-4", 1500) == 400
+        assert get_context_budget("ollama", None, 450) == 0
+
+
+def test_pack_context_fills_the_budget_in_retrieval_order():
+    chunks = [_chunk("a.py", 50), _chunk("b.py", 500), _chunk("a.py", 30), _chunk("c.md", 20)]
+
+    # Stored token counts are used as is; only the file headers are counted
+    with patch("core.context_packer.count_tokens", return_value=5) as count:
+        text, packed = pack_context(chunks, budget_tokens=120)
+
+    assert [doc.text for doc in packed] == ["a.py:50", "a.py:30", "c.md:20"]
+    assert count.call_count == 3
+    assert text == "\n\n----------## File Path: a.py\n\na.py:50\n\na.py:30\n\n## File Path: c.md\n\nc.md:20"
+
+    with patch("core.context_packer.count_tokens", return_value=5):
+        assert pack_context(chunks, budget_tokens=10) == ("", [])
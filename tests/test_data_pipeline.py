@@ -1,7 +1,18 @@
 import os
 import pytest
+import tiktoken
 from unittest.mock import patch, MagicMock
-from core.data_pipeline import count_tokens, download_repo, read_all_documents
+from core import data_pipeline
+from core.data_pipeline import (
+    MAX_EMBEDDING_TOKENS,
+    count_tokens,
+    count_tokens_batch,
+    download_repo,
+    exceeds_token_limit_by_length,
+    get_tokenizer,
+    read_all_documents,
+    read_document_batch,
+)
 
 def test_count_tokens_openai():
     text = "Hello, world!"
@@ -16,6 +27,37 @@ def test_count_tokens_fallback():
             # Fallback is len(text) // 4 = 49 // 4 = 12
             assert count == len(text) // 4
 
+def test_get_tokenizer_is_cached():
+    assert get_tokenizer("openai") is get_tokenizer("openai")
+    assert get_tokenizer("ollama") is get_tokenizer("ollama")
+
+def test_count_tokens_batch_matches_count_tokens():
+    texts = ["Hello, world!", "def f(x):\n    return x * 2", ""]
+    assert count_tokens_batch(texts, embedder_type="openai") == [
+        count_tokens(text, embedder_type="openai") for text in texts
+    ]
+    assert count_tokens_batch([], embedder_type="openai") == []
+
+def test_exceeds_token_limit_by_length():
+    assert not exceeds_token_limit_by_length(1000, 8192)
+    assert exceeds_token_limit_by_length(8192 * 100, 8192)
+
+def test_long_token_files_are_counted_not_rejected_by_length(tmp_path, monkeypatch):
+    # A tokenizer that encodes runs of "a" up to 64 bytes long as a single token
+    ranks = {bytes([i]): i for i in range(256)}
+    ranks.update({b"a" * 2 ** n: 255 + n for n in range(1, 7)})
+    encoding = tiktoken.Encoding(name="long_tokens", pat_str=r"\p{L}+|[^\p{L}]+", mergeable_ranks=ranks, special_tokens={})
+    monkeypatch.setattr(data_pipeline, "get_tokenizer", lambda embedder_type=None: encoding)
+
+    # Just over 10 bytes per token of the limit, yet well under the limit in tokens
+    path = tmp_path / "minified.md"
+    path.write_text("a" * (MAX_EMBEDDING_TOKENS * 10 + 64))
+    [document] = read_document_batch([(str(path), ".md", False)], str(tmp_path), "openai")
+    assert document.meta_data["token_count"] == MAX_EMBEDDING_TOKENS * 10 // 64 + 1
+
+    assert not exceeds_token_limit_by_length(MAX_EMBEDDING_TOKENS * 64, MAX_EMBEDDING_TOKENS)
+    assert exceeds_token_limit_by_length(MAX_EMBEDDING_TOKENS * 64 + 1, MAX_EMBEDDING_TOKENS)
+
 @patch("subprocess.run")
 def test_download_repo_success(mock_run, tmp_path):
     mock_run.return_value = MagicMock(stdout=b"Cloning into...", check=True)
@@ -59,3 +101,184 @@ def test_read_all_documents_exclusion(tmp_path):
         )
         assert len(documents) == 1
         assert documents[0].meta_data["file_path"] == "test.py"
+
+def test_iter_repo_files_prunes_excluded_dirs(tmp_path):
+    from core.data_pipeline import iter_repo_files, os as dp_os
+
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "app.py").write_text("x = 1")
+    (tmp_path / "node_modules" / "pkg").mkdir(parents=True)
+    (tmp_path / "node_modules" / "pkg" / "index.js").write_text("module.exports = 1")
+    (tmp_path / "README.md").write_text("# Project")
+    (tmp_path / "main.js").write_text("console.log(1)")
+
+    scanned = []
+    real_scandir = dp_os.scandir
+
+    def recording_scandir(p):
+        scanned.append(p)
+        return real_scandir(p)
+
+    with patch("core.data_pipeline.os.scandir", side_effect=recording_scandir):
+        results = list(iter_repo_files(str(tmp_path), False, [], [], ["./node_modules/"], []))
+
+    relative = [os.path.relpath(p, tmp_path) for p, _, _ in results]
+    # Code files first in extension order, then documentation files
+    assert relative == [os.path.join("src", "app.py"), "main.js", "README.md"]
+    assert [is_code for _, _, is_code in results] == [True, True, False]
+    assert not any("node_modules" in p for p in scanned)
+
+def test_iter_repo_files_inclusion_mode(tmp_path):
+    from core.data_pipeline import iter_repo_files
+
+    (tmp_path / "core" / "sub").mkdir(parents=True)
+    (tmp_path / "core" / "sub" / "deep.py").write_text("y = 2")
+    (tmp_path / "other").mkdir()
+    (tmp_path / "other" / "skip.py").write_text("z = 3")
+    (tmp_path / "other" / "notes.md").write_text("notes")
+
+    results = list(iter_repo_files(str(tmp_path), True, ["core"], ["notes.md"], [], []))
+    relative = sorted(os.path.relpath(p, tmp_path) for p, _, _ in results)
+    assert relative == [os.path.join("core", "sub", "deep.py"), os.path.join("other", "notes.md")]
+
+def test_read_all_documents_parallel_matches_serial(tmp_path):
+    repo_dir = tmp_path / "parallel_repo"
+    (repo_dir / "pkg").mkdir(parents=True)
+    for i in range(5):
+        (repo_dir / "pkg" / f"mod_{i}.py").write_text(f"value = {i}\n" * (i + 1))
+    (repo_dir / "guide.md").write_text("# Guide\n\nSome docs.")
+
+    with patch("core.data_pipeline.configs", {"ingestion": {"batch_size": 2}}):
+        serial = read_all_documents(str(repo_dir), embedder_type="openai", max_workers=1)
+        parallel = read_all_documents(str(repo_dir), embedder_type="openai", max_workers=2)
+
+    assert len(serial) == 6
+    assert [d.text for d in parallel] == [d.text for d in serial]
+    assert [d.meta_data for d in parallel] == [d.meta_data for d in serial]
+
+class _RecordingEmbedder:
+    """Stand-in for the split-and-embed pipeline: one chunk per document."""
+
+    def __init__(self):
+        self.embedded_texts = []
+
+    def __call__(self, documents):
+        from adalflow.core.types import Document
+
+        self.embedded_texts.extend(doc.text for doc in documents)
+        return [
+            Document(text=doc.text, meta_data=dict(doc.meta_data), parent_doc_id=f"{doc.id}", order=0, vector=[1.0, 0.0])
+            for doc in documents
+        ]
+
+def test_refresh_documents_in_db_reembeds_only_changed_files(tmp_path):
+    from adalflow.core.db import LocalDB
+    from adalflow.core.types import Document
+    from core.data_pipeline import build_index_manifest, refresh_documents_in_db
+
+    def doc(path, text):
+        return Document(text=text, meta_data={"file_path": path})
+
+    embedder = _RecordingEmbedder()
+    db = LocalDB()
+    db.load([doc("a.py", "a = 1"), doc("b.py", "b = 1"), doc("c.py", "c = 1")])
+    db.transformed_items["split_and_embed"] = embedder(db.items)
+    manifest = build_index_manifest(db, "openai")
+    embedder.embedded_texts.clear()
+
+    current = [doc("a.py", "a = 1"), doc("b.py", "b = 2"), doc("d.py", "d = 1")]
+    db_path = str(tmp_path / "databases" / "repo.pkl")
+    with patch("core.data_pipeline.prepare_data_pipeline", return_value=embedder):
+        refresh_documents_in_db(db, current, db_path, embedder_type="openai", manifest=manifest)
+
+    assert sorted(embedder.embedded_texts) == ["b = 2", "d = 1"]
+    chunks = db.get_transformed_data(key="split_and_embed")
+    assert sorted(chunk.text for chunk in chunks) == ["a = 1", "b = 2", "d = 1"]
+    assert sorted(item.meta_data["file_path"] for item in db.items) == ["a.py", "b.py", "d.py"]
+    assert os.path.exists(str(tmp_path / "databases" / "repo.manifest.json"))
+    assert os.path.exists(str(tmp_path / "databases" / "repo.chunks.sqlite"))
+
+def test_download_repo_via_zip_skips_filtered_members(tmp_path):
+    import io
+    import zipfile
+    from core.data_pipeline import _download_repo_via_zip
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr("owner-repo-abc123/", "")
+        zf.writestr("owner-repo-abc123/src/app.py", "print('hi')")
+        zf.writestr("owner-repo-abc123/README.md", "# Repo")
+        zf.writestr("owner-repo-abc123/node_modules/pkg/index.js", "module.exports = 1")
+        zf.writestr("owner-repo-abc123/assets/logo.png", b"\x89PNG")
+        zf.writestr("owner-repo-abc123/data/huge.json", "0" * (8192 * 10 + 1))
+        zf.writestr("owner-repo-abc123/.github/workflow.yml", "on: push")
+    payload = buffer.getvalue()
+
+    response = MagicMock(ok=True)
+    response.iter_content.return_value = [payload[i:i + 100] for i in range(0, len(payload), 100)]
+    response.__enter__.return_value = response
+
+    local_path = tmp_path / "zip_repo"
+    with patch("core.data_pipeline.requests.get", return_value=response), \
+            patch("core.data_pipeline.configs", {"file_filters": {"excluded_dirs": [], "excluded_files": []}}):
+        _download_repo_via_zip("https://github.com/owner/repo", str(local_path), "github")
+
+    extracted = sorted(
+        os.path.relpath(os.path.join(root, name), local_path)
+        for root, _, names in os.walk(local_path) for name in names
+    )
+    assert extracted == ["README.md", os.path.join("src", "app.py")]
+
+    # The filters of the request add to the default ones
+    from core.data_pipeline import resolve_file_filters
+    local_path = tmp_path / "zip_repo_included"
+    with patch("core.data_pipeline.requests.get", return_value=response), \
+            patch("core.data_pipeline.configs", {"file_filters": {"excluded_dirs": [], "excluded_files": []}}):
+        _download_repo_via_zip("https://github.com/owner/repo", str(local_path), "github",
+                               file_filters=resolve_file_filters(included_dirs=["node_modules"]))
+    extracted = sorted(
+        os.path.relpath(os.path.join(root, name), local_path)
+        for root, _, names in os.walk(local_path) for name in names
+    )
+    assert extracted == ["README.md", os.path.join("node_modules", "pkg", "index.js"), os.path.join("src", "app.py")]
+
+def _git(cwd, *args):
+    import subprocess
+
+    subprocess.run(
+        ["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", "-c", "init.defaultBranch=main", *args],
+        cwd=cwd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+
+def test_refresh_repo_fetches_and_reports_changed_files(tmp_path):
+    from core.data_pipeline import get_repo_head, refresh_repo
+
+    work = tmp_path / "work"
+    work.mkdir()
+    _git(work, "init")
+    (work / "keep.py").write_text("keep = 1")
+    (work / "edit.py").write_text("edit = 1")
+    (work / "gone.py").write_text("gone = 1")
+    _git(work, "add", ".")
+    _git(work, "commit", "-m", "initial")
+    _git(tmp_path, "clone", "--bare", str(work), "origin.git")
+
+    clone = tmp_path / "clone"
+    _git(tmp_path, "clone", "--depth=1", f"file://{tmp_path / 'origin.git'}", str(clone))
+    old_head = get_repo_head(str(clone))
+
+    (work / "edit.py").write_text("edit = 2")
+    (work / "gone.py").unlink()
+    (work / "new.py").write_text("new = 1")
+    _git(work, "add", "-A")
+    _git(work, "commit", "-m", "update")
+    _git(work, "push", str(tmp_path / "origin.git"), "HEAD")
+
+    changes = refresh_repo(str(clone))
+
+    assert changes["old_head"] == old_head
+    assert changes["new_head"] == get_repo_head(str(work))
+    assert sorted(changes["changed_files"]) == ["edit.py", "gone.py", "new.py"]
+    assert (clone / "new.py").read_text() == "new = 1"
+    assert not (clone / "gone.py").exists()
+    assert refresh_repo(str(tmp_path)) is None
@@ -0,0 +1,53 @@
+from adalflow.core.types import Document
+
+from core.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, documents):
+        self.texts.extend(doc.text for doc in documents)
+        for doc in documents:
+            doc.vector = [float(len(doc.text)), 1.0]
+        return documents
+
+
+def test_embedding_cache_round_trip_and_stats(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), max_bytes=1024 * 1024)
+    key = cache.make_key("Client:model:256", "hello")
+    assert cache.get_many([key]) == {}
+
+    cache.put_many({key: [0.5, 0.25]})
+    assert cache.get_many([key]) == {key: [0.5, 0.25]}
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+
+def test_embedding_cache_evicts_least_recently_used(tmp_path):
+    # Each two-dimensional float32 vector takes 8 bytes
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), max_bytes=16)
+    cache.put_many({"a": [1.0, 1.0]})
+    cache.put_many({"b": [2.0, 2.0]})
+    cache.get_many(["a"])
+    cache.put_many({"c": [3.0, 3.0]})
+
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+    assert cache.stats()["evictions"] == 1
+
+def test_cached_embeddings_only_sends_misses(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), max_bytes=1024 * 1024)
+    embedder = CountingEmbedder()
+    transformer = CachedEmbeddings(embedder, cache=cache, namespace="Client:model:256")
+
+    first = transformer([Document(text="alpha"), Document(text="beta"), Document(text="alpha")])
+    assert sorted(embedder.texts) == ["alpha", "beta"]
+    assert [doc.vector for doc in first] == [[5.0, 1.0], [4.0, 1.0], [5.0, 1.0]]
+
+    embedder.texts.clear()
+    second = transformer([Document(text="beta"), Document(text="gamma")])
+    assert embedder.texts == ["gamma"]
+    assert [doc.vector for doc in second] == [[4.0, 1.0], [5.0, 1.0]]
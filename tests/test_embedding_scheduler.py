@@ -0,0 +1,119 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from core.embedding_scheduler import EmbeddingScheduler, rate_limit_delay
+
+
+class _StubEmbeddingHandler(BaseHTTPRequestHandler):
+    """Embeds each text as [len(text)], answering 429 to the first requests."""
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.requests += 1
+            rate_limited = server.requests <= server.rate_limited_requests
+            server.in_flight += 1
+            server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+        try:
+            if rate_limited:
+                self.send_response(429)
+                self.send_header("Retry-After", "0")
+                self.end_headers()
+                return
+            time.sleep(0.05)
+            payload = json.dumps({"data": [[float(len(text))] for text in body["input"]]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubEmbeddingHandler)
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.rate_limited_requests = 0
+    server.in_flight = 0
+    server.peak_in_flight = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _embed_batch_via(server):
+    url = f"http://127.0.0.1:{server.server_address[1]}/embeddings"
+
+    def embed_batch(texts):
+        response = requests.post(url, json={"input": texts}, timeout=10)
+        response.raise_for_status()
+        return response.json()["data"]
+
+    return embed_batch
+
+
+def test_scheduler_keeps_batches_in_flight_and_preserves_order(stub_server):
+    texts = ["x" * n for n in range(1, 41)]
+    scheduler = EmbeddingScheduler(_embed_batch_via(stub_server), batch_size=4, max_concurrency=4)
+
+    vectors = scheduler.embed(texts)
+
+    assert vectors == [[float(n)] for n in range(1, 41)]
+    metrics = scheduler.metrics()
+    assert metrics["batches_completed"] == 10
+    assert metrics["texts_embedded"] == 40
+    assert metrics["in_flight"] == 0
+    assert metrics["peak_in_flight"] > 1
+    assert stub_server.peak_in_flight > 1
+
+
+def test_scheduler_backs_off_and_retries_on_429(stub_server):
+    stub_server.rate_limited_requests = 3
+    texts = ["x" * n for n in range(1, 17)]
+    scheduler = EmbeddingScheduler(_embed_batch_via(stub_server), batch_size=4, max_concurrency=4)
+
+    vectors = scheduler.embed(texts)
+
+    assert vectors == [[float(n)] for n in range(1, 17)]
+    metrics = scheduler.metrics()
+    assert metrics["rate_limited"] == 3
+    assert metrics["batches_failed"] == 0
+    assert metrics["concurrency"] < 4
+
+
+def test_scheduler_gives_up_on_failed_batches(stub_server):
+    stub_server.rate_limited_requests = 100
+    scheduler = EmbeddingScheduler(_embed_batch_via(stub_server), batch_size=2, max_concurrency=2, max_retries=1)
+
+    vectors = scheduler.embed(["a", "b", "c"])
+
+    assert vectors == [None, None, None]
+    assert scheduler.metrics()["batches_failed"] == 2
+
+
+def test_rate_limit_delay():
+    class _HTTPError(Exception):
+        def __init__(self, status_code, headers):
+            self.status_code = status_code
+            self.response = type("Response", (), {"status_code": status_code, "headers": headers})()
+
+    assert rate_limit_delay(_HTTPError(429, {"retry-after": "7"})) == 7.0
+    assert rate_limit_delay(_HTTPError(429, {})) == 1.0
+    assert rate_limit_delay(_HTTPError(500, {})) is None
+    assert rate_limit_delay(RuntimeError("ThrottlingException: Rate exceeded")) == 1.0
+    assert rate_limit_delay(ValueError("bad input")) is None
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import threading
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from core.file_content import (
+    FileContentCache,
+    close_http_session,
+    get_file_content_async,
+    get_http_session,
+    local_file_path,
+)
+
+
+def test_indexed_file_content_is_read_from_the_local_clone(tmp_path):
+    repo_dir = tmp_path / "repos" / "owner_repo"
+    (repo_dir / "src").mkdir(parents=True)
+    (repo_dir / ".git").mkdir()
+    (repo_dir / "src" / "app.py").write_text("print('hi')\n", encoding="utf-8")
+    (repo_dir / "src" / "other.py").write_text("secret", encoding="utf-8")
+    (repo_dir / ".git" / "config").write_text("url = https://token@github.com/owner/repo", encoding="utf-8")
+    (repo_dir / ".env").write_text("TOKEN=secret", encoding="utf-8")
+    (tmp_path / "databases").mkdir()
+    manifest = {"version": 1, "files": {"src/app.py": {}, ".env": {}}}
+    (tmp_path / "databases" / "owner_repo.manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+    repo_url = "https://github.com/owner/repo"
+
+    with patch("core.file_content.get_adalflow_default_root_path", return_value=str(tmp_path)), \
+            patch("core.file_content.get_github_file_content_async", new=AsyncMock(return_value="api")) as fetch, \
+            patch("core.file_content._cache", new=FileContentCache(1024, 60)):
+        content = asyncio.run(get_file_content_async(repo_url, "/src/app.py", "github"))
+        assert content == "print('hi')\n"
+        fetch.assert_not_called()
+
+        # Files outside the index, hidden files and paths outside the clone go through the API
+        for file_path in ("src/other.py", ".git/config", ".env", "src/../.env", "../../secret.txt"):
+            assert local_file_path(repo_url, file_path, "github") is None
+            assert asyncio.run(get_file_content_async(repo_url, file_path, "github")) == "api"
+
+    # A repository given as a directory is never read from the filesystem
+    with pytest.raises(ValueError):
+        asyncio.run(get_file_content_async(str(repo_dir), "src/app.py", "local"))
+
+
+def test_fetched_file_content_is_cached_per_token(tmp_path):
+    fetch = AsyncMock(return_value="content")
+    with patch("core.file_content.get_github_file_content_async", new=fetch), \
+            patch("core.file_content.get_adalflow_default_root_path", return_value=str(tmp_path)), \
+            patch("core.file_content._cache", new=FileContentCache(1024, 60)):
+        for token in ("token", "token", "other"):
+            content = asyncio.run(
+                get_file_content_async("https://github.com/owner/repo", "README.md", "github", token)
+            )
+            assert content == "content"
+    assert fetch.await_count == 2
+
+
+def test_file_content_cache_is_bounded_by_size():
+    cache = FileContentCache(max_bytes=10, ttl_seconds=60)
+    cache.put("a", "12345")
+    cache.put("b", "12345")
+    assert cache.get("a") == "12345"
+    cache.put("c", "123")
+    assert cache.get("b") is None
+    cache.put("huge", "x" * 11)
+    assert cache.get("huge") is None
+    assert cache.stats()["size_bytes"] == 8
+
+    with patch("core.file_content.time.monotonic", return_value=float("inf")):
+        assert cache.get("a") is None
+
+
+def test_http_session_of_a_previous_loop_is_released():
+    async def session():
+        return get_http_session()
+
+    # A session whose loop has stopped is detached
+    first = asyncio.run(session())
+    second = asyncio.run(session())
+    assert second is not first and first.closed
+
+    # A session whose loop still runs is closed on that loop
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        on_thread = asyncio.run_coroutine_threadsafe(session(), loop).result(5)
+        third = asyncio.run(session())
+
+        async def closed_after_scheduled_close():
+            await asyncio.sleep(0.05)
+            return on_thread.closed
+
+        assert asyncio.run_coroutine_threadsafe(closed_after_scheduled_close(), loop).result(5)
+        assert third is not on_thread
+        asyncio.run(close_http_session())
+        assert third.closed
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
+        loop.close()
@@ -0,0 +1,123 @@
+import threading
+import time
+
+import pytest
+
+from core.index_builds import BuildCoordinator
+
+
+def test_concurrent_builds_of_one_repo_share_the_work(tmp_path):
+    coordinator = BuildCoordinator(str(tmp_path))
+    started = threading.Event()
+    release = threading.Event()
+    index = {}
+    full_builds = []
+
+    def build(progress):
+        # Later requests find the index written by the first one and only load it
+        if "docs" not in index:
+            progress("embed", files=3)
+            started.set()
+            release.wait(5)
+            full_builds.append(threading.current_thread().name)
+            index["docs"] = ["a", "b", "c"]
+        return index["docs"]
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(coordinator.run("owner_repo", build)), name=f"request-{i}")
+        for i in range(4)
+    ]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+
+    progress = coordinator.progress("owner_repo")
+    assert (progress.stage, progress.detail) == ("embed", {"files": 3})
+    assert (tmp_path / "owner_repo.build.json").exists()
+
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert full_builds == ["request-0"]
+    assert results == [["a", "b", "c"]] * 4
+    assert coordinator.progress("owner_repo") is None
+    assert not (tmp_path / "owner_repo.build.json").exists()
+
+
+
+def test_waiting_requests_load_the_finished_build(tmp_path):
+    coordinator = BuildCoordinator(str(tmp_path))
+    started = threading.Event()
+    release = threading.Event()
+    builds = []
+    index = {}
+
+    def refresh(progress):
+        # A refresh runs again even when an index exists
+        builds.append(threading.current_thread().name)
+        started.set()
+        release.wait(5)
+        index["docs"] = ["a", "b"]
+        return index["docs"]
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(coordinator.run("owner_repo", refresh, load=lambda: index.get("docs"))),
+                         name=f"request-{i}")
+        for i in range(4)
+    ]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while coordinator._flights["owner_repo"].waiters < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert builds == ["request-0"]
+    assert results == [["a", "b"]] * 4
+def test_waiting_requests_get_the_build_error(tmp_path):
+    coordinator = BuildCoordinator(str(tmp_path))
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def failing_build(progress):
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        raise ValueError("clone failed")
+
+    errors = []
+
+    def request():
+        try:
+            coordinator.run("owner_repo", failing_build)
+        except ValueError as e:
+            errors.append(str(e))
+
+    first = threading.Thread(target=request)
+    first.start()
+    assert started.wait(5)
+    second = threading.Thread(target=request)
+    second.start()
+    while not coordinator._flights["owner_repo"].waiters:
+        time.sleep(0.01)
+    release.set()
+    first.join(5)
+    second.join(5)
+
+    assert len(calls) == 1
+    assert errors == ["clone failed", "clone failed"]
+
+    # A later request starts a new build
+    with pytest.raises(ValueError):
+        coordinator.run("owner_repo", failing_build)
+    assert len(calls) == 2
@@ -0,0 +1,110 @@
+import queue
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from core.index_jobs import IndexJob, IndexJobQueue, IndexJobStore
+
+
+def test_index_job_reports_stages_and_persists_state(tmp_path):
+    store = IndexJobStore(str(tmp_path / "jobs.sqlite"))
+    release = threading.Event()
+
+    def build(job, access_token, progress):
+        assert access_token == "secret"
+        progress("download")
+        progress("embed", documents=42)
+        release.wait(5)
+        progress("persist", chunks=42)
+
+    jobs = IndexJobQueue(store, max_workers=1, build=build)
+    job = jobs.submit(" https://github.com/owner/repo ", "github", "secret")
+    assert job.repo_key == "owner_repo"
+
+    # A second request for the same repository gets the active job
+    assert jobs.submit("https://github.com/owner/repo", "github").id == job.id
+    assert jobs.active_job("https://github.com/owner/repo", "github").id == job.id
+
+    release.set()
+    jobs._queue.join()
+
+    finished = IndexJobStore(store.path).get(job.id)
+    assert finished.status == "succeeded"
+    assert [stage["stage"] for stage in finished.stages] == ["download", "embed", "persist"]
+    assert finished.stages[1]["detail"] == {"documents": 42}
+    assert finished.to_dict()["stage"] == "persist"
+    assert "secret" not in str(finished.to_dict())
+    assert jobs.active_job("https://github.com/owner/repo", "github") is None
+
+
+def test_failed_and_interrupted_jobs(tmp_path):
+    store = IndexJobStore(str(tmp_path / "jobs.sqlite"))
+
+    def failing_build(job, access_token, progress):
+        progress("download")
+        raise ValueError("repository not found")
+
+    jobs = IndexJobQueue(store, max_workers=1, build=failing_build)
+    job = jobs.submit("https://github.com/owner/missing", "github")
+    jobs._queue.join()
+    failed = jobs.get(job.id)
+    assert (failed.status, failed.error, failed.stage) == ("failed", "repository not found", "download")
+
+    # A job of another instance that stopped sending heartbeats is failed; one that still
+    # sends them, possibly under a reused pid, is kept
+    def running(job_id, owner, heartbeat_at):
+        store.save(IndexJob(id=job_id, repo_key=job_id, repo_url="u", repo_type="github", status="running",
+                            owner=owner, heartbeat_at=heartbeat_at))
+
+    running("orphan", "restarted-instance", time.time() - 120)
+    running("alive", "other-worker", time.time())
+    running("unowned", None, None)
+    assert store.fail_orphaned_jobs() == 2
+    assert store.get("orphan").status == "failed"
+    assert store.active_job("alive").status == "running"
+    assert store.active_job("unowned") is None
+
+
+def test_concurrent_submits_of_one_repo_add_one_job(tmp_path):
+    # Queues of separate workers, sharing the job store
+    release = threading.Event()
+    queues = [
+        IndexJobQueue(IndexJobStore(str(tmp_path / "jobs.sqlite")), max_workers=1,
+                      build=lambda job, access_token, progress: release.wait(5))
+        for _ in range(8)
+    ]
+    start = threading.Barrier(len(queues))
+    submitted = []
+
+    def submit(jobs):
+        start.wait()
+        submitted.append(jobs.submit("https://github.com/owner/repo", "github").id)
+
+    threads = [threading.Thread(target=submit, args=(jobs,)) for jobs in queues]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    release.set()
+
+    assert len(set(submitted)) == 1
+    with sqlite3.connect(str(tmp_path / "jobs.sqlite")) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM index_jobs").fetchone() == (1,)
+
+
+def test_submit_rejects_when_the_queue_is_full(tmp_path):
+    release = threading.Event()
+    jobs = IndexJobQueue(IndexJobStore(str(tmp_path / "jobs.sqlite")), max_workers=1, max_queued=1,
+                         build=lambda job, access_token, progress: release.wait(5))
+    jobs.submit("https://github.com/owner/a", "github")
+    # The first job is taken by the worker or still queued; fill the queue either way
+    try:
+        jobs.submit("https://github.com/owner/b", "github")
+    except queue.Full:
+        pass
+    with pytest.raises(queue.Full):
+        jobs.submit("https://github.com/owner/c", "github")
+    release.set()
+    jobs._queue.join()
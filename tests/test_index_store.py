@@ -0,0 +1,220 @@
+import os
+
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+from adalflow.core.db import LocalDB
+from adalflow.core.types import Document
+
+from core.data_pipeline import DatabaseManager
+from core.index_store import (
+    IndexStore,
+    build_faiss_index,
+    RescoredIndex,
+    faiss_index_type,
+    faiss_quantization,
+    get_index_store_paths,
+    index_nbytes,
+    index_store_exists,
+    save_index_store,
+    select_index_type,
+    with_rescoring,
+)
+from core.config import configs
+
+
+def _db():
+    db = LocalDB()
+    db.load([
+        Document(id="item-a", text="a = 1\nb = 2", meta_data={"file_path": "a.py", "is_code": True}),
+        Document(id="item-b", text="# Title", meta_data={"file_path": "README.md", "is_code": False}),
+    ])
+    db.transformed_items["split_and_embed"] = [
+        Document(id="c0", text="a = 1", meta_data={"file_path": "a.py"}, vector=[1.0, 0.0, 0.0],
+                 parent_doc_id="item-a", order=0),
+        Document(id="c1", text="b = 2", meta_data={"file_path": "a.py"}, vector=[0.0, 1.0, 0.0],
+                 parent_doc_id="item-a", order=1),
+        Document(id="c2", text="# Title", meta_data={"file_path": "README.md"}, vector=[],
+                 parent_doc_id="item-b", order=0),
+    ]
+    return db
+
+
+def test_index_store_round_trip(tmp_path):
+    db_path = str(tmp_path / "repo.pkl")
+    save_index_store(_db(), db_path)
+
+    store = IndexStore(db_path)
+    assert isinstance(store.vectors, np.memmap)
+    assert store.vectors.dtype == np.float32
+    assert store.vectors.shape == (3, 3)
+    assert store.has_vector.tolist() == [True, True, False]
+
+    documents = store.documents()
+    assert len(documents) == 3
+    assert [doc.text for doc in documents] == ["a = 1", "b = 2", "# Title"]
+    assert documents[1].vector.tolist() == [0.0, 1.0, 0.0]
+    assert documents[1].parent_doc_id == "item-a"
+    assert list(documents[2].vector) == []
+    assert [doc.id for doc in documents.take([2, 0])] == ["c2", "c0"]
+
+    restored = store.to_local_db()
+    assert [item.id for item in restored.items] == ["item-a", "item-b"]
+    assert restored.get_transformed_data(key="split_and_embed")[0].vector == [1.0, 0.0, 0.0]
+
+
+def test_prepare_db_index_migrates_pickled_database(tmp_path):
+    db_path = str(tmp_path / "databases" / "repo.pkl")
+    os.makedirs(os.path.dirname(db_path))
+    _db().save_state(filepath=db_path)
+
+    manager = DatabaseManager()
+    manager.repo_paths = {"save_repo_dir": str(tmp_path), "save_db_file": db_path}
+    documents = manager.prepare_db_index(embedder_type="openai")
+
+    assert index_store_exists(db_path)
+    assert not os.path.exists(db_path)
+    assert [doc.id for doc in documents] == ["c0", "c1", "c2"]
+    assert os.path.exists(get_index_store_paths(db_path)["faiss"])
+
+
+
+def test_built_index_is_loaded_without_the_build_lock(tmp_path):
+    repo_dir = tmp_path / "repo"
+    repo_dir.mkdir()
+    (repo_dir / "a.py").write_text("a = 1\n")
+    coordinator = MagicMock()
+    with patch("core.data_pipeline.get_adalflow_default_root_path", return_value=str(tmp_path)), \
+            patch("core.data_pipeline.get_build_coordinator", return_value=coordinator):
+        save_index_store(_db(), str(tmp_path / "databases" / "repo.pkl"))
+        documents = DatabaseManager().prepare_database(str(repo_dir), "local")
+        assert [doc.id for doc in documents] == ["c0", "c1", "c2"]
+        coordinator.run.assert_not_called()
+
+        # Refreshes, and repositories without a usable index, go through the coordinator
+        DatabaseManager().prepare_database(str(repo_dir), "local", refresh=True)
+        os.remove(get_index_store_paths(str(tmp_path / "databases" / "repo.pkl"))["chunks"])
+        DatabaseManager().prepare_database(str(repo_dir), "local")
+    assert coordinator.run.call_count == 2
+
+def test_persisted_faiss_index_is_loaded_and_validated(tmp_path):
+    import faiss
+
+    db_path = str(tmp_path / "repo.pkl")
+    save_index_store(_db(), db_path)
+    store = IndexStore(db_path)
+
+    index = store.load_faiss_index()
+    assert index.ntotal == 2 and index.d == 3
+    _, ids = index.search(np.array([[0.0, 1.0, 0.0]], dtype=np.float32), 1)
+    rows = store.documents().select(np.flatnonzero(store.has_vector))
+    assert rows[int(ids[0][0])].id == "c1"
+
+    assert store.load_faiss_index(metric="euclidean") is None
+
+    # An index that no longer matches the store is never used
+    faiss.write_index(faiss.IndexFlatIP(3), get_index_store_paths(db_path)["faiss"])
+    assert store.load_faiss_index() is None
+
+
+def test_faiss_index_of_another_build_is_rejected(tmp_path):
+    import shutil
+
+    db_path = str(tmp_path / "repo.pkl")
+    paths = get_index_store_paths(db_path)
+    save_index_store(_db(), db_path)
+    old_vectors = IndexStore(db_path).paths["vectors"]
+    shutil.copy(paths["chunks"], str(tmp_path / "old.chunks.sqlite"))
+    shutil.copy(old_vectors, str(tmp_path / "old.vectors.npy"))
+
+    # A save interrupted after the index was swapped in leaves the new index next to the
+    # old chunks and vectors, with the same number of vectors and dimension
+    save_index_store(_db(), db_path)
+    assert IndexStore(db_path).load_faiss_index() is not None
+    shutil.copy(str(tmp_path / "old.chunks.sqlite"), paths["chunks"])
+    shutil.copy(str(tmp_path / "old.vectors.npy"), old_vectors)
+    assert IndexStore(db_path).load_faiss_index() is None
+
+
+def test_store_never_pairs_chunks_with_vectors_of_another_build(tmp_path):
+    db_path = str(tmp_path / "repo.pkl")
+    save_index_store(_db(), db_path)
+    store = IndexStore(db_path)
+
+    # A rebuild with the same number of chunks and new vectors
+    rebuilt = _db()
+    for chunk in rebuilt.transformed_items["split_and_embed"][:2]:
+        chunk.vector = [0.0, 0.0, 1.0]
+    save_index_store(rebuilt, db_path)
+    assert store.vectors[0].tolist() == [1.0, 0.0, 0.0]
+    assert IndexStore(db_path).vectors[0].tolist() == [0.0, 0.0, 1.0]
+    assert len([name for name in os.listdir(tmp_path) if ".vectors." in name]) == 1
+
+    # A save between reading the chunk table and opening the matrix makes the open fail
+    # rather than read the new vectors with the old chunks
+    load = np.load
+
+    def save_then_load(path, **kwargs):
+        save_index_store(_db(), db_path)
+        return load(path, **kwargs)
+
+    with patch("core.index_store.np.load", side_effect=save_then_load):
+        with pytest.raises(FileNotFoundError):
+            IndexStore(db_path)
+
+
+def test_index_type_follows_corpus_size():
+    config = {"type": "auto", "ivf_min_chunks": 100, "hnsw_min_chunks": 1000}
+    assert select_index_type(99, config) == "flat"
+    assert select_index_type(100, config) == "ivf"
+    assert select_index_type(1000, config) == "hnsw"
+    assert select_index_type(10, {**config, "type": "hnsw"}) == "hnsw"
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((400, 8)).astype(np.float32)
+    query = vectors[123:124]
+    for index_type in ["flat", "ivf", "hnsw"]:
+        index = build_faiss_index(vectors, index_type=index_type, ann_config={"ivf": {"nprobe": 64}})
+        assert faiss_index_type(index) == index_type
+        _, ids = index.search(query / np.linalg.norm(query), 1)
+        assert ids[0][0] == 123
+
+
+def test_quantized_index_is_rescored_with_float32_vectors():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((400, 16)).astype(np.float32)
+    query = vectors[7:8] / np.linalg.norm(vectors[7])
+    full = build_faiss_index(vectors, index_type="flat", ann_config={})
+    expected_scores, expected_ids = full.search(query, 5)
+
+    for quantization, code_size in [("fp16", 32), ("int8", 16)]:
+        ann_config = {"quantization": quantization, "rescore_factor": 4}
+        quantized = build_faiss_index(vectors, index_type="hnsw", ann_config=ann_config)
+        assert faiss_quantization(quantized) == quantization
+        assert index_nbytes(quantized) == code_size * 400 < index_nbytes(full)
+
+        index = with_rescoring(quantized, vectors, ann_config=ann_config)
+        assert isinstance(index, RescoredIndex) and faiss_index_type(index) == "hnsw"
+        scores, ids = index.search(query, 5)
+        assert ids.tolist() == expected_ids.tolist()
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+
+    assert with_rescoring(full, vectors) is full
+
+
+def test_persisted_index_follows_configured_quantization(tmp_path):
+    db_path = str(tmp_path / "repo.pkl")
+    with patch.dict(configs, {"ann_index": {"quantization": "int8"}}):
+        save_index_store(_db(), db_path)
+        store = IndexStore(db_path)
+        index = store.load_faiss_index()
+        assert store.faiss_quantization == "int8" and faiss_quantization(index) == "int8"
+
+        rows = np.flatnonzero(store.has_vector)
+        _, ids = with_rescoring(index, store.vectors, rows=rows).search(np.array([[0.0, 1.0, 0.0]], dtype=np.float32), 2)
+        assert store.documents().select(rows)[int(ids[0][0])].id == "c1"
+
+    # Switching quantization off makes the persisted int8 index stale
+    with patch.dict(configs, {"ann_index": {"quantization": "none"}}):
+        assert store.load_faiss_index() is None
@@ -0,0 +1,104 @@
+import asyncio
+from unittest.mock import patch
+
+from core.model_clients import ModelClientRegistry
+from core.openrouter_client import OpenRouterClient
+
+
+class Connections:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class OpenAIClient:
+    created = 0
+
+    def __init__(self, api_key=None, env_api_key_name="OPENAI_API_KEY"):
+        OpenAIClient.created += 1
+        self.sync_client = Connections()
+        self.async_client = None
+        self.chat_completion_parser = "message"
+
+    def init_async_client(self):
+        return Connections()
+
+
+def test_registry_shares_clients_per_credentials(monkeypatch):
+    OpenAIClient.created = 0
+    registry = ModelClientRegistry()
+    monkeypatch.setenv("OPENAI_API_KEY", "key-1")
+    client = registry.get(OpenAIClient)
+    assert registry.get(OpenAIClient).sync_client is client.sync_client
+    assert OpenAIClient.created == 1
+
+    # Other credentials, from the environment or the arguments, get their own client
+    monkeypatch.setenv("OPENAI_API_KEY", "key-2")
+    rotated = registry.get(OpenAIClient)
+    assert rotated.sync_client is not client.sync_client
+    assert registry.get(OpenAIClient, api_key="explicit").sync_client is not rotated.sync_client
+    monkeypatch.setenv("OTHER_KEY", "key-3")
+    assert registry.get(OpenAIClient, env_api_key_name="OTHER_KEY").sync_client is not rotated.sync_client
+    assert len(registry) == 4
+
+    asyncio.run(registry.close())
+    assert client.sync_client.closed and client.async_client.closed and rotated.sync_client.closed
+    assert len(registry) == 0
+
+
+def test_requests_share_connections_but_not_call_state():
+    registry = ModelClientRegistry()
+    first, second = registry.get(OpenAIClient), registry.get(OpenAIClient)
+    assert first is not second
+    assert first.sync_client is second.sync_client
+    # The async client is created once, not by each request on its first async call
+    assert first.async_client is not None and first.async_client is second.async_client
+
+    # What a streamed call stores on its client does not reach concurrent requests
+    first.chat_completion_parser = "stream"
+    first._api_kwargs = {"stream": True}
+    assert second.chat_completion_parser == "message"
+    assert not hasattr(second, "_api_kwargs")
+
+
+def test_registry_closes_replaced_clients_after_a_grace_period():
+    registry = ModelClientRegistry(max_age_seconds=60, retired_grace_seconds=30)
+    client = registry.get(OpenAIClient)
+    with patch("core.model_clients.time.monotonic", return_value=1e9):
+        replacement = registry.get(OpenAIClient)
+    assert replacement.sync_client is not client.sync_client
+
+    async def request_at(now):
+        with patch("core.model_clients.time.monotonic", return_value=now):
+            registry.get(OpenAIClient)
+        await asyncio.sleep(0)
+
+    # Requests that got the replaced client may still be using it
+    asyncio.run(request_at(1e9 + 10))
+    assert not client.sync_client.closed
+    asyncio.run(request_at(1e9 + 31))
+    assert client.sync_client.closed and not replacement.sync_client.closed
+
+    asyncio.run(registry.close())
+    assert replacement.sync_client.closed
+
+
+def test_openrouter_client_reuses_its_session():
+    client = OpenRouterClient()
+
+    async def get_session():
+        return client._get_session()
+
+    async def use_client():
+        session = client._get_session()
+        assert client._get_session() is session
+        await client.aclose()
+        return session
+
+    assert asyncio.run(use_client()).closed
+
+    # A session left by a stopped event loop is released when another loop uses the client
+    first = asyncio.run(get_session())
+    assert asyncio.run(get_session()) is not first and first.closed
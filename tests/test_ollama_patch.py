@@ -0,0 +1,105 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+from adalflow.core.types import Document
+
+from core.ollama_patch import OllamaDocumentProcessor
+
+
+class _StubOllamaHandler(BaseHTTPRequestHandler):
+    """Embeds each text as [len(text), 1.0] and fails on texts containing "bad"."""
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.paths.append(self.path)
+        if body.get("model") == "missing-model":
+            data = json.dumps({"error": 'model "missing-model" not found, try pulling it first'}).encode()
+            self.send_response(404)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        if self.path == "/api/embed" and server.supports_batch:
+            texts = body["input"]
+            payload = {"embeddings": [[float(len(text)), 1.0] for text in texts]}
+        elif self.path == "/api/embeddings":
+            texts = [body["prompt"]]
+            payload = {"embedding": [float(len(body["prompt"])), 1.0]}
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        if any("bad" in text for text in texts):
+            self.send_response(500)
+            self.end_headers()
+            return
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_ollama():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubOllamaHandler)
+    server.lock = threading.Lock()
+    server.paths = []
+    server.supports_batch = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _processor(server, model="nomic-embed-text", **kwargs):
+    embedder = SimpleNamespace(
+        model_client=SimpleNamespace(_host=f"127.0.0.1:{server.server_address[1]}"),
+        model_kwargs={"model": model},
+    )
+    return OllamaDocumentProcessor(embedder=embedder, **kwargs)
+
+
+def _documents(texts):
+    return [Document(text=text, meta_data={"file_path": f"{i}.py"}) for i, text in enumerate(texts)]
+
+
+def test_batches_and_isolates_failing_chunks(stub_ollama):
+    texts = ["a", "bb", "bad", "dddd", "eeeee", "ffffff", "ggggggg"]
+    processor = _processor(stub_ollama, max_workers=3, batch_size=3)
+
+    result = processor(_documents(texts))
+
+    assert [doc.text for doc in result] == ["a", "bb", "dddd", "eeeee", "ffffff", "ggggggg"]
+    assert [doc.vector for doc in result] == [[float(len(doc.text)), 1.0] for doc in result]
+    assert set(stub_ollama.paths) == {"/api/embed"}
+    # three batches, plus the failing batch retried one document at a time
+    assert len(stub_ollama.paths) == 3 + 3
+
+
+def test_falls_back_to_single_embeddings_endpoint(stub_ollama):
+    stub_ollama.supports_batch = False
+    processor = _processor(stub_ollama, max_workers=1, batch_size=1)
+
+    result = processor(_documents(["a", "bb", "ccc"]))
+
+    assert [doc.vector for doc in result] == [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0]]
+    assert processor.supports_batch is False
+    assert stub_ollama.paths == ["/api/embed", "/api/embeddings", "/api/embeddings", "/api/embeddings"]
+
+
+def test_unknown_model_does_not_disable_batches(stub_ollama):
+    processor = _processor(stub_ollama, model="missing-model", max_workers=1, batch_size=2)
+
+    assert processor(_documents(["a", "bb"])) == []
+    assert processor.supports_batch is None
+    assert set(stub_ollama.paths) == {"/api/embed"}
@@ -0,0 +1,53 @@
+from unittest.mock import patch
+
+from adalflow.core.types import EmbedderOutput, Embedding
+
+from core.query_embedding_cache import CachedQueryEmbedder, QueryEmbeddingCache
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.inputs = []
+
+    def __call__(self, input, model_kwargs=None):
+        self.inputs.append(input)
+        texts = [input] if isinstance(input, str) else input
+        return EmbedderOutput(
+            data=[Embedding(embedding=[float(len(text)), 1.0], index=i) for i, text in enumerate(texts)],
+            model="model",
+        )
+
+
+def test_query_embedding_cache_evicts_and_expires():
+    cache = QueryEmbeddingCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    assert cache.get("a") == [1.0]
+    cache.put("c", [3.0])
+    assert cache.get("b") is None
+
+    with patch("core.query_embedding_cache.time.monotonic", return_value=float("inf")):
+        assert cache.get("a") is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["expirations"]) == (1, 2, 1, 1)
+    assert stats["entries"] == 1
+
+
+def test_cached_query_embedder_only_embeds_new_queries():
+    embedder = CountingEmbedder()
+    cached = CachedQueryEmbedder(embedder, QueryEmbeddingCache(max_entries=10, ttl_seconds=60), "Client:model:256")
+
+    assert cached(" what is  rag?").data[0].embedding == [12.0, 1.0]
+    # Whitespace differences hit the same entry
+    output = cached(["what is rag? ", "how are files split?", "how are files split?"])
+
+    assert embedder.inputs == ["what is rag?", ["how are files split?"]]
+    assert [data.embedding[0] for data in output.data] == [12.0, 20.0, 20.0]
+    assert [data.index for data in output.data] == [0, 1, 2]
+    assert cached.cache.stats()["hits"] == 1
+
+    failing = CachedQueryEmbedder(lambda input, model_kwargs: EmbedderOutput(error="rate limited"),
+                                  cached.cache, "Client:model:256")
+    assert failing("never embedded").error == "rate limited"
+    assert cached.cache.stats()["entries"] == 2
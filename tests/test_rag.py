@@ -0,0 +1,181 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import faiss
+import numpy as np
+import pytest
+from adalflow.core.db import LocalDB
+from adalflow.core.types import Document, Embedding, EmbedderOutput, RetrieverOutput
+
+from core.chunk_filter import FilteredIndex
+from core.index_store import IndexStore, build_file_index, save_index_store
+from core.rag import RAG
+
+
+def _validate(documents):
+    # Validation does not depend on the generator or embedder set up in RAG.__init__
+    rag = RAG.__new__(RAG)
+    return rag._validate_and_filter_embeddings(documents), rag.embedding_matrix
+
+
+def test_validate_and_filter_embeddings_drops_bad_vectors():
+    documents = [
+        Document(text="ok 1", vector=[1.0, 0.0, 0.0]),
+        Document(text="short", vector=[1.0, 0.0]),
+        Document(text="nan", vector=[float("nan"), 0.0, 0.0]),
+        Document(text="empty", vector=[]),
+        Document(text="ok 2", vector=np.array([0.0, 1.0, 0.0])),
+        Document(text="inf", vector=[0.0, float("inf"), 0.0]),
+    ]
+
+    valid, matrix = _validate(documents)
+
+    assert [doc.text for doc in valid] == ["ok 1", "ok 2"]
+    assert matrix.dtype == np.float32
+    assert matrix.tolist() == [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]
+
+
+def test_validate_and_filter_embeddings_uses_stored_matrix(tmp_path):
+    db = LocalDB()
+    db.transformed_items["split_and_embed"] = [
+        Document(id="c0", text="a", vector=[1.0, 0.0]),
+        Document(id="c1", text="b", vector=[]),
+        Document(id="c2", text="c", vector=[0.0, 1.0]),
+    ]
+    db_path = str(tmp_path / "repo.pkl")
+    save_index_store(db, db_path)
+
+    valid, matrix = _validate(IndexStore(db_path).documents())
+
+    assert [doc.id for doc in valid] == ["c0", "c2"]
+    assert matrix.tolist() == [[1.0, 0.0], [0.0, 1.0]]
+    assert _validate([]) == ([], None)
+
+
+def _file_rag(documents, top_k, index=None, chunk_mask=None):
+    rag = RAG.__new__(RAG)
+    rag.transformed_docs = documents
+    rag.file_index = build_file_index(documents)
+    rag.chunk_mask = chunk_mask
+    rag.is_ollama_embedder = False
+    rag.query_embedder = MagicMock(return_value=EmbedderOutput(data=[Embedding(embedding=[1.0, 0.0], index=0)]))
+    if index is None:
+        index = _PaddedIndex([[0.8, 0.6, 0.4, 0.2]], [[0, 3, 2, 1]])
+    rag.retriever = MagicMock(top_k=top_k, index=index)
+    rag.retriever.return_value = [RetrieverOutput(doc_indices=[0, 3, 2, 1], doc_scores=[0.9, 0.8, 0.7, 0.6])]
+    return rag
+
+
+def test_file_scoped_call_reads_the_file_index(tmp_path):
+    db = LocalDB()
+    db.transformed_items["split_and_embed"] = [
+        Document(id="c0", text="a0", meta_data={"file_path": "a.py"}, vector=[1.0, 0.0]),
+        Document(id="c1", text="b0", meta_data={"file_path": "src/b.py"}, vector=[0.0, 1.0]),
+        Document(id="c2", text="b1", meta_data={"file_path": "src/b.py"}, vector=[0.0, 1.0]),
+        Document(id="c3", text="c0", meta_data={"file_path": "c.py"}, vector=[1.0, 1.0]),
+    ]
+    db_path = str(tmp_path / "repo.pkl")
+    save_index_store(db, db_path)
+    documents = IndexStore(db_path).documents()
+
+    # The file fills top_k on its own: no query embedding or vector search
+    rag = _file_rag(documents, top_k=2)
+    result = rag.call("what does b do?", file_path="/src/b.py")
+    assert [doc.id for doc in result[0].documents] == ["c1", "c2"]
+    rag.query_embedder.assert_not_called()
+    assert rag.retriever.index.queries == []
+
+    # Vector search fills the remaining slots without repeating the file's chunks
+    rag = _file_rag(documents, top_k=3)
+    result = rag.call("what does b do?", file_path="src/b.py")
+    assert result[0].doc_indices == [1, 2, 0]
+    assert result[0].doc_scores == pytest.approx([1.0, 1.0, 0.9])
+    rag.query_embedder.assert_called_once_with(["what does b do?"])
+    assert [k for _, k in rag.retriever.index.queries] == [5]
+
+    # Unknown files fall back to a plain vector search
+    rag = _file_rag(documents, top_k=2)
+    result = rag.call("what does b do?", file_path="missing.py")
+    assert [doc.id for doc in result[0].documents] == ["c0", "c3", "c2", "c1"]
+
+
+def test_file_scoped_call_keeps_to_the_file_filters():
+    documents = [
+        Document(id="c0", text="a0", meta_data={"file_path": "a.py"}),
+        Document(id="c1", text="b0", meta_data={"file_path": "src/b.py"}),
+        Document(id="c2", text="v0", meta_data={"file_path": "vendor/v.py"}),
+        Document(id="c3", text="c0", meta_data={"file_path": "c.py"}),
+    ]
+    index = faiss.IndexFlatIP(2)
+    index.add(np.asarray([[0.6, 0.8], [0.8, 0.6], [1, 0], [0, 1]], dtype=np.float32))
+    mask = np.asarray([True, True, False, True])
+
+    # The fill is searched through the filtered index, so excluded chunks never come back
+    rag = _file_rag(documents, top_k=3, index=FilteredIndex(index, mask), chunk_mask=mask)
+    result = rag.call("what does b do?", file_path="src/b.py")
+    assert [doc.id for doc in result[0].documents] == ["c1", "c0", "c3"]
+
+    # An excluded file's own chunks are not returned either
+    rag = _file_rag(documents, top_k=3, index=FilteredIndex(index, mask), chunk_mask=mask)
+    assert rag._retrieve_for_file("what does v do?", "vendor/v.py") is None
+
+
+class _PaddedIndex:
+    """Returns fixed search results, padded with -1 like a filtered or HNSW search."""
+
+    def __init__(self, scores, indices):
+        self.results = np.asarray(scores, dtype=np.float32), np.asarray(indices, dtype=np.int64)
+        self.queries = []
+
+    def search(self, xq, k):
+        self.queries.append((xq, k))
+        return self.results
+
+
+def _batch_rag(index, documents=4):
+    documents = [Document(id=f"c{i}", text=f"t{i}", meta_data={"file_path": f"f{i}.py"}) for i in range(documents)]
+    rag = RAG.__new__(RAG)
+    rag.transformed_docs = documents
+    rag.is_ollama_embedder = False
+    rag.retriever = SimpleNamespace(index=index, top_k=3)
+    rag.query_embedder = MagicMock(side_effect=lambda queries: EmbedderOutput(
+        data=[Embedding(embedding=[float(i), 1.0], index=i) for i in range(len(queries))]
+    ))
+    return rag
+
+
+def test_call_batch_searches_all_queries_at_once():
+    index = _PaddedIndex([[0.8, 0.0, -1.0], [0.6, -0.2, 0.0]], [[2, 0, -1], [0, 3, -1]])
+    rag = _batch_rag(index)
+
+    batch = rag.call_batch(["first", "", "second"])
+
+    # The non-empty queries are embedded in one request and searched as one matrix
+    rag.query_embedder.assert_called_once_with(["first", "second"])
+    assert len(index.queries) == 1 and index.queries[0][0].shape == (2, 2)
+    assert [result.doc_indices for result in batch.results] == [[2, 0], [], [0, 3]]
+    assert [doc.id for doc in batch.results[2].documents] == ["c0", "c3"]
+    assert batch.results[1].query == ""
+    assert [doc.id for doc in batch.documents] == ["c2", "c0", "c3"]
+    assert batch.doc_scores == pytest.approx([0.9, 0.8, 0.4])
+    assert rag.call_batch(["", " "]).documents == []
+
+
+def test_call_batch_keeps_full_results_next_to_a_short_one():
+    # Two IVF lists searched with nprobe=1: the filter leaves the second query's list a
+    # single chunk, while the first query's list still holds three
+    vectors = np.asarray([[1, 0], [0.9, 0.1], [0.8, 0.2], [0.7, 0.3], [0, 1]], dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = faiss.IndexIVFFlat(faiss.IndexFlatIP(2), 2, 2, faiss.METRIC_INNER_PRODUCT)
+    index.train(np.asarray([[1, 0], [0, 1]], dtype=np.float32))
+    index.add(vectors)
+    mask = np.asarray([True, True, True, False, True])
+    rag = _batch_rag(FilteredIndex(index, mask), documents=5)
+    rag.query_embedder = MagicMock(return_value=EmbedderOutput(
+        data=[Embedding(embedding=[1.0, 0.0], index=0), Embedding(embedding=[0.0, 1.0], index=1)]
+    ))
+
+    batch = rag.call_batch(["broad", "narrow"])
+
+    assert [result.doc_indices for result in batch.results] == [[0, 1, 2], [4]]
+    assert [doc.id for doc in batch.documents] == ["c0", "c4", "c1", "c2"]
@@ -0,0 +1,103 @@
+import numpy as np
+from adalflow.components.retriever.faiss_retriever import FAISSRetriever
+from adalflow.core.types import Document
+
+from core.chunk_filter import ChunkFilter, FilteredIndex
+from core.index_store import build_faiss_index
+from core.retriever_cache import _MAX_FILTER_MASKS, PreparedIndex, RetrieverCache, retriever_cache_key
+
+
+def _entry(nbytes):
+    return PreparedIndex(documents=[], index=None, dimensions=0, nbytes=nbytes)
+
+
+def test_cache_evicts_least_recently_used_within_budget():
+    cache = RetrieverCache(max_bytes=250)
+    keys = [retriever_cache_key(f"https://github.com/o/r{i}", "github", "openai", 1.0) for i in range(3)]
+
+    cache.put(keys[0], _entry(100))
+    cache.put(keys[1], _entry(100))
+    assert cache.get(keys[0]) is not None
+    cache.put(keys[2], _entry(100))
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[2]) is not None
+    assert cache.stats()["size_bytes"] == 200
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_keys_replace_older_builds():
+    cache = RetrieverCache(max_bytes=1000)
+    old_build = retriever_cache_key("/repo", "local", "openai", 1.0)
+    new_build = retriever_cache_key("/repo", "local", "openai", 2.0)
+    other_embedder = retriever_cache_key("/repo", "local", "google", 2.0)
+
+    cache.put(old_build, _entry(100))
+    cache.put(other_embedder, _entry(100))
+    cache.put(new_build, _entry(100))
+
+    assert cache.get(old_build) is None
+    assert cache.get(new_build) is not None
+    assert cache.get(other_embedder) is not None
+
+    # Entries larger than the whole budget are not cached
+    cache.put(new_build, _entry(2000))
+    assert cache.get(new_build).nbytes == 100
+
+
+def test_prepared_index_is_shared_by_new_retrievers():
+    documents = [Document(text=f"doc {i}", vector=[float(i == j) for j in range(4)]) for i in range(4)]
+    index = build_faiss_index(np.eye(4, dtype=np.float32))
+    prepared = PreparedIndex.from_index(index, documents, 4, resident=True)
+    assert prepared.nbytes > 4 * 4 * 4
+
+    first, second = FAISSRetriever(top_k=1), FAISSRetriever(top_k=1)
+    prepared.attach(first)
+    prepared.attach(second)
+
+    output = second.retrieve_embedding_queries(np.array([[0.0, 0.0, 1.0, 0.0]], dtype=np.float32))
+    assert output[0].doc_indices == [2]
+    assert first.index is second.index
+
+
+def test_filters_select_chunks_of_the_shared_index():
+    paths = ["src/app.py", "src/app.py", "tests/test_app.py", "guide/intro.md", "web/index.js"]
+    documents = [Document(text=path, meta_data={"file_path": path}) for path in paths]
+    vectors = np.ones((len(paths), 4), dtype=np.float32) + np.eye(len(paths), 4, dtype=np.float32)
+    prepared = PreparedIndex.from_index(build_faiss_index(vectors), documents, 4, resident=True)
+
+    def kept(**filters):
+        mask = prepared.filter_mask(ChunkFilter.from_lists(**filters))
+        return None if mask is None else np.flatnonzero(mask).tolist()
+
+    assert kept() is None
+    assert kept(excluded_dirs=["tests"]) == [0, 1, 3, 4]
+    assert kept(included_dirs=["guide"]) == [3]
+    assert kept(included_files=["app.py"]) == [0, 1, 2]
+    assert kept(is_code=True, is_implementation=True) == [0, 1, 4]
+    assert kept(extensions=[".md"]) == [3]
+    assert len(prepared.filter_masks) == 5
+
+    retriever = FAISSRetriever(top_k=5)
+    prepared.attach(retriever)
+    retriever.index = FilteredIndex(prepared.index, prepared.filter_mask(ChunkFilter.from_lists(included_dirs=["src"])))
+    output = retriever.retrieve_embedding_queries(vectors[3:4])
+    assert sorted(output[0].doc_indices) == [0, 1]
+
+
+def test_prepared_index_keeps_a_bounded_number_of_masks():
+    paths = [f"dir{i}/file.py" for i in range(_MAX_FILTER_MASKS + 2)]
+    documents = [Document(text=path, meta_data={"file_path": path}) for path in paths]
+    prepared = PreparedIndex.from_index(None, documents, 4)
+    assert prepared.nbytes >= _MAX_FILTER_MASKS * len(documents)
+
+    first = ChunkFilter.from_lists(included_dirs=["dir0"])
+    for i in range(len(paths)):
+        prepared.filter_mask(ChunkFilter.from_lists(included_dirs=[f"dir{i}"]))
+        # Reusing a filter keeps its mask
+        prepared.filter_mask(first)
+
+    assert len(prepared.filter_masks) == _MAX_FILTER_MASKS
+    assert first in prepared.filter_masks
+    assert ChunkFilter.from_lists(included_dirs=["dir1"]) not in prepared.filter_masks
@@ -0,0 +1,134 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from core.streaming import (
+    ProviderModel,
+    answer_stream,
+    coalesce_stream,
+    get_provider_model,
+    no_context_prompt,
+    stream_answer,
+)
+
+
+async def collect(stream):
+    return [item async for item in stream]
+
+
+async def texts(*items, delay=0.0):
+    for item in items:
+        if delay:
+            await asyncio.sleep(delay)
+        yield item
+
+
+class FakeClient:
+    def __init__(self, response=None, error=None):
+        self.response = response
+        self.error = error
+
+    async def acall(self, api_kwargs=None, model_type=None):
+        if self.error:
+            raise self.error
+        return self.response
+
+
+def openai_chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+def test_coalesce_stream_groups_text_by_size_and_delay():
+    frames = asyncio.run(collect(coalesce_stream(texts(*["token "] * 200), max_bytes=512, max_delay=10)))
+    assert "".join(frames) == "token " * 200
+    assert len(frames) == 3
+    assert all(len(frame.encode()) >= 512 for frame in frames[:-1])
+
+    # Text waiting longer than the delay is sent without waiting for more
+    frames = asyncio.run(collect(coalesce_stream(texts("a", "b", delay=0.2), max_bytes=512, max_delay=0.01)))
+    assert frames == ["a", "b"]
+
+
+def test_coalesce_stream_sends_text_received_before_an_error():
+    async def failing():
+        yield "partial"
+        raise RuntimeError("upstream closed")
+
+    async def consume():
+        frames = []
+        with pytest.raises(RuntimeError):
+            async for frame in coalesce_stream(failing(), max_bytes=512, max_delay=10):
+                frames.append(frame)
+        return frames
+
+    assert asyncio.run(consume()) == ["partial"]
+
+
+def test_stream_answer_normalizes_provider_chunks():
+    openai = FakeClient(texts(openai_chunk("Hel"), openai_chunk(None), openai_chunk("lo")))
+    assert asyncio.run(collect(stream_answer("openai", openai, {}))) == ["Hel", "lo"]
+
+    ollama = FakeClient(texts({"message": {"content": "<think>ok"}}, SimpleNamespace(response="model=x")))
+    assert asyncio.run(collect(stream_answer("ollama", ollama, {}))) == ["ok"]
+
+    assert asyncio.run(collect(stream_answer("bedrock", FakeClient("answer"), {}))) == ["answer"]
+
+    google = SimpleNamespace(generate_content=lambda prompt, stream: iter([SimpleNamespace(text=prompt)]))
+    assert asyncio.run(collect(stream_answer("google", google, prompt="hi"))) == ["hi"]
+
+
+def test_stream_answer_reports_provider_errors():
+    failing = FakeClient(error=RuntimeError("401"))
+    (message,) = asyncio.run(collect(stream_answer("openrouter", failing, {}, fallback=True)))
+    assert message.startswith("\nError with OpenRouter API fallback: 401")
+    assert "OPENROUTER_API_KEY" in message
+
+    # Ollama errors are raised so the caller can retry without context
+    with pytest.raises(RuntimeError):
+        asyncio.run(collect(stream_answer("ollama", failing, {})))
+
+
+class PromptClient:
+    """Answers with the prompt it was called with, failing for prompts with context."""
+
+    def __init__(self):
+        self.model_kwargs = []
+
+    def convert_inputs_to_api_kwargs(self, input, model_kwargs, model_type):
+        self.model_kwargs.append(model_kwargs)
+        return {"prompt": input}
+
+    async def acall(self, api_kwargs=None, model_type=None):
+        if "<START_OF_CONTEXT>" in api_kwargs["prompt"]:
+            raise RuntimeError("This model's maximum context length is 8192 tokens")
+        return texts({"message": {"content": api_kwargs["prompt"]}})
+
+
+def test_answer_stream_retries_without_context_when_the_prompt_is_too_long():
+    client = PromptClient()
+    model = ProviderModel("ollama", client, {"model": "qwen3"})
+    fallback = no_context_prompt("system", "", "question?", "a.py", "a = 1")
+
+    answer = asyncio.run(collect(answer_stream(model, "<START_OF_CONTEXT>...", fallback)))
+    assert answer == [fallback + " /no_think"]
+    assert '<currentFileContent path="a.py">' in fallback
+    assert client.model_kwargs == [{"model": "qwen3"}] * 2
+
+    google = ProviderModel("google", SimpleNamespace(generate_content=lambda prompt, stream: iter([])))
+    failing = SimpleNamespace(generate_content=lambda prompt, stream: (_ for _ in ()).throw(ValueError("quota")))
+    assert asyncio.run(collect(answer_stream(google, "p", "f"))) == []
+    assert asyncio.run(collect(answer_stream(ProviderModel("google", failing), "p", "f"))) == ["\nError: quota"]
+
+
+def test_provider_models_get_the_configured_model_arguments():
+    config = {"model_kwargs": {"model": "default", "temperature": 0.5, "top_p": 0.9}}
+    with patch("core.streaming.get_model_config", return_value=config), \
+            patch("core.streaming.get_model_client", side_effect=lambda client_class: client_class.__name__):
+        openai = get_provider_model("openai", "gpt")
+        bedrock = get_provider_model("bedrock", "claude")
+    assert (openai.model, openai.model_kwargs) == (
+        "OpenAIClient", {"model": "gpt", "stream": True, "temperature": 0.5, "top_p": 0.9}
+    )
+    assert (bedrock.model, bedrock.model_kwargs) == ("BedrockClient", {"model": "claude", "temperature": 0.5, "top_p": 0.9})